@@ -1,55 +1,100 @@
 import logging
 import os
 
-from dotenv import load_dotenv
 from flask import Flask
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 
 from backend.config import ProductionConfig, DevelopmentConfig
-from backend.app_files.models import connect_db
+from backend.app_files.models import connect_db, db
+from backend.app_files.cache import availability_cache, customer_cache
+from backend.app_files.commands import availability_cli, customers_cli, init_db_command
+from backend.app_files.events import event_broker
+from backend.app_files.holds import hold_expiry
+from backend.app_files.logs import log_pipeline
+from backend.app_files.metrics import request_metrics
+from backend.app_files.pagination import PAGINATION_HEADERS
+from backend.app_files.pool import pool_stats
+from backend.app_files.pricing import pricing_index
+from backend.app_files.replicas import LAST_WRITE_HEADER, replica_router
+from backend.app_files.serializers import init_json
+from backend.app_files.slow_queries import slow_query_log
 
-# import the route blueprints
-from backend.app_files.routes.bookings import bookings_blueprint
-from backend.app_files.routes.customers import customers_blueprint
-from backend.app_files.routes.rooms import rooms_blueprint
-from backend.app_files.routes.showtimes import showtimes_blueprint
-from backend.app_files.routes.auth import auth_blueprint
+logger = logging.getLogger(__name__)
 
-load_dotenv()  # use this to read in environment variables below
+
+def register_blueprints(app):
+    # imported here so importing the package (config, models, the CLI) doesn't pull in every route
+    from backend.app_files.routes.auth import auth_blueprint
+    from backend.app_files.routes.bookings import bookings_blueprint
+    from backend.app_files.routes.customers import customers_blueprint
+    from backend.app_files.routes.diagnostics import diagnostics_blueprint
+    from backend.app_files.routes.events import events_blueprint
+    from backend.app_files.routes.holds import holds_blueprint
+    from backend.app_files.routes.quotes import quotes_blueprint
+    from backend.app_files.routes.rooms import rooms_blueprint
+    from backend.app_files.routes.showtimes import showtimes_blueprint
+
+    app.register_blueprint(auth_blueprint)
+    app.register_blueprint(rooms_blueprint)
+    app.register_blueprint(bookings_blueprint)
+    app.register_blueprint(showtimes_blueprint)
+    app.register_blueprint(customers_blueprint)
+    app.register_blueprint(quotes_blueprint)
+    app.register_blueprint(diagnostics_blueprint)
+    app.register_blueprint(events_blueprint)
+    app.register_blueprint(holds_blueprint)
 
 
 def create_app(config_class=ProductionConfig):
     app = Flask(__name__)
+    app.config.from_object(config_class)
+
+    # JSON logs through a background thread, see LOG_LEVEL / LOG_FILE
+    log_pipeline.init_app(app)
 
     # get allowed_origins from .env
     ALLOWED_ORIGINS = os.getenv('ALLOWED_ORIGINS')
-    print('allowed origins below:')
-    print(ALLOWED_ORIGINS)
+    logger.info(f"allowed origins: {ALLOWED_ORIGINS}")
 
     # set CORS globally
     CORS(app, resources={r"/api/*": {
         "origins": ALLOWED_ORIGINS,
         "methods": ["GET", "POST", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"],
+        "allow_headers": ["Content-Type", "Authorization", LAST_WRITE_HEADER],
+        "expose_headers": PAGINATION_HEADERS + [LAST_WRITE_HEADER],
         "max_age": 3600
     }})
 
-    app.config.from_object(config_class)
-    logging.basicConfig(filename='app.log')
+    init_json(app)
 
     # Initialize JWT
     app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
     jwt = JWTManager(app)
 
     # register blueprints
-    app.register_blueprint(auth_blueprint)
-    app.register_blueprint(rooms_blueprint)
-    app.register_blueprint(bookings_blueprint)
-    app.register_blueprint(showtimes_blueprint)
-    app.register_blueprint(customers_blueprint)
+    register_blueprints(app)
+
+    # flask customers dedupe, flask availability rebuild/check, flask init-db
+    app.cli.add_command(customers_cli)
+    app.cli.add_command(availability_cli)
+    app.cli.add_command(init_db_command)
+
+    availability_cache.configure(app.config['AVAILABILITY_CACHE_SIZE'], app.config['AVAILABILITY_CACHE_TTL'])
+    customer_cache.configure(app.config['CUSTOMER_CACHE_SIZE'], app.config['CUSTOMER_CACHE_TTL'])
+    pricing_index.configure(app.config['PRICING_CACHE_TTL'])
 
     connect_db(app)
+    replica_router.init_app(app, db)
+    pool_stats.init_app(app, db)
+    # latency, status and sql statement counts per route on /metrics
+    request_metrics.init_app(app)
+    # opt-in, see SLOW_QUERY_THRESHOLD_MS
+    slow_query_log.init_app(app)
+    # slot-taken / slot-freed on /api/events, see EVENTS_BACKEND
+    event_broker.init_app(app, db)
+    # deletes slot holds as they run out, started by the first hold request in each worker
+    hold_expiry.init_app(app)
 
     return app
 
@@ -58,7 +103,7 @@ if os.environ.get('ENVIRONMENT') == 'DEV':
     app = create_app(DevelopmentConfig)
 else:
     app = create_app(ProductionConfig)
-    print("we are in production beyathces")
+    logger.info("we are in production")
 
 if __name__ == '__main__':
     app.run(port=8080, debug=app.config['DEBUG'])
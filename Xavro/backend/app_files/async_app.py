@@ -0,0 +1,244 @@
+import asyncio
+import logging
+import re
+import time
+import uuid
+from datetime import datetime
+from urllib.parse import parse_qsl
+
+from werkzeug.http import parse_etags, quote_etag
+
+from .async_services import create_async_sessionmaker, get_room_timeslots_range_async, get_rooms_availability_async
+from .events import event_broker, event_filter, format_event
+from .logs import REQUEST_ID_HEADER, access_logger, current_request
+from .metrics import request_metrics
+from .models import db
+from .routes.events import SSE_HEADERS, SSE_RETRY_MS
+from .services import check_timeslot_args, parse_date_range, parse_room_ids
+from .versions import args_are_valid, etag_for, room_ids_for
+
+logger = logging.getLogger(__name__)
+
+
+class CalendarApp:
+    """ASGI app that answers the public calendar reads (availability and timeslots) on asyncio
+    so one worker can have many of them waiting on the database at once, and the /api/events
+    streams, where an idle subscriber is a paused coroutine instead of a thread.  every other
+    request, including OPTIONS and anything that writes, goes to `fallback`, the flask app
+    wrapped for ASGI.
+
+    the responses, status codes, ETags and cache are the same as the flask routes, both sides
+    run in the same process so a booking made through flask invalidates what this serves.
+    reads here always go to the primary"""
+
+    def __init__(self, flask_app, fallback):
+        self.flask_app = flask_app
+        self.fallback = fallback
+        # (path, handler, the tables its ETag depends on and the argument parsers checked before a
+        # 304, same as the flask route's conditional_get, the flask rule it stands in for in the logs)
+        self.routes = [
+            (re.compile(r'/api/rooms/(?P<room_id>\d+)/availability'), self.room_availability,
+             ('showtime', 'booking'), [parse_date_range], '/api/rooms/<int:room_id>/availability'),
+            (re.compile(r'/api/availability'), self.rooms_availability,
+             ('showtime', 'booking'), [parse_room_ids, parse_date_range], '/api/availability'),
+            (re.compile(r'/api/rooms/(?P<room_id>\d+)/timeslots'), self.timeslots,
+             ('room', 'showtime', 'booking'), [check_timeslot_args],
+             '/api/rooms/<int:room_id>/timeslots'),
+        ]
+        with flask_app.app_context():
+            self.database_url = db.engine.url
+        self.engine_options = flask_app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+        self._sessionmaker = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            if scope['path'] == '/api/events':
+                return await self.respond(scope, '/api/events', lambda headers, request_id: self.stream_events(
+                    scope, receive, send, headers, request_id))
+            for pattern, handler, kinds, validate, rule in self.routes:
+                match = pattern.fullmatch(scope['path'])
+                if match:
+                    return await self.respond(scope, rule, lambda headers, request_id: self.handle(
+                        scope, send, handler, kinds, validate, match.groupdict(), headers, request_id))
+        return await self.fallback(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self._sessionmaker is not None:
+                    await self._sessionmaker.kw['bind'].dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def session(self):
+        # the engine is built on first use so it belongs to the server's event loop
+        if self._sessionmaker is None:
+            self._sessionmaker = create_async_sessionmaker(self.database_url, self.engine_options)
+            request_metrics.track(self._sessionmaker.kw['bind'].sync_engine)
+        return self._sessionmaker()
+
+    async def respond(self, scope, rule, serve):
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        info = {
+            'request_id': headers.get(REQUEST_ID_HEADER.lower(), '')[:128] or uuid.uuid4().hex,
+            'method': scope['method'],
+            'route': rule,
+            'started': time.perf_counter(),
+            'sql_count': 0,  # counted by request_metrics
+            'sql_time': 0.0,
+        }
+        token = current_request.set(info)
+        try:
+            status = await serve(headers, info['request_id'])
+            elapsed = time.perf_counter() - info['started']
+            access_logger.info(f"{scope['method']} {scope['path']} {status}",
+                               extra={'status': status, 'duration_ms': round(elapsed * 1000, 3)})
+            request_metrics.observe(scope['method'], rule, status, elapsed,
+                                    info['sql_count'], info['sql_time'])
+        finally:
+            current_request.reset(token)
+
+    async def handle(self, scope, send, handler, kinds, validate, view_args, headers, request_id):
+        view_args = {name: int(value) for name, value in view_args.items()}
+        args = dict(parse_qsl(scope['query_string'].decode('latin-1')))
+        response_headers = self.base_headers(headers, request_id)
+
+        etag = None
+        room_ids = room_ids_for(view_args, args)
+        if room_ids is not None and args_are_valid(validate, args):
+            etag = etag_for(kinds, room_ids, self.flask_app.config['ETAG_MAX_AGE'], scope['query_string'])
+            if parse_etags(headers.get('if-none-match')).contains(etag):
+                await self.send(send, 304, None, response_headers + self.etag_headers(etag))
+                return 304
+
+        status, body = await handler(args, **view_args)
+        if status == 200 and etag is not None:
+            response_headers += self.etag_headers(etag)
+        await self.send(send, status, body, response_headers)
+        return status
+
+    @staticmethod
+    def base_headers(headers, request_id):
+        # the same CORS answer flask-cors gives on the flask routes.  their bare @cross_origin()
+        # overrides the app's ALLOWED_ORIGINS with its default of any origin: the Origin is
+        # echoed back with Vary: Origin, a request without one gets *
+        response_headers = [(REQUEST_ID_HEADER.lower().encode(), request_id.encode('latin-1'))]
+        origin = headers.get('origin')
+        if origin:
+            response_headers += [(b'access-control-allow-origin', origin.encode('latin-1')), (b'vary', b'Origin')]
+        else:
+            response_headers += [(b'access-control-allow-origin', b'*')]
+        return response_headers
+
+    async def stream_events(self, scope, receive, send, headers, request_id):
+        """the flask /api/events stream.  a waiting stream is parked on the broker's one future
+        for this loop, so a publish wakes all of them at once without a thread each"""
+        args = dict(parse_qsl(scope['query_string'].decode('latin-1')))
+        response_headers = self.base_headers(headers, request_id)
+        try:
+            wanted = event_filter(args.get('rooms'))
+        except ValueError:
+            await self.send(send, 400, {'error': 'rooms must be a comma separated list of room ids'}, response_headers)
+            return 400
+
+        cursor, events = event_broker.subscribe(headers.get('last-event-id') or args.get('last_event_id'))
+        response_headers += [(b'content-type', b'text/event-stream; charset=utf-8')]
+        response_headers += [(name.lower().encode(), value.encode()) for name, value in SSE_HEADERS.items()]
+        await send({'type': 'http.response.start', 'status': 200, 'headers': response_headers})
+        await send({'type': 'http.response.body', 'body': f'retry: {SSE_RETRY_MS}\n\n'.encode(), 'more_body': True})
+
+        disconnected = asyncio.ensure_future(self.wait_for_disconnect(receive))
+        try:
+            while True:
+                chunk = ''.join(format_event(payload) for payload in events if wanted(payload))
+                await send({'type': 'http.response.body', 'body': (chunk or ': keepalive\n\n').encode(),
+                            'more_body': True})
+                waiting = asyncio.ensure_future(event_broker.wait_async(cursor, event_broker.keepalive))
+                await asyncio.wait({waiting, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+                if disconnected.done():
+                    waiting.cancel()
+                    return 200
+                cursor, events = waiting.result()
+        finally:
+            disconnected.cancel()
+
+    @staticmethod
+    async def wait_for_disconnect(receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    @staticmethod
+    def etag_headers(etag):
+        return [(b'etag', quote_etag(etag).encode()), (b'cache-control', b'no-cache')]
+
+    async def send(self, send, status, body, headers):
+        content = b''
+        if body is not None:
+            content = (self.flask_app.json.dumps(body) + '\n').encode()
+            headers = headers + [(b'content-type', b'application/json')]
+        headers = headers + [(b'content-length', str(len(content)).encode())]
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': content})
+
+    async def room_availability(self, args, room_id):
+        try:
+            start_date, end_date = parse_date_range(args)
+        except ValueError as e:
+            return 400, {'error': f'Invalid date range: {e}'}
+
+        try:
+            async with self.session() as session:
+                availability = await get_rooms_availability_async(session, [room_id], start_date, end_date)
+        except Exception as e:
+            logger.exception(f"ERROR: {e}")
+            return 500, {'ERROR': str(e)}
+        return 200, availability[room_id]
+
+    async def rooms_availability(self, args):
+        try:
+            room_ids = parse_room_ids(args)
+        except ValueError as e:
+            return 400, {'error': str(e)}
+
+        try:
+            start_date, end_date = parse_date_range(args)
+        except ValueError as e:
+            return 400, {'error': f'Invalid date range: {e}'}
+
+        try:
+            async with self.session() as session:
+                return 200, await get_rooms_availability_async(session, room_ids, start_date, end_date)
+        except Exception as e:
+            logger.exception(f"ERROR: {e}")
+            return 500, {'ERROR': str(e)}
+
+    async def timeslots(self, args, room_id):
+        date = args.get('date')
+        if date:
+            try:
+                start_date = end_date = datetime.strptime(date, '%Y-%m-%d').date()
+            except ValueError as e:
+                # the flask route has always answered a bad date with an empty list
+                logger.error(f"Error in get_room_timeslots_service: {e}")
+                return 200, []
+        elif any(args.get(param) for param in ('start', 'end', 'month')):
+            try:
+                start_date, end_date = parse_date_range(args)
+            except ValueError as e:
+                return 400, {'error': f'Invalid date range: {e}'}
+        else:
+            return 400, {'error': 'Date parameter is required'}
+
+        try:
+            async with self.session() as session:
+                grid = await get_room_timeslots_range_async(session, room_id, start_date, end_date)
+        except Exception as e:
+            logger.exception(f"ERROR: {e}")
+            return 500, {'error': str(e)}
+        return 200, grid[start_date.isoformat()] if date else grid
@@ -0,0 +1,76 @@
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from .cache import availability_cache
+from .services import (availability_bookings_query, availability_showtimes_query, build_timeslot_grid,
+                       cached_availability, default_date_range, store_availability, store_summary_availability,
+                       summary_availability_query, summary_holds_query, timeslot_queries)
+
+# sync driver -> the asyncio driver for the same database
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'postgresql+psycopg2': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+    'sqlite+pysqlite': 'sqlite+aiosqlite',
+}
+
+
+def async_database_url(url):
+    """the app's database url with its driver swapped for the asyncio one"""
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+
+
+def create_async_sessionmaker(url, engine_options=None):
+    """an AsyncSession factory for the app's database.  has to be called from inside the
+    event loop that will use it, asyncpg connections belong to one loop"""
+    url = async_database_url(url)
+    engine_options = dict(engine_options or {})
+    if url.get_backend_name() == 'sqlite':
+        # aiosqlite doesn't use a queue pool, it takes no sizes
+        for option in ('pool_size', 'max_overflow', 'pool_timeout'):
+            engine_options.pop(option, None)
+    engine = create_async_engine(url, **engine_options)
+    return async_sessionmaker(engine, expire_on_commit=False)
+
+
+async def get_rooms_availability_async(session, room_ids, start_date=None, end_date=None):
+    """get_rooms_availability_service() on an AsyncSession, same queries, same cache"""
+    start_date, end_date = default_date_range(start_date, end_date)
+    availability, generations = cached_availability(room_ids, start_date, end_date)
+    if not generations:
+        return availability
+
+    summary_rows = (await session.execute(summary_availability_query(generations, start_date, end_date))).all()
+    held_rows = []
+    if summary_rows:
+        held_rows = (await session.execute(summary_holds_query(generations, start_date, end_date))).all()
+    generations = store_summary_availability(availability, generations, summary_rows, held_rows, start_date, end_date)
+    if not generations:
+        return {room_id: availability[room_id] for room_id in room_ids}
+
+    showtime_rows = (await session.execute(availability_showtimes_query(generations))).all()
+    showtime_room_ids = {room_id for room_id, _, _ in showtime_rows}
+    booking_rows = []
+    if showtime_room_ids:
+        booking_rows = (await session.execute(
+            availability_bookings_query(showtime_room_ids, start_date, end_date)
+        )).all()
+
+    return store_availability(room_ids, availability, generations, showtime_rows, booking_rows, start_date, end_date)
+
+
+async def get_room_timeslots_range_async(session, room_id, start_date, end_date):
+    """get_room_timeslots_range_service() on an AsyncSession"""
+    hit, grid = availability_cache.get(room_id, 'timeslots', start_date, end_date)
+    if hit:
+        return grid
+    generation = availability_cache.generation(room_id)
+
+    showtimes_query, bookings_query = timeslot_queries(room_id, start_date, end_date)
+    showtimes = (await session.execute(showtimes_query)).scalars().all()
+    booked = set((await session.execute(bookings_query)).all())
+
+    grid = build_timeslot_grid(showtimes, booked, start_date, end_date)
+    availability_cache.set(room_id, 'timeslots', start_date, end_date, grid, generation)
+    return grid
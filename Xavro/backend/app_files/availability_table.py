@@ -0,0 +1,224 @@
+from collections import defaultdict
+from datetime import timedelta
+from itertools import islice
+
+from sqlalchemy import delete, event, func, inspect, insert, select, update
+from sqlalchemy.orm import Session
+
+from .models import Booking, Room, RoomDayAvailability, Showtime
+
+REBUILD_BATCH_SIZE = 5000
+
+
+def mark_room_days(session, room_id, dates=None):
+    """note that a core statement changed a room's bookings on `dates` (or its showtimes, every
+    date).  the summary rows are brought up to date when the session commits, in the same
+    transaction"""
+    stale = session.info.setdefault('stale_room_days', {})
+    if dates is None or stale.get(room_id, ()) is None:
+        stale[room_id] = None
+    else:
+        stale.setdefault(room_id, set()).update(dates)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_orm_writes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Booking):
+            mark_room_days(session, obj.room_id, [obj.show_date])
+            # a booking moved to another room or day frees up the old one
+            state = inspect(obj)
+            old_room_ids = state.attrs.room_id.history.deleted or [obj.room_id]
+            old_dates = state.attrs.show_date.history.deleted or [obj.show_date]
+            for old_room_id in old_room_ids:
+                mark_room_days(session, old_room_id, old_dates)
+        elif isinstance(obj, Showtime):
+            mark_room_days(session, obj.room_id)
+            for old_room_id in inspect(obj).attrs.room_id.history.deleted or ():
+                mark_room_days(session, old_room_id)
+
+
+@event.listens_for(Session, 'before_commit')
+def _refresh_stale_days(session):
+    session.flush()  # before_commit runs ahead of the final flush, collect those writes too
+    while session.info.get('stale_room_days'):
+        stale = session.info.pop('stale_room_days')
+        # always lock rooms in the same order, two transactions can't end up waiting on each other
+        for room_id, dates in sorted(stale.items()):
+            refresh_room_days(session, room_id, dates)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _drop_rolled_back_days(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop('stale_room_days', None)
+
+
+def count_slots(template, booked, days):
+    """(date, total_slots, booked_slots) for each day.  template is {day_of_week: {timeslot}},
+    booked {date: {timeslot}}.  bookings outside the day's showtimes don't count, the same way
+    compute_free_timeslots ignores them"""
+    for single_date in days:
+        day_template = template.get(single_date.weekday(), set())
+        yield single_date, len(day_template), len(day_template & booked.get(single_date, set()))
+
+
+def room_template(session, room_id):
+    template = defaultdict(set)
+    rows = session.execute(select(Showtime.day_of_week, Showtime.timeslot).where(Showtime.room_id == room_id))
+    for day_of_week, timeslot in rows:
+        template[day_of_week].add(timeslot)
+    return template
+
+
+def room_bookings(session, room_id, start_date, end_date):
+    booked = defaultdict(set)
+    rows = session.execute(select(Booking.show_date, Booking.show_timeslot).where(
+        Booking.room_id == room_id,
+        Booking.show_date >= start_date,
+        Booking.show_date <= end_date
+    ))
+    for show_date, show_timeslot in rows:
+        booked[show_date].add(show_timeslot)
+    return booked
+
+
+def lock_room(session, room_id):
+    """lock the room's row until the transaction ends, every change to its summary rows is made
+    under it.  FOR NO KEY UPDATE so it doesn't wait on the key share locks that inserting
+    bookings take on the room.  returns False if the room doesn't exist"""
+    return session.execute(
+        select(Room.id).where(Room.id == room_id).with_for_update(key_share=True)
+    ).scalar() is not None
+
+
+def date_range(start_date, end_date):
+    return [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+
+
+def refresh_room_days(session, room_id, dates=None):
+    """recount a room's summary rows for `dates`, or for the whole window the table covers when
+    the showtimes changed (dates=None).
+
+    the room is locked before the bookings are counted, so two bookings on the same day
+    committing at once (or a booking and a rebuild) can't write a count that misses the other.
+    a booking on a day the table doesn't have a row for is left alone, only a showtime change
+    adds the missing days of the window"""
+    if dates is None:
+        window = session.execute(
+            select(func.min(RoomDayAvailability.show_date), func.max(RoomDayAvailability.show_date))
+        ).one()
+        if window[0] is None:
+            return  # the table hasn't been built
+        days = date_range(*window)
+    else:
+        days = sorted(dates)
+        if not days:
+            return
+
+    room_exists = lock_room(session, room_id)
+    existing = set(session.execute(
+        select(RoomDayAvailability.show_date).where(
+            RoomDayAvailability.room_id == room_id,
+            RoomDayAvailability.show_date.in_(days) if dates is not None
+            else RoomDayAvailability.show_date.between(days[0], days[-1])
+        )
+    ).scalars())
+    if not existing and dates is not None:
+        return
+
+    counts = count_slots(room_template(session, room_id), room_bookings(session, room_id, days[0], days[-1]), days)
+    updates = []
+    inserts = []
+    for single_date, total_slots, booked_slots in counts:
+        row = {'room_id': room_id, 'show_date': single_date, 'total_slots': total_slots, 'booked_slots': booked_slots}
+        if single_date in existing:
+            updates.append(row)
+        elif dates is None:
+            inserts.append(row)
+
+    if updates:
+        session.execute(update(RoomDayAvailability), updates)
+    if inserts and room_exists:
+        session.execute(insert(RoomDayAvailability), inserts)
+
+
+def compute_room_days(session, room_ids, start_date, end_date):
+    """the summary rows as the live showtimes and bookings say they should be, per room"""
+    days = date_range(start_date, end_date)
+    for room_id in room_ids:
+        template = room_template(session, room_id)
+        booked = room_bookings(session, room_id, start_date, end_date)
+        yield room_id, list(count_slots(template, booked, days))
+
+
+def rebuild_room_day_availability(session, start_date, end_date, room_ids=None):
+    """replace the summary rows from start_date to end_date (inclusive), one room per
+    transaction.  each room is locked before its bookings are counted, a booking committing
+    meanwhile waits and then recounts on top of the rebuilt rows.  returns the number of rows
+    written"""
+    if room_ids is None:
+        room_ids = session.execute(select(Room.id).order_by(Room.id)).scalars().all()
+
+    days = date_range(start_date, end_date)
+    written = 0
+    for room_id in room_ids:
+        if not lock_room(session, room_id):
+            session.rollback()
+            continue
+        counts = count_slots(room_template(session, room_id), room_bookings(session, room_id, start_date, end_date),
+                             days)
+        session.execute(delete(RoomDayAvailability).where(
+            RoomDayAvailability.room_id == room_id,
+            RoomDayAvailability.show_date.between(start_date, end_date)
+        ))
+        rows = iter(counts)
+        while True:
+            batch = [
+                {'room_id': room_id, 'show_date': single_date, 'total_slots': total_slots,
+                 'booked_slots': booked_slots}
+                for single_date, total_slots, booked_slots in islice(rows, REBUILD_BATCH_SIZE)
+            ]
+            if not batch:
+                break
+            session.execute(insert(RoomDayAvailability), batch)
+            written += len(batch)
+        # what was just written is already current, there is nothing to refresh on commit
+        session.info.pop('stale_room_days', None)
+        session.commit()
+    return written
+
+
+def check_room_day_availability(session, start_date=None, end_date=None):
+    """compare the summary rows with the live computation.  defaults to the window the table
+    covers.  returns one dict per day that is wrong, `found` is None for a missing row"""
+    if start_date is None or end_date is None:
+        window = session.execute(
+            select(func.min(RoomDayAvailability.show_date), func.max(RoomDayAvailability.show_date))
+        ).one()
+        if window[0] is None:
+            return []
+        start_date = start_date or window[0]
+        end_date = end_date or window[1]
+
+    stored = defaultdict(dict)
+    rows = session.execute(
+        select(RoomDayAvailability.room_id, RoomDayAvailability.show_date, RoomDayAvailability.total_slots,
+               RoomDayAvailability.booked_slots).where(RoomDayAvailability.show_date.between(start_date, end_date))
+    )
+    for room_id, show_date, total_slots, booked_slots in rows:
+        stored[room_id][show_date] = (total_slots, booked_slots)
+
+    room_ids = session.execute(select(Room.id).order_by(Room.id)).scalars().all()
+    mismatches = []
+    for room_id, counts in compute_room_days(session, room_ids, start_date, end_date):
+        for single_date, total_slots, booked_slots in counts:
+            found = stored[room_id].get(single_date)
+            if found != (total_slots, booked_slots):
+                mismatches.append({
+                    'room_id': room_id,
+                    'date': single_date.isoformat(),
+                    'expected': {'total_slots': total_slots, 'booked_slots': booked_slots},
+                    'found': None if found is None else {'total_slots': found[0], 'booked_slots': found[1]},
+                })
+    return mismatches
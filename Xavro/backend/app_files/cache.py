@@ -0,0 +1,205 @@
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+
+class AvailabilityCache:
+    """in-process LRU cache for availability and timeslot responses
+
+    entries are keyed by (room_id, kind, start_date, end_date) and expire after ttl seconds.
+    writes call invalidate() with the room and the dates they touched so only the entries
+    whose date range covers one of those dates get thrown away.
+
+    each gunicorn worker has its own copy, so the ttl is what bounds how stale a worker can
+    be after a write that was handled by a different worker"""
+
+    def __init__(self, max_entries=1024, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._keys_by_room = defaultdict(set)
+        self._generations = defaultdict(int)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def configure(self, max_entries, ttl):
+        with self._lock:
+            self.max_entries = max_entries
+            self.ttl = ttl
+            self._evict_overflow()
+
+    def generation(self, room_id):
+        """grab this before reading from the db and hand it back to set(), that way a result
+        computed while a write was invalidating the room never makes it into the cache"""
+        with self._lock:
+            return self._generations[room_id]
+
+    def get(self, room_id, kind, start_date, end_date):
+        """returns (True, value) on a hit and (False, None) on a miss"""
+        key = (room_id, kind, start_date, end_date)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def set(self, room_id, kind, start_date, end_date, value, generation):
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+
+        key = (room_id, kind, start_date, end_date)
+        with self._lock:
+            if self._generations[room_id] != generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            self._keys_by_room[room_id].add(key)
+            self._evict_overflow()
+
+    def invalidate(self, room_id, dates=None):
+        """drop the cached entries for a room, either all of them or only the ones whose date
+        range contains one of the given dates"""
+        with self._lock:
+            self._generations[room_id] += 1
+            self.invalidations += 1
+
+            for key in list(self._keys_by_room.get(room_id, ())):
+                _, _, start_date, end_date = key
+                if dates is None or any(start_date <= single_date <= end_date for single_date in dates):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_room.clear()
+            for room_id in self._generations:
+                self._generations[room_id] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        room_keys = self._keys_by_room.get(key[0])
+        if room_keys is not None:
+            room_keys.discard(key)
+            if not room_keys:
+                del self._keys_by_room[key[0]]
+
+    def _evict_overflow(self):
+        while len(self._entries) > max(self.max_entries, 0):
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+
+
+availability_cache = AvailabilityCache()
+
+
+class LookupCache:
+    """small LRU with a ttl for single row lookups, like the booking modal's customer by email.
+
+    misses are cached too (as None) since the modal mostly asks for addresses that don't exist
+    yet, so anything that writes a key has to invalidate() it.  like the availability cache
+    every worker has its own copy and the ttl bounds how stale the other workers get"""
+
+    def __init__(self, max_entries=4096, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def configure(self, max_entries, ttl):
+        with self._lock:
+            self.max_entries = max_entries
+            self.ttl = ttl
+            self._evict_overflow()
+
+    def generation(self):
+        """same idea as AvailabilityCache.generation(), a lookup that raced an invalidate()
+        doesn't get cached"""
+        with self._lock:
+            return self._generation
+
+    def get(self, key):
+        """returns (True, value) on a hit and (False, None) on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def set(self, key, value, generation):
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            if self._generation != generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            self._evict_overflow()
+
+    def invalidate(self, *keys):
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+    def _evict_overflow(self):
+        while len(self._entries) > max(self.max_entries, 0):
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+customer_cache = LookupCache()
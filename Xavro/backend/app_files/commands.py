@@ -0,0 +1,138 @@
+from collections import defaultdict
+from datetime import date, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from sqlalchemy import delete, inspect, select, update
+
+from .availability_table import check_room_day_availability, rebuild_room_day_availability
+from .cache import availability_cache, customer_cache
+from .models import MIGRATIONS_DIR, db, Booking, Customer, CustomerWaiver
+from .utils import normalize_email
+
+customers_cli = AppGroup('customers', help='customer maintenance jobs')
+availability_cli = AppGroup('availability', help='the room_day_availability summary table')
+
+
+def merge_duplicate_customers(session, dry_run=False):
+    """recompute every customer's email_key and merge customers that share one.
+
+    the lowest id of each group is kept, the other customers' bookings and signed waivers are
+    moved over to it and the duplicates are deleted (deleting first would cascade them away).
+    rows only get out of step if they were written around the models (raw sql, an old import)
+    or normalize_email() changes.  returns counts"""
+    customer_ids_by_key = defaultdict(list)
+    stale_keys = {}
+    rows = session.execute(
+        select(Customer.id, Customer.email, Customer.email_key).order_by(Customer.id)
+        .execution_options(yield_per=5000)
+    )
+    for customer_id, email, email_key in rows:
+        key = normalize_email(email)
+        customer_ids_by_key[key].append(customer_id)
+        if key != email_key:
+            stale_keys[customer_id] = key
+
+    merges = {ids[0]: ids[1:] for ids in customer_ids_by_key.values() if len(ids) > 1}
+    report = {
+        'stale_keys': len(stale_keys),
+        'duplicate_groups': len(merges),
+        'customers_merged': sum(len(duplicates) for duplicates in merges.values()),
+        'bookings_moved': 0,
+        'waivers_moved': 0
+    }
+    if dry_run:
+        return report
+
+    for keep_id, duplicate_ids in merges.items():
+        moved = session.execute(
+            update(Booking).where(Booking.customer_id.in_(duplicate_ids)).values(customer_id=keep_id)
+        )
+        report['bookings_moved'] += moved.rowcount
+        moved = session.execute(
+            update(CustomerWaiver).where(CustomerWaiver.customer_id.in_(duplicate_ids))
+            .values(customer_id=keep_id)
+        )
+        report['waivers_moved'] += moved.rowcount
+        session.execute(delete(Customer).where(Customer.id.in_(duplicate_ids)))
+        for duplicate_id in duplicate_ids:
+            stale_keys.pop(duplicate_id, None)
+
+    for customer_id, key in stale_keys.items():
+        session.execute(update(Customer).where(Customer.id == customer_id).values(email_key=key))
+
+    session.commit()
+    customer_cache.clear()
+    return report
+
+
+@customers_cli.command('dedupe')
+@click.option('--dry-run', is_flag=True, help='only report what would change')
+def dedupe_customers_command(dry_run):
+    """fix stale email keys and merge customers with the same normalized email"""
+    report = merge_duplicate_customers(db.session, dry_run=dry_run)
+    prefix = 'would merge' if dry_run else 'merged'
+    click.echo(f"{prefix} {report['customers_merged']} duplicate customers in "
+               f"{report['duplicate_groups']} groups, moved {report['bookings_moved']} bookings and "
+               f"{report['waivers_moved']} waivers, fixed {report['stale_keys']} email keys")
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """create the tables on an empty database and stamp it with the latest migration"""
+    from flask_migrate import stamp
+
+    tables = set(inspect(db.engine).get_table_names()) - {'alembic_version'}
+    if tables:
+        raise click.ClickException('the database already has tables, run `flask db upgrade` instead')
+    db.create_all(bind_key=None)  # the primary only, replicas get their schema through replication
+    stamp(directory=MIGRATIONS_DIR)
+    click.echo('created the tables and stamped the database with the latest migration')
+
+
+@availability_cli.command('rebuild')
+@click.option('--start', type=click.DateTime(['%Y-%m-%d']), help='first day, defaults to today')
+@click.option('--end', type=click.DateTime(['%Y-%m-%d']),
+              help='last day, defaults to AVAILABILITY_TABLE_DAYS after the start')
+@click.option('--room', 'room_ids', type=int, multiple=True, help='only these rooms, defaults to all of them')
+def rebuild_availability_command(start, end, room_ids):
+    """recompute the summary rows from the showtimes and bookings.  run it daily so the window
+    keeps moving forward, days it doesn't cover fall back to the live computation"""
+    start_date = start.date() if start else date.today()
+    end_date = end.date() if end else start_date + timedelta(days=current_app.config['AVAILABILITY_TABLE_DAYS'])
+    if end_date < start_date:
+        raise click.BadParameter('end must not be before start')
+
+    written = rebuild_room_day_availability(db.session, start_date, end_date, list(room_ids) or None)
+    availability_cache.clear()
+    click.echo(f"wrote {written} rows from {start_date} to {end_date}")
+
+
+@availability_cli.command('check')
+@click.option('--start', type=click.DateTime(['%Y-%m-%d']), help='defaults to the first day in the table')
+@click.option('--end', type=click.DateTime(['%Y-%m-%d']), help='defaults to the last day in the table')
+@click.option('--fix', is_flag=True, help='rebuild the rooms that are wrong')
+def check_availability_command(start, end, fix):
+    """compare the summary rows with the live showtimes and bookings, exits 1 if they differ"""
+    start_date = start.date() if start else None
+    end_date = end.date() if end else None
+    mismatches = check_room_day_availability(db.session, start_date, end_date)
+    for mismatch in mismatches[:20]:
+        click.echo(f"room {mismatch['room_id']} on {mismatch['date']}: expected {mismatch['expected']}, "
+                   f"found {mismatch['found']}")
+    if len(mismatches) > 20:
+        click.echo(f"... and {len(mismatches) - 20} more")
+
+    if not mismatches:
+        click.echo('the summary table matches the bookings')
+        return
+    if fix:
+        dates = [date.fromisoformat(mismatch['date']) for mismatch in mismatches]
+        room_ids = sorted({mismatch['room_id'] for mismatch in mismatches})
+        written = rebuild_room_day_availability(db.session, min(dates), max(dates), room_ids)
+        availability_cache.clear()
+        click.echo(f"rebuilt {len(room_ids)} rooms, wrote {written} rows")
+        return
+    raise click.ClickException(f"{len(mismatches)} days are out of step, run with --fix or `flask availability rebuild`")
@@ -0,0 +1,258 @@
+import asyncio
+import json
+import logging
+import os
+import select as select_module
+import threading
+import time
+import uuid
+from collections import deque
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from .models import Booking
+
+logger = logging.getLogger(__name__)
+
+SLOT_TAKEN = 'slot-taken'
+SLOT_FREED = 'slot-freed'
+# sent instead of the missed events when a client resumes from an id that is no longer kept,
+# the client should refetch what it shows
+RESET = 'reset'
+
+
+def record_slot_event(session, kind, room_id, show_date, timeslot):
+    """queue a slot-taken / slot-freed event, it is published once the session commits.  only
+    needed for core statements, orm booking writes are picked up by the flush hook below"""
+    session.info.setdefault('pending_events', []).append({
+        'type': kind,
+        'room_id': room_id,
+        'date': show_date.isoformat(),
+        'timeslot': timeslot,
+    })
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_booking_events(session, flush_context):
+    for obj in session.new:
+        if isinstance(obj, Booking):
+            record_slot_event(session, SLOT_TAKEN, obj.room_id, obj.show_date, obj.show_timeslot)
+    for obj in session.deleted:
+        if isinstance(obj, Booking):
+            record_slot_event(session, SLOT_FREED, obj.room_id, obj.show_date, obj.show_timeslot)
+    for obj in session.dirty:
+        if not isinstance(obj, Booking):
+            continue
+        state = inspect(obj)
+        histories = [state.attrs[name].history for name in ('room_id', 'show_date', 'show_timeslot')]
+        if not any(history.deleted for history in histories):
+            continue
+        old_room_id, old_show_date, old_timeslot = [
+            history.deleted[0] if history.deleted else history.unchanged[0] for history in histories
+        ]
+        record_slot_event(session, SLOT_FREED, old_room_id, old_show_date, old_timeslot)
+        record_slot_event(session, SLOT_TAKEN, obj.room_id, obj.show_date, obj.show_timeslot)
+
+
+@event.listens_for(Session, 'before_commit')
+def _notify_pending_events(session):
+    # postgres only delivers a NOTIFY if the transaction commits, so it is sent inside it
+    if not event_broker.uses_postgres:
+        return
+    session.flush()
+    for pending in session.info.pop('pending_events', ()):
+        pending['id'] = uuid.uuid4().hex
+        session.execute(select(func.pg_notify(event_broker.channel, json.dumps(pending))))
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_pending_events(session):
+    # left empty by _notify_pending_events with the postgres backend
+    for pending in session.info.pop('pending_events', ()):
+        event_broker.publish(pending)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _drop_rolled_back_events(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop('pending_events', None)
+
+
+class EventBroker:
+    """fans booking events out to the SSE subscribers of this process.
+
+    the last EVENTS_HISTORY events are kept in one shared ring buffer and every subscriber
+    just remembers how far it has read, so an idle subscriber costs a cursor and a publish is
+    one append plus a wake-up, whatever the number of subscribers.  threads wait on a
+    Condition, asyncio subscribers on one future per event loop.
+
+    with EVENTS_BACKEND=postgres the events go through LISTEN/NOTIFY instead of straight into
+    the buffer, so every gunicorn worker sees the bookings made by the others.  each event's
+    id is picked by the worker that sent it, so Last-Event-ID resumes on any worker"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._history = deque()
+        self._seq_by_id = {}
+        self._seq = 0  # how many events this process has published
+        # local ids are <epoch>-<seq>, so an id from before a restart (or from another worker)
+        # isn't mistaken for one of ours
+        self._epoch = uuid.uuid4().hex[:8]
+        self._loop_futures = {}
+        self.history_size = 1000
+        self.backend = 'local'
+        self.channel = 'xavro_events'
+        self.keepalive = 15
+        self._listen_url = None
+        self._listener_pid = None
+
+    def init_app(self, app, db):
+        self.history_size = app.config['EVENTS_HISTORY']
+        self.backend = app.config['EVENTS_BACKEND']
+        self.channel = app.config['EVENTS_CHANNEL']
+        self.keepalive = app.config['EVENTS_KEEPALIVE']
+        if self.uses_postgres:
+            with app.app_context():
+                # psycopg2 takes the url without the +driver part
+                self._listen_url = db.engine.url.set(drivername='postgresql').render_as_string(hide_password=False)
+
+    @property
+    def uses_postgres(self):
+        return self.backend == 'postgres'
+
+    def publish(self, payload):
+        """add an event to this process' buffer and wake the subscribers.  with the postgres
+        backend only the LISTEN thread calls this, the commits go through _notify_pending_events"""
+        with self._condition:
+            self._seq += 1
+            payload = dict(payload, id=payload.get('id') or f'{self._epoch}-{self._seq}')
+            if len(self._history) >= self.history_size:
+                _, evicted = self._history.popleft()
+                self._seq_by_id.pop(evicted['id'], None)
+            self._history.append((self._seq, payload))
+            self._seq_by_id[payload['id']] = self._seq
+            self._condition.notify_all()
+            futures = list(self._loop_futures.items())
+            self._loop_futures.clear()
+        for loop, future in futures:
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                pass  # the loop has been closed since, nobody is waiting on it
+
+    def subscribe(self, last_event_id=None):
+        """the cursor a new subscriber reads from and the events it has to be sent first.
+        resuming from an id that has dropped out of the buffer gives one reset event"""
+        self.ensure_listening()
+        with self._condition:
+            if not last_event_id:
+                return self._seq, []
+            seq = self._seq_by_id.get(last_event_id)
+            if seq is None:
+                return self._seq, [self._reset()]
+            return self._read(seq)
+
+    def _read(self, cursor):
+        if not self._history or self._seq <= cursor:
+            return cursor, []
+        first_seq = self._history[0][0]
+        if cursor < first_seq - 1:
+            # the subscriber fell further behind than the buffer goes back
+            return self._seq, [self._reset()]
+        return self._seq, [payload for seq, payload in self._history if seq > cursor]
+
+    def _reset(self):
+        # carries the newest id so the client resumes from here next time, an empty id clears
+        # the browser's Last-Event-ID when there is nothing buffered yet
+        return {'type': RESET, 'id': self._history[-1][1]['id'] if self._history else ''}
+
+    def wait(self, cursor, timeout):
+        """block the thread until there are events after `cursor` or `timeout` seconds pass.
+        returns (new cursor, events)"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._seq > cursor, timeout)
+            return self._read(cursor)
+
+    async def wait_async(self, cursor, timeout):
+        """wait() for asyncio, all of a loop's subscribers share one future"""
+        loop = asyncio.get_running_loop()
+        with self._condition:
+            if self._seq <= cursor:
+                future = self._loop_futures.get(loop)
+                if future is None:
+                    future = self._loop_futures[loop] = loop.create_future()
+            else:
+                future = None
+        if future is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(future), timeout)
+            except asyncio.TimeoutError:
+                pass
+        with self._condition:
+            return self._read(cursor)
+
+    def ensure_listening(self):
+        """start the LISTEN thread in this process (a forked worker doesn't inherit it)"""
+        if not self.uses_postgres or self._listener_pid == os.getpid():
+            return
+        with self._condition:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+        threading.Thread(target=self._listen, name='xavro-events-listen', daemon=True).start()
+
+    def _listen(self):
+        import psycopg2
+        import psycopg2.extensions
+
+        while True:
+            try:
+                connection = psycopg2.connect(self._listen_url)
+                connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with connection.cursor() as cursor:
+                    cursor.execute(f'LISTEN "{self.channel}"')
+                logger.info(f"listening for booking events on {self.channel}")
+                while True:
+                    if select_module.select([connection], [], [], self.keepalive) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        notify = connection.notifies.pop(0)
+                        self.publish(json.loads(notify.payload))
+            except Exception as e:
+                logger.error(f"event listener lost its connection: {e}")
+                # anything sent while we were away is gone, tell the subscribers to refetch
+                self.publish({'type': RESET, 'id': uuid.uuid4().hex})
+                time.sleep(5)
+
+    def stats(self):
+        with self._condition:
+            return {
+                'backend': self.backend,
+                'published': self._seq,
+                'buffered': len(self._history),
+                'asyncio_loops_waiting': len(self._loop_futures),
+            }
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+def format_event(payload):
+    """one server-sent event"""
+    data = {key: value for key, value in payload.items() if key not in ('id', 'type')}
+    return f"id: {payload['id']}\nevent: {payload['type']}\ndata: {json.dumps(data)}\n\n"
+
+
+def event_filter(rooms_arg):
+    """?rooms=1,2 -> a predicate over events, reset events always pass"""
+    if not rooms_arg:
+        return lambda payload: True
+    room_ids = {int(room_id) for room_id in rooms_arg.split(',') if room_id.strip()}
+    return lambda payload: payload['type'] == RESET or payload.get('room_id') in room_ids
+
+
+event_broker = EventBroker()
@@ -0,0 +1,59 @@
+import csv
+import io
+import json
+from datetime import date, datetime, time
+
+from flask import Response, stream_with_context
+
+from .models import db
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def _export_value(value):
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    return value
+
+
+def _ndjson_lines(columns, rows):
+    return ''.join(
+        json.dumps({column: _export_value(value) for column, value in zip(columns, row)}) + '\n'
+        for row in rows
+    )
+
+
+def _csv_lines(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([_export_value(value) for value in row] for row in rows)
+    return buffer.getvalue()
+
+
+def stream_export(statement, export_format, filename):
+    """stream the rows of a select() back to the client as NDJSON or CSV.
+
+    the rows come off a server side cursor EXPORT_BATCH_SIZE at a time and each batch is
+    written out before the next one is fetched, so memory stays flat however big the table is"""
+    columns = [column.name for column in statement.selected_columns]
+
+    def generate():
+        if export_format == 'csv':
+            yield _csv_lines([columns])
+
+        result = db.session.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        try:
+            for batch in result.partitions():
+                if export_format == 'csv':
+                    yield _csv_lines(batch)
+                else:
+                    yield _ndjson_lines(columns, batch)
+        finally:
+            result.close()
+
+    response = Response(stream_with_context(generate()), mimetype=EXPORT_FORMATS[export_format])
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}.{export_format}'
+    return response
@@ -0,0 +1,150 @@
+import heapq
+import logging
+import os
+import threading
+from datetime import timedelta
+
+from sqlalchemy import delete, exists, func, select
+
+from .cache import availability_cache
+from .events import SLOT_FREED, record_slot_event
+from .models import SlotHold, db
+from .utils import utc_now
+from .versions import record_write
+
+logger = logging.getLogger(__name__)
+
+EXPIRY_RETRY_SECONDS = 30
+
+
+def live_holds_query(columns, room_ids, start_date, end_date):
+    """`columns` of the holds that haven't expired on the rooms in the range, to be unioned with
+    the bookings wherever a held slot has to look taken"""
+    return select(*columns).where(
+        SlotHold.room_id.in_(list(room_ids)),
+        SlotHold.show_date >= start_date,
+        SlotHold.show_date <= end_date,
+        SlotHold.expires_at > utc_now()
+    )
+
+
+def lock_slot(session, room_id, show_date, show_timeslot):
+    """take the timeslot's lock for the rest of the transaction.  everything that books or holds
+    a slot takes it before checking the slot is free, so the check runs after whichever
+    transaction had the lock committed and sees its booking or hold.  a transaction-level
+    advisory lock on postgres, sqlite only lets one transaction write at a time anyway"""
+    if session.get_bind(mapper=SlotHold).dialect.name == 'postgresql':
+        session.execute(select(func.pg_advisory_xact_lock(room_id, show_date.toordinal() * 1000 + show_timeslot)))
+
+
+def slot_is_held(room_id, show_date, show_timeslot, now):
+    return exists().where(
+        SlotHold.room_id == room_id,
+        SlotHold.show_date == show_date,
+        SlotHold.show_timeslot == show_timeslot,
+        SlotHold.expires_at > now
+    )
+
+
+def free_held_slots(session, rows):
+    """a released or expired hold's (room_id, show_date, show_timeslot) rows are free again"""
+    for room_id, show_date, show_timeslot in rows:
+        record_write(session, 'booking', room_id)
+        record_slot_event(session, SLOT_FREED, room_id, show_date, show_timeslot)
+
+
+def expire_holds(session, hold_ids):
+    """delete the holds in hold_ids that have run out and commit.  a hold that was converted,
+    released or taken over again since it was scheduled doesn't match and is skipped.
+    returns the number deleted"""
+    rows = session.execute(
+        delete(SlotHold)
+        .where(SlotHold.id.in_(hold_ids), SlotHold.expires_at <= utc_now())
+        .returning(SlotHold.room_id, SlotHold.show_date, SlotHold.show_timeslot)
+    ).all()
+    free_held_slots(session, rows)
+    session.commit()
+    for room_id, show_date, _ in rows:
+        availability_cache.invalidate(room_id, [show_date])
+    return len(rows)
+
+
+class HoldExpiryScheduler:
+    """deletes slot holds when they run out.
+
+    every hold this worker knows about sits on a heap ordered by expires_at and one thread
+    sleeps until the earliest one is due, so expiry is a pop and a delete by primary key, never
+    a scan of slot_holds.  converting or releasing a hold leaves its heap entry alone, the
+    delete just doesn't match it any more.
+
+    each worker expires the holds it made plus the ones already in the table when it started,
+    a hold whose worker went away is still ignored once expired (every read checks
+    expires_at) and the next hold on that slot takes its row over"""
+
+    def __init__(self):
+        self._heap = []  # (expires_at, hold id)
+        self._condition = threading.Condition()
+        self._pid = None
+        self.app = None
+        self.expired = 0
+
+    def init_app(self, app):
+        self.app = app
+
+    def schedule(self, session, hold_id, expires_at):
+        self.ensure_running(session)
+        with self._condition:
+            heapq.heappush(self._heap, (expires_at, hold_id))
+            if self._heap[0][1] == hold_id:
+                self._condition.notify()  # due before whatever the thread is sleeping on
+
+    def ensure_running(self, session):
+        """start the expiry thread in this process (a forked worker doesn't inherit it) with the
+        holds that are already in the table"""
+        if self._pid == os.getpid():
+            return
+        with self._condition:
+            if self._pid == os.getpid():
+                return
+            self._heap = [(expires_at, hold_id) for hold_id, expires_at in
+                          session.execute(select(SlotHold.id, SlotHold.expires_at)).all()]
+            heapq.heapify(self._heap)
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name='xavro-hold-expiry', daemon=True).start()
+
+    def _due(self):
+        """block until holds are due and pop them"""
+        with self._condition:
+            while not self._heap or self._heap[0][0] > utc_now():
+                timeout = (self._heap[0][0] - utc_now()).total_seconds() if self._heap else None
+                self._condition.wait(timeout)
+            due = []
+            while self._heap and self._heap[0][0] <= utc_now():
+                due.append(heapq.heappop(self._heap)[1])
+            return due
+
+    def _run(self):
+        while True:
+            due = self._due()
+            try:
+                with self.app.app_context():
+                    self.expired += expire_holds(db.session, due)
+            except Exception as e:
+                logger.exception(f"expiring slot holds {due} failed: {e}")
+                # try again in a while, reads already see them as free
+                retry_at = utc_now() + timedelta(seconds=EXPIRY_RETRY_SECONDS)
+                with self._condition:
+                    for hold_id in due:
+                        heapq.heappush(self._heap, (retry_at, hold_id))
+
+    def stats(self):
+        with self._condition:
+            return {
+                'running': self._pid == os.getpid(),
+                'scheduled': len(self._heap),
+                'next_expiry': self._heap[0][0].isoformat() if self._heap else None,
+                'expired': self.expired,
+            }
+
+
+hold_expiry = HoldExpiryScheduler()
@@ -0,0 +1,219 @@
+import csv
+import io
+from collections import defaultdict
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.exc import SQLAlchemyError
+
+from .availability_table import mark_room_days
+from .events import SLOT_TAKEN, record_slot_event
+from .models import Booking, Customer, SlotHold
+from .utils import normalize_email, utc_now
+from .versions import record_write
+
+IMPORT_BATCH_SIZE = 1000
+
+
+def read_import_rows(request):
+    """rows to import, either a JSON array of objects in the body or an uploaded CSV file
+    (multipart field `file`) with a header row.  raises ValueError if neither is there"""
+    upload = request.files.get('file')
+    if upload is not None:
+        return csv.DictReader(io.TextIOWrapper(upload.stream, encoding='utf-8-sig'))
+
+    data = request.get_json(silent=True)
+    if isinstance(data, list):
+        return iter(data)
+    raise ValueError("send a JSON array of rows or upload a CSV file in the 'file' field")
+
+
+def _required(row, key):
+    value = row.get(key)
+    if value is None or value == '':
+        raise ValueError(f"missing required field '{key}'")
+    return value
+
+
+def _text(row, key, required=True):
+    """a text field, a number or a list in a JSON row is a row error rather than whatever the
+    database makes of it"""
+    value = _required(row, key) if required else row.get(key)
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f"'{key}' must be a string")
+    return value
+
+
+def _to_bool(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        return value
+    if str(value).strip().lower() in ('true', '1', 'yes', 'y'):
+        return True
+    if str(value).strip().lower() in ('false', '0', 'no', 'n'):
+        return False
+    raise ValueError(f"'{value}' is not a boolean")
+
+
+def parse_customer_row(row):
+    email = _text(row, 'email').strip()
+    return {
+        'first_name': _text(row, 'first_name'),
+        'last_name': _text(row, 'last_name'),
+        'email': email,
+        'email_key': normalize_email(email),
+        'is_minor': _to_bool(row.get('is_minor')),
+        'is_banned': _to_bool(row.get('is_banned')),
+        'customer_notes': _text(row, 'customer_notes', required=False) or ''
+    }
+
+
+def parse_booking_row(row):
+    return {
+        'room_id': int(_required(row, 'room_id')),
+        'customer_id': int(_required(row, 'customer_id')),
+        'guest_count': int(_required(row, 'guest_count')),
+        'order_id': str(_required(row, 'order_id')),
+        'booking_date': datetime.strptime(_required(row, 'booking_date'), '%Y-%m-%d').date(),
+        'show_date': datetime.strptime(_required(row, 'show_date'), '%Y-%m-%d').date(),
+        'show_timeslot': int(_required(row, 'show_timeslot'))
+    }
+
+
+def _slot(values):
+    return values['room_id'], values['show_date'], values['show_timeslot']
+
+
+def _drop_taken_timeslots(session, batch, seen_slots, errors):
+    """bookings can't share a timeslot with an existing booking, a live hold or an earlier row
+    of the same import.  one query per batch finds the ones that are already in the db"""
+    wanted = {_slot(values) for _, values in batch}
+    taken = set(session.execute(
+        select(Booking.room_id, Booking.show_date, Booking.show_timeslot).where(
+            tuple_(Booking.room_id, Booking.show_date, Booking.show_timeslot).in_(wanted)
+        )
+    ).all())
+    held = set(session.execute(
+        select(SlotHold.room_id, SlotHold.show_date, SlotHold.show_timeslot).where(
+            tuple_(SlotHold.room_id, SlotHold.show_date, SlotHold.show_timeslot).in_(wanted),
+            SlotHold.expires_at > utc_now()
+        )
+    ).all())
+
+    free = []
+    for row_number, values in batch:
+        slot = _slot(values)
+        if slot in taken or slot in seen_slots:
+            errors.append({'row': row_number, 'error': 'this timeslot has already been booked'})
+            continue
+        if slot in held:
+            errors.append({'row': row_number, 'error': 'this timeslot is being held for another customer'})
+            continue
+        seen_slots.add(slot)
+        free.append((row_number, values))
+    return free
+
+
+def _drop_known_emails(session, batch, seen_emails, errors):
+    """customers are unique by normalized email, same idea as _drop_taken_timeslots"""
+    wanted = {values['email_key'] for _, values in batch}
+    known = set(session.execute(select(Customer.email_key).where(Customer.email_key.in_(wanted))).scalars())
+
+    new = []
+    for row_number, values in batch:
+        if values['email_key'] in known or values['email_key'] in seen_emails:
+            errors.append({'row': row_number, 'error': 'a customer with this email already exists'})
+            continue
+        seen_emails.add(values['email_key'])
+        new.append((row_number, values))
+    return new
+
+
+def _insert_batch(session, model, batch, errors):
+    """insert a batch with one executemany.  if the database rejects it (a foreign key or the
+    unique timeslot index) fall back to one savepoint per row so only the bad rows fail"""
+    if not batch:
+        return []
+    try:
+        with session.begin_nested():
+            session.execute(insert(model), [values for _, values in batch])
+        return batch
+    except SQLAlchemyError:
+        pass
+
+    inserted = []
+    for row_number, values in batch:
+        try:
+            with session.begin_nested():
+                session.execute(insert(model), [values])
+            inserted.append((row_number, values))
+        except SQLAlchemyError as e:
+            errors.append({'row': row_number, 'error': str(getattr(e, 'orig', e))})
+    return inserted
+
+
+def bulk_import(session, model, rows, batch_size=IMPORT_BATCH_SIZE):
+    """validate and insert rows batch_size at a time, committing after every batch.
+
+    rows that fail validation or are rejected by the database are reported back with their
+    1-based row number instead of aborting the import.  a CSV that stops decoding part way
+    through (not utf-8, a broken quote) keeps the batches before it, the rest of the file is
+    reported as one error on the row it couldn't read.  returns (report, inserted values)"""
+    parse_row = parse_booking_row if model is Booking else parse_customer_row
+    errors = []
+    inserted = []
+    seen_slots = set()
+    seen_emails = set()
+    rows = enumerate(rows, start=1)
+    rows_read = 0
+    unreadable = False
+
+    while not unreadable:
+        chunk = []
+        try:
+            for row_number, row in islice(rows, batch_size):
+                chunk.append((row_number, row))
+                rows_read = row_number
+        except (UnicodeDecodeError, csv.Error) as e:
+            errors.append({'row': rows_read + 1, 'error': f'could not read the rest of the file: {e}'})
+            unreadable = True
+        if not chunk:
+            break
+
+        batch = []
+        for row_number, row in chunk:
+            if not isinstance(row, dict):
+                errors.append({'row': row_number, 'error': 'row must be an object'})
+                continue
+            try:
+                batch.append((row_number, parse_row(row)))
+            except (KeyError, TypeError, ValueError) as e:
+                errors.append({'row': row_number, 'error': str(e)})
+
+        if model is Booking and batch:
+            batch = _drop_taken_timeslots(session, batch, seen_slots, errors)
+        elif model is Customer and batch:
+            batch = _drop_known_emails(session, batch, seen_emails, errors)
+
+        batch_inserted = [values for _, values in _insert_batch(session, model, batch, errors)]
+        if model is Booking:
+            dates_by_room = defaultdict(set)
+            for values in batch_inserted:
+                dates_by_room[values['room_id']].add(values['show_date'])
+                record_slot_event(session, SLOT_TAKEN, values['room_id'], values['show_date'],
+                                  values['show_timeslot'])
+            for room_id, dates in dates_by_room.items():
+                record_write(session, 'booking', room_id)
+                mark_room_days(session, room_id, dates)
+        inserted.extend(batch_inserted)
+        session.commit()
+
+    errors.sort(key=lambda error: error['row'])
+    report = {
+        'inserted': len(inserted),
+        'failed': len(errors),
+        'errors': errors
+    }
+    return report, inserted
@@ -0,0 +1,202 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+
+from flask import g, request
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+# the request being handled on this thread / asyncio task: request_id, method, route, started
+current_request = ContextVar('current_request', default=None)
+
+access_logger = logging.getLogger('xavro.access')
+
+
+class JsonFormatter(logging.Formatter):
+    """one JSON object per line, with the request fields the queue handler copied onto the record"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in ('request_id', 'method', 'route', 'status', 'duration_ms'):
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks the caller, when the queue is full the record is thrown
+    away and counted instead"""
+
+    def __init__(self, pipeline):
+        super().__init__(None)
+        self.pipeline = pipeline
+
+    def prepare(self, record):
+        # formatting happens on the listener thread, only the cheap parts are done here: the
+        # message is resolved now (its args could change later) and the request fields copied
+        # because the listener thread can't see the request
+        record.msg = record.getMessage()
+        record.args = None
+        info = current_request.get()
+        if info is not None:
+            record.request_id = info['request_id']
+            record.method = info['method']
+            record.route = info['route']
+            if getattr(record, 'duration_ms', None) is None:
+                record.duration_ms = round((time.perf_counter() - info['started']) * 1000, 3)
+        return record
+
+    def enqueue(self, record):
+        self.pipeline.put(record)
+
+
+class DrainingQueueListener(QueueListener):
+    def stop(self, timeout=5):
+        # the stock stop() fails on a full queue (put_nowait) and can wait forever on a stuck
+        # handler, give the writer a few seconds to make room and finish instead
+        if self._thread is None:
+            return
+        try:
+            self.queue.put(self._sentinel, timeout=timeout)
+            self._thread.join(timeout)
+        except queue.Full:
+            pass
+        self._thread = None
+
+
+class LogPipeline:
+    """moves log output off the request path.  the handlers (stdout and LOG_FILE) sit behind a
+    QueueListener thread, logging only puts the record on a bounded queue.
+
+    the listener is started lazily in each process, a gunicorn worker forked from a preloaded
+    app doesn't inherit the master's thread"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.capacity = 10000
+        self.handlers = []
+        self.own_files = set()  # loggers written to a file of their own instead (add_file)
+        self.queue = None
+        self.listener = None
+        self._pid = None
+        self.dropped = 0
+
+    def init_app(self, app):
+        self.capacity = app.config['LOG_QUEUE_SIZE']
+        formatter = JsonFormatter()
+        self.stop()  # a second init_app (the tests) starts a listener with the new handlers
+        self.own_files = set()
+        self.handlers = [logging.StreamHandler(sys.stdout)]
+        if app.config['LOG_FILE']:
+            # WatchedFileHandler reopens the file after logrotate moves it, safe with many workers
+            self.handlers.append(WatchedFileHandler(app.config['LOG_FILE']))
+        for handler in self.handlers:
+            handler.setFormatter(formatter)
+            handler.addFilter(lambda record: record.name not in self.own_files)
+
+        root = logging.getLogger()
+        for handler in [handler for handler in root.handlers if isinstance(handler, DroppingQueueHandler)]:
+            root.removeHandler(handler)
+        root.addHandler(DroppingQueueHandler(self))
+        root.setLevel(app.config['LOG_LEVEL'])
+
+        app.before_request(self._start_request)
+        app.after_request(self._log_request)
+        app.teardown_request(self._end_request)
+
+    def add_file(self, logger, path):
+        """write `logger`'s records, already formatted, to a file of their own through the same
+        queue and thread, instead of stdout / LOG_FILE.  every worker appends to the one file"""
+        handler = WatchedFileHandler(path, delay=True)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        handler.addFilter(lambda record: record.name == logger.name)
+        self.stop()  # the listener picks up its handlers when it starts
+        self.handlers.append(handler)
+        self.own_files.add(logger.name)
+
+        for existing in list(logger.handlers):
+            if isinstance(existing, DroppingQueueHandler):
+                logger.removeHandler(existing)
+        logger.addHandler(DroppingQueueHandler(self))
+        logger.propagate = False
+
+    def _start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self.queue = queue.Queue(self.capacity)
+            self.listener = DrainingQueueListener(self.queue, *self.handlers, respect_handler_level=True)
+            self.listener.start()
+            self._pid = os.getpid()
+        atexit.register(self.stop)
+
+    def put(self, record):
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def stop(self):
+        # flush what's queued on shutdown
+        with self._lock:
+            if self.listener is not None and self._pid == os.getpid():
+                self.listener.stop()
+                self.listener = None
+                self._pid = None
+
+    def stats(self):
+        return {
+            'queued': self.queue.qsize() if self.queue is not None else 0,
+            'capacity': self.capacity,
+            'dropped': self.dropped,
+        }
+
+    @staticmethod
+    def _start_request():
+        g.log_token = current_request.set({
+            # an id from the proxy in front of us is passed through so the two logs line up
+            'request_id': request.headers.get(REQUEST_ID_HEADER, '')[:128] or uuid.uuid4().hex,
+            'method': request.method,
+            'route': request.url_rule.rule if request.url_rule is not None else request.path,
+            'started': time.perf_counter(),
+        })
+
+    @staticmethod
+    def _log_request(response):
+        info = current_request.get()
+        if info is None:
+            return response
+        response.headers[REQUEST_ID_HEADER] = info['request_id']
+        duration_ms = round((time.perf_counter() - info['started']) * 1000, 3)
+        access_logger.info(f"{request.method} {request.path} {response.status_code}",
+                           extra={'status': response.status_code, 'duration_ms': duration_ms})
+        return response
+
+    @staticmethod
+    def _end_request(exception=None):
+        token = g.pop('log_token', None)
+        if token is not None:
+            current_request.reset(token)
+
+
+log_pipeline = LogPipeline()
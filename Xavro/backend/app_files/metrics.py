@@ -0,0 +1,151 @@
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from flask import Response, abort, g, has_request_context, request
+from sqlalchemy import event
+
+from .logs import current_request
+from .models import db
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # seconds
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+UNMATCHED_ROUTE = '<unmatched>'  # 404s, so random urls can't blow up the number of series
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RequestMetrics:
+    """latency, status and sql counters per route, in the prometheus text format.
+
+    the route is the url rule (/api/rooms/<int:room_id>/availability) rather than the path so
+    every room shares one series, the asyncio routes in async_app.py report under the rule of
+    the flask route they stand in for.  the numbers are per worker process like every other
+    in-process stat here, with several gunicorn workers each scrape sees one of them.
+
+    /metrics is a 404 unless METRICS_TOKEN is set, the scraper then sends it as a bearer token"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.request_latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))  # (method, route)
+        self.sql_queries = defaultdict(lambda: Histogram(QUERY_COUNT_BUCKETS))  # (method, route)
+        self.sql_latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))  # (method, route)
+        self.responses = defaultdict(int)  # (method, route, status)
+        self._engines = set()
+        self.token = None
+
+    def init_app(self, app):
+        self.token = app.config['METRICS_TOKEN']
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self.render_response, methods=['GET'])
+
+        with app.app_context():
+            for engine in db.engines.values():
+                self.track(engine)
+
+    def track(self, engine):
+        if engine in self._engines:
+            return
+        self._engines.add(engine)
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # on the statement's execution context, which goes away with it even if it raises
+        if context is not None:
+            context._xavro_metrics_started = time.perf_counter()
+
+    @staticmethod
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_xavro_metrics_started', None)
+        if started is None:
+            return
+        if has_request_context():
+            if 'metrics_started' in g:
+                g.metrics_sql_count += 1
+                g.metrics_sql_time += time.perf_counter() - started
+            return
+        # an asyncio route, CalendarApp keeps its counts on the request's log context
+        info = current_request.get()
+        if info is not None and 'sql_count' in info:
+            info['sql_count'] += 1
+            info['sql_time'] += time.perf_counter() - started
+
+    @staticmethod
+    def _start_request():
+        g.metrics_started = time.perf_counter()
+        g.metrics_sql_count = 0
+        g.metrics_sql_time = 0.0
+
+    def _finish_request(self, response):
+        if 'metrics_started' not in g:
+            return response
+        route = request.url_rule.rule if request.url_rule is not None else UNMATCHED_ROUTE
+        self.observe(request.method, route, response.status_code, time.perf_counter() - g.metrics_started,
+                     g.metrics_sql_count, g.metrics_sql_time)
+        return response
+
+    def observe(self, method, route, status, elapsed, sql_count, sql_time):
+        key = (method, route)
+        with self._lock:
+            self.request_latency[key].observe(elapsed)
+            self.sql_queries[key].observe(sql_count)
+            self.sql_latency[key].observe(sql_time)
+            self.responses[(method, route, status)] += 1
+
+    def render(self):
+        lines = []
+        with self._lock:
+            self._render_histograms(lines, 'xavro_http_request_duration_seconds',
+                                    'time spent handling a request', self.request_latency)
+            lines += ['# HELP xavro_http_responses_total responses sent by status code',
+                      '# TYPE xavro_http_responses_total counter']
+            for (method, route, status), total in sorted(self.responses.items()):
+                lines.append(f'xavro_http_responses_total{{{_labels(method, route)},status="{status}"}} {total}')
+            self._render_histograms(lines, 'xavro_sql_queries_per_request',
+                                    'sql statements run by a request', self.sql_queries)
+            self._render_histograms(lines, 'xavro_sql_duration_seconds_per_request',
+                                    'time a request spent waiting on sql statements', self.sql_latency)
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_histograms(lines, name, description, histograms):
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+        for (method, route), histogram in sorted(histograms.items()):
+            labels = _labels(method, route)
+            cumulative = 0
+            for bucket, bucket_count in zip((*histogram.buckets, '+Inf'), histogram.counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{{labels},le="{bucket}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{labels}}} {histogram.sum}')
+            lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+
+    def render_response(self):
+        if not self.token:
+            abort(404)
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {self.token}'):
+            abort(401)
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+
+def _labels(method, route):
+    route = route.replace('\\', '\\\\').replace('"', '\\"')
+    return f'method="{method}",route="{route}"'
+
+
+request_metrics = RequestMetrics()
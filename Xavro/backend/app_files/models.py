@@ -1,17 +1,37 @@
+import os
+
+import click
+from flask.cli import FlaskGroup
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
+
+from .replicas import RoutingSession
+from .utils import PaymentStatus, Roles, normalize_email
 
-from .utils import PaymentStatus, Roles
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
-db = SQLAlchemy()
+# the unique index that lets a timeslot be booked once
+TIMESLOT_INDEX = 'uq_bookings_room_id_show_date_show_timeslot'
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
 
 
 def connect_db(app):
-    """connect to db"""
+    """connect to db.  the schema isn't touched here, it comes from `flask db upgrade` (or
+    `flask init-db` for a fresh database)"""
     with app.app_context():
         db.app = app
         db.init_app(app)
-        db.create_all()
+    if running_flask_cli():
+        # alembic is a quarter of a second of imports that only the `flask db` commands need
+        from flask_migrate import Migrate
+        Migrate(app, db, directory=MIGRATIONS_DIR)
+
+
+def running_flask_cli():
+    """true when the app is being loaded by the `flask` command rather than a server"""
+    context = click.get_current_context(silent=True)
+    return context is not None and isinstance(context.find_root().command, FlaskGroup)
 
 
 class Customer(db.Model):
@@ -22,12 +42,23 @@ class Customer(db.Model):
     first_name = db.Column(db.String(50), nullable=True)
     last_name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(256), nullable=False)
+    email_key = db.Column(db.String(256), nullable=False)  # normalize_email(email), kept in sync below
     is_minor = db.Column(db.Boolean, nullable=True)
     is_banned = db.Column(db.Boolean, nullable=True)
     customer_notes = db.Column(db.String, nullable=True)
 
     bookings = relationship("Booking", back_populates="customer")
 
+    __table_args__ = (
+        # booking modal looks customers up by email, one customer per address
+        db.Index('uq_customers_email_key', 'email_key', unique=True),
+    )
+
+    @validates('email')
+    def _set_email_key(self, key, email):
+        self.email_key = normalize_email(email)
+        return email
+
 
 class Room(db.Model):
     """room table"""
@@ -94,6 +125,10 @@ class Showtime(db.Model):
 
     room = relationship("Room", back_populates="showtimes")
 
+    __table_args__ = (
+        db.Index('ix_showtimes_room_id_day_of_week', 'room_id', 'day_of_week'),
+    )
+
     def __repr__(self):
         return (f"<Showtime(id={self.id}, "
                 f"room_id={self.room_id}, "
@@ -131,6 +166,51 @@ class Booking(db.Model):
 
     customer = relationship("Customer", back_populates="bookings")
 
+    # a timeslot can only be booked once.  room_id and show_date lead the index so it also
+    # covers the (room_id, show_date) range lookups done for availability and timeslots
+    __table_args__ = (
+        db.Index(TIMESLOT_INDEX, 'room_id', 'show_date', 'show_timeslot', unique=True),
+        db.Index('ix_bookings_customer_id', 'customer_id'),  # booking list filtered by customer
+    )
+
+
+class SlotHold(db.Model):
+    """a timeslot kept for a customer for a few minutes while they fill in the booking modal.
+
+    a hold counts as booked until expires_at (UTC), then the expiry scheduler (holds.py) deletes
+    it.  room_day_availability never counts holds, they're checked when it's read.  converting
+    it into a booking deletes it in the same transaction as the booking insert"""
+    __tablename__ = "slot_holds"
+
+    id = db.Column(db.Integer, primary_key=True)
+    room_id = db.Column(db.Integer, db.ForeignKey('rooms.id', ondelete="cascade"), nullable=False)
+    show_date = db.Column(db.Date, nullable=False)
+    show_timeslot = db.Column(db.Integer, nullable=False)
+    # handed to the customer, releases or converts the hold
+    token = db.Column(db.String(64), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    # one hold per timeslot, an expired one is taken over by the next hold
+    __table_args__ = (
+        db.Index('uq_slot_holds_room_id_show_date_show_timeslot', 'room_id', 'show_date', 'show_timeslot',
+                 unique=True),
+        db.Index('uq_slot_holds_token', 'token', unique=True),
+    )
+
+
+class RoomDayAvailability(db.Model):
+    """how many timeslots each room has and how many are booked, one row per room per day.
+
+    a summary of showtimes + bookings kept up to date on every write (see availability_table.py)
+    so the calendar is a range scan on the primary key.  `flask availability rebuild` fills it"""
+    __tablename__ = "room_day_availability"
+
+    room_id = db.Column(db.Integer, db.ForeignKey('rooms.id', ondelete="cascade"), primary_key=True)
+    show_date = db.Column(db.Date, primary_key=True)
+    total_slots = db.Column(db.Integer, nullable=False)  # showtimes on that day of the week
+    # bookings for those showtimes, holds are added when it's read
+    booked_slots = db.Column(db.Integer, nullable=False)
+
 
 class Payments(db.Model):
     """payments for each booking.  Could be multiple"""
@@ -0,0 +1,53 @@
+from urllib.parse import urlencode
+
+from flask import current_app, jsonify, request
+
+from .models import db
+
+# headers the list endpoints use to hand out the next cursor, these have to be exposed to the
+# browser through CORS or the frontend can't read them
+PAGINATION_HEADERS = ['X-Next-Cursor', 'Link']
+
+
+def parse_page_args(args):
+    """read ?limit= and ?after= off the request.  raises ValueError on bad input
+
+    limit defaults to PAGE_SIZE_DEFAULT and is capped at PAGE_SIZE_MAX.  after is the cursor
+    handed back by the previous page (the id of its last row)"""
+    limit = int(args.get('limit') or current_app.config['PAGE_SIZE_DEFAULT'])
+    after = args.get('after')
+
+    if limit <= 0:
+        raise ValueError("limit must be a positive integer")
+    limit = min(limit, current_app.config['PAGE_SIZE_MAX'])
+
+    after = int(after) if after else None
+    return limit, after
+
+
+def keyset_page(statement, id_column, limit, after=None):
+    """fetch one page of a select() ordered by id_column, starting after the `after` cursor.
+
+    uses WHERE id > cursor instead of OFFSET so every page costs the same no matter how deep
+    into the table it is.  returns (rows, next_cursor), next_cursor is None on the last page"""
+    if after is not None:
+        statement = statement.where(id_column > after)
+
+    # grab one extra row so we know whether there is another page without a COUNT
+    rows = db.session.execute(statement.order_by(id_column).limit(limit + 1)).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1].id
+    return rows, None
+
+
+def paginated_response(items, next_cursor):
+    """the body stays a plain list so existing clients keep working, the cursor for the next
+    page goes in the X-Next-Cursor and Link headers"""
+    response = jsonify(items)
+    if next_cursor is not None:
+        args = request.args.to_dict()
+        args['after'] = next_cursor
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+        response.headers['Link'] = f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+    return response
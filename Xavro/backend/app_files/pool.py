@@ -0,0 +1,97 @@
+import os
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+QUEUE_POOL_MAX_OVERFLOW = 10  # what QueuePool uses when the engine options don't set it
+
+
+class PoolStats:
+    """checkout counters for the engine's connection pool.
+
+    the numbers are per gunicorn worker (every worker has its own pool), a checked_out that
+    sits at pool_size + max_overflow means requests are queueing for a connection"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engines = []
+        self._max_overflow = {}  # engine -> the max_overflow it was configured with
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+
+    def init_app(self, app, db):
+        binds = app.config.get('SQLALCHEMY_BINDS') or {}
+        with app.app_context():
+            for bind_key, engine in db.engines.items():
+                if bind_key is None:
+                    options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}
+                else:
+                    options = binds.get(bind_key)
+                    options = options if isinstance(options, dict) else {}  # a bind can be a bare url
+                self.track(engine, options.get('max_overflow', QUEUE_POOL_MAX_OVERFLOW))
+
+    def track(self, engine, max_overflow=QUEUE_POOL_MAX_OVERFLOW):
+        self._max_overflow[engine] = max_overflow
+        if engine in self._engines:
+            return
+        self._engines.append(engine)
+        event.listen(engine, 'connect', self._on_connect)
+        event.listen(engine, 'checkout', self._on_checkout)
+        event.listen(engine, 'checkin', self._on_checkin)
+        event.listen(engine, 'invalidate', self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checkins += 1
+            self.checked_out = max(self.checked_out - 1, 0)
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def stats(self):
+        pools = []
+        for engine in self._engines:
+            pool = engine.pool
+            info = {'url': engine.url.render_as_string(hide_password=True), 'class': type(pool).__name__}
+            if isinstance(pool, QueuePool):
+                info.update({
+                    'size': pool.size(),
+                    'checked_in': pool.checkedin(),
+                    'checked_out': pool.checkedout(),
+                    'overflow': pool.overflow(),
+                    'max_overflow': self._max_overflow[engine],
+                    'timeout': pool.timeout(),
+                })
+            info['status'] = pool.status()
+            pools.append(info)
+
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'connects': self.connects,
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'invalidations': self.invalidations,
+                'checked_out': self.checked_out,
+                'peak_checked_out': self.peak_checked_out,
+                'pools': pools
+            }
+
+
+pool_stats = PoolStats()
@@ -0,0 +1,171 @@
+import threading
+import time
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select
+
+from .models import RoomCost
+from .versions import versions
+
+MAX_QUOTES_PER_REQUEST = 1000
+
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+class PriceSchedule:
+    """the price of one room for one guest count over time.
+
+    the cost rows' start/end dates cut the calendar into intervals, each interval gets the
+    price that wins on it up front so a quote is one bisect.  when rows overlap the one that
+    started last wins (a dated price overrides the open ended default), then the newest row"""
+
+    def __init__(self, rows):
+        # rows are (id, total_cost, start_date, end_date), end dates are inclusive
+        boundaries = set()
+        for _, _, start_date, end_date in rows:
+            if start_date is not None:
+                boundaries.add(start_date)
+            if end_date is not None and end_date < date.max:
+                boundaries.add(end_date + timedelta(days=1))
+
+        self.starts = []
+        self.prices = []  # (total_cost, cost_id) or None where nothing applies
+        for interval_start in [date.min, *sorted(boundaries)]:
+            price = self._resolve(rows, interval_start)
+            if self.prices and self.prices[-1] == price:
+                continue  # same price as the interval before, merge them
+            self.starts.append(interval_start)
+            self.prices.append(price)
+
+    @staticmethod
+    def _resolve(rows, day):
+        applicable = [
+            (start_date or date.min, cost_id, total_cost)
+            for cost_id, total_cost, start_date, end_date in rows
+            if (start_date is None or start_date <= day) and (end_date is None or day <= end_date)
+        ]
+        if not applicable:
+            return None
+        _, cost_id, total_cost = max(applicable)
+        return total_cost, cost_id
+
+    def price_on(self, day):
+        return self.prices[bisect_right(self.starts, day) - 1]
+
+
+class PricingIndex:
+    """compiled price schedules per room, keyed by guest count.
+
+    a room is recompiled when its room_cost (or room) version changes, which the session events
+    in versions.py bump on every committed write, or after ttl seconds so writes handled by
+    another worker show up too"""
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._rooms = {}  # room_id -> (version token, expires_at, {guests_count: PriceSchedule})
+        self._lock = threading.Lock()
+
+    def configure(self, ttl):
+        with self._lock:
+            self.ttl = ttl
+            self._rooms.clear()
+
+    @staticmethod
+    def _token(room_id):
+        return versions.token('room_cost', room_id) + '|' + versions.token('room', room_id)
+
+    def schedules(self, session, room_ids):
+        """{room_id: {guests_count: PriceSchedule}} for room_ids, rooms that aren't compiled
+        (or are out of date) are loaded with one query"""
+        found = {}
+        missing = {}
+        now = time.monotonic()
+        with self._lock:
+            for room_id in set(room_ids):
+                token = self._token(room_id)
+                entry = self._rooms.get(room_id)
+                if entry is not None and entry[0] == token and entry[1] > now:
+                    found[room_id] = entry[2]
+                else:
+                    missing[room_id] = token
+
+        if missing:
+            rows_by_room = defaultdict(lambda: defaultdict(list))
+            rows = session.execute(
+                select(RoomCost.room_id, RoomCost.guests_count, RoomCost.id, RoomCost.total_cost,
+                       RoomCost.start_date, RoomCost.end_date)
+                .where(RoomCost.room_id.in_(missing))
+            )
+            for room_id, guests_count, cost_id, total_cost, start_date, end_date in rows:
+                rows_by_room[room_id][guests_count].append(
+                    (cost_id, total_cost, _as_date(start_date), _as_date(end_date))
+                )
+
+            with self._lock:
+                for room_id, token in missing.items():
+                    compiled = {
+                        guests_count: PriceSchedule(cost_rows)
+                        for guests_count, cost_rows in rows_by_room[room_id].items()
+                    }
+                    found[room_id] = compiled
+                    # a write that committed while we were loading changed the token, don't keep
+                    # what we loaded around under the new one
+                    if self.ttl > 0 and self._token(room_id) == token:
+                        self._rooms[room_id] = (token, now + self.ttl, compiled)
+        return found
+
+    def clear(self):
+        with self._lock:
+            self._rooms.clear()
+
+
+pricing_index = PricingIndex()
+
+
+def parse_quote_request(item):
+    """(room_id, date, guests) from one {"room_id": 1, "date": "YYYY-MM-DD", "guests": 4}"""
+    if not isinstance(item, dict):
+        raise ValueError('quote must be an object')
+    try:
+        room_id = int(item['room_id'])
+        guests = int(item['guests'])
+        day = datetime.strptime(item['date'], '%Y-%m-%d').date()
+    except KeyError as e:
+        raise ValueError(f"missing required field '{e.args[0]}'")
+    except (TypeError, ValueError):
+        raise ValueError('room_id and guests must be integers and date must be YYYY-MM-DD')
+    return room_id, day, guests
+
+
+def quote_all(session, items):
+    """price every (room, date, guests) request in items.  every item gets an answer in the
+    same order, with total_cost or an error, so one bad item doesn't fail the batch"""
+    parsed = []
+    for item in items:
+        try:
+            parsed.append(parse_quote_request(item))
+        except ValueError as e:
+            parsed.append(e)
+
+    schedules = pricing_index.schedules(session, [p[0] for p in parsed if not isinstance(p, ValueError)])
+
+    quotes = []
+    for item, request in zip(items, parsed):
+        if isinstance(request, ValueError):
+            quotes.append({'request': item, 'error': str(request)})
+            continue
+
+        room_id, day, guests = request
+        quote = {'room_id': room_id, 'date': day.isoformat(), 'guests': guests}
+        schedule = schedules[room_id].get(guests)
+        price = schedule.price_on(day) if schedule is not None else None
+        if price is None:
+            quote['error'] = 'no price for this room, date and number of guests'
+        else:
+            quote['total_cost'], quote['cost_id'] = price
+        quotes.append(quote)
+    return quotes
@@ -0,0 +1,250 @@
+import logging
+import math
+import threading
+import time
+import weakref
+from collections import defaultdict
+from functools import wraps
+from itertools import count
+
+from flask import current_app, g, has_request_context, jsonify, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.sql import Select
+
+REPLICA_BIND_PREFIX = 'replica_'
+# when the client last committed a write (unix time), sent back on every response that wrote.
+# the cookie covers same-origin browsers, other clients echo the header on their next reads
+LAST_WRITE_HEADER = 'X-Last-Write'
+LAST_WRITE_COOKIE = 'xavro_last_write'
+
+logger = logging.getLogger(__name__)
+
+
+class ReplicaRouter:
+    """decides whether a read goes to a replica or the primary.
+
+    only handlers marked @read_only use a replica, and only while:
+      - the client hasn't committed a write in the last READ_AFTER_WRITE_WINDOW seconds (going
+        by its X-Last-Write header or cookie), so a read right after a write (the booking flow,
+        the admin screens) sees it whichever worker answers it
+      - the replica answered its last connection without an error, a failing replica is
+        skipped for REPLICA_RETRY_AFTER seconds
+      - a postgres replica is no more than REPLICA_MAX_LAG seconds behind (checked at most
+        every REPLICA_LAG_CHECK_INTERVAL seconds)
+    anything else falls back to the primary"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engines = {}  # name -> engine, 'primary' plus every replica
+        self._listened = weakref.WeakSet()  # engines the counters are already listening on
+        self._replica_names = []
+        self._round_robin = count()
+        self._unhealthy_until = {}  # replica name -> monotonic time it gets retried
+        self._lag_checked_at = {}
+        self._lag = {}
+        self.queries = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.fallbacks = 0
+        self.read_after_write = 0
+        self.read_after_write_window = 5
+        self.max_lag = 5
+        self.lag_check_interval = 5
+        self.retry_after = 30
+
+    def init_app(self, app, db):
+        self.read_after_write_window = app.config['READ_AFTER_WRITE_WINDOW']
+        self.max_lag = app.config['REPLICA_MAX_LAG']
+        self.lag_check_interval = app.config['REPLICA_LAG_CHECK_INTERVAL']
+        self.retry_after = app.config['REPLICA_RETRY_AFTER']
+
+        if self._stamp_last_write not in app.after_request_funcs[None]:
+            app.after_request(self._stamp_last_write)
+
+        # one app per process, a second init_app (the tests) starts over
+        self._engines = {}
+        self._replica_names = []
+        self._unhealthy_until = {}
+        self.queries.clear()
+        self.errors.clear()
+        with app.app_context():
+            self._track('primary', db.engine)
+            if not event.contains(db.engine, 'commit', self._on_commit):
+                event.listen(db.engine, 'before_cursor_execute', self._note_write)
+                event.listen(db.engine, 'commit', self._on_commit)
+                event.listen(db.engine, 'rollback', self._on_rollback)
+
+            for bind_key, engine in sorted(db.engines.items(), key=lambda item: str(item[0])):
+                if bind_key and bind_key.startswith(REPLICA_BIND_PREFIX):
+                    self._track(bind_key, engine)
+                    self._replica_names.append(bind_key)
+
+    def _track(self, name, engine):
+        self._engines[name] = engine
+        if engine in self._listened:
+            return
+        self._listened.add(engine)
+
+        def count_query(conn, cursor, statement, parameters, context, executemany):
+            self.queries[name] += 1
+
+        def count_error(exception_context):
+            self.errors[name] += 1
+            if name != 'primary' and (exception_context.is_disconnect or exception_context.connection is None):
+                self.mark_unhealthy(name)
+
+        event.listen(engine, 'before_cursor_execute', count_query)
+        event.listen(engine, 'handle_error', count_error)
+
+    @staticmethod
+    def _note_write(conn, cursor, statement, parameters, context, executemany):
+        if context is not None and (context.isinsert or context.isupdate or context.isdelete):
+            conn.info['wrote'] = True
+
+    @staticmethod
+    def _on_commit(conn):
+        if conn.info.pop('wrote', False) and has_request_context():
+            g.last_write_at = time.time()
+
+    @staticmethod
+    def _on_rollback(conn):
+        conn.info.pop('wrote', None)
+
+    def _stamp_last_write(self, response):
+        last_write_at = g.get('last_write_at')
+        if last_write_at is not None:
+            value = f'{last_write_at:.3f}'
+            response.headers[LAST_WRITE_HEADER] = value
+            # the write routes' cross_origin() doesn't list it, let browser clients read it
+            response.headers.add('Access-Control-Expose-Headers', LAST_WRITE_HEADER)
+            response.set_cookie(LAST_WRITE_COOKIE, value, max_age=math.ceil(self.read_after_write_window),
+                                httponly=True, samesite='Lax')
+        return response
+
+    def wrote_recently(self):
+        """true if the client behind this request committed a write in the read-after-write window"""
+        last_write_at = g.get('last_write_at')
+        if last_write_at is None:
+            try:
+                last_write_at = float(request.headers.get(LAST_WRITE_HEADER)
+                                      or request.cookies.get(LAST_WRITE_COOKIE) or '-inf')
+            except ValueError:
+                return False
+        return time.time() - last_write_at < self.read_after_write_window
+
+    def mark_unhealthy(self, name):
+        with self._lock:
+            self._unhealthy_until[name] = time.monotonic() + self.retry_after
+
+    def _lag_ok(self, name, engine):
+        if engine.dialect.name != 'postgresql' or self.max_lag <= 0:
+            return True
+
+        now = time.monotonic()
+        if now - self._lag_checked_at.get(name, float('-inf')) >= self.lag_check_interval:
+            self._lag_checked_at[name] = now
+            try:
+                with engine.connect() as connection:
+                    # NULL when the server isn't replaying wal (not a replica), treat as caught up
+                    lag = connection.execute(text(
+                        'SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())'
+                    )).scalar()
+                self._lag[name] = float(lag or 0)
+            except Exception:
+                self.mark_unhealthy(name)
+                return False
+        return self._lag.get(name, 0) <= self.max_lag
+
+    def mark_failed(self, engine):
+        for name, tracked in self._engines.items():
+            if tracked is engine and name != 'primary':
+                self.mark_unhealthy(name)
+
+    def replica(self, skip=()):
+        """a replica engine to read from or None for the primary.  engines in `skip` (the ones
+        that already failed this request) aren't picked"""
+        if not self._replica_names:
+            return None
+        if self.wrote_recently():
+            self.read_after_write += 1
+            return None
+
+        now = time.monotonic()
+        start = next(self._round_robin)
+        for offset in range(len(self._replica_names)):
+            name = self._replica_names[(start + offset) % len(self._replica_names)]
+            if self._unhealthy_until.get(name, 0) > now:
+                continue
+            engine = self._engines[name]
+            if engine in skip:
+                continue
+            if self._lag_ok(name, engine):
+                return engine
+        self.fallbacks += 1
+        return None
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            'replicas': len(self._replica_names),
+            'read_after_write_window': self.read_after_write_window,
+            'read_after_write': self.read_after_write,
+            'fallbacks': self.fallbacks,
+            'engines': {
+                name: {
+                    'url': engine.url.render_as_string(hide_password=True),
+                    'queries': self.queries[name],
+                    'errors': self.errors[name],
+                    'healthy': self._unhealthy_until.get(name, 0) <= now,
+                    'lag': self._lag.get(name)
+                }
+                for name, engine in self._engines.items()
+            }
+        }
+
+
+replica_router = ReplicaRouter()
+
+
+def read_only(view):
+    """mark a handler as safe to answer from a replica.  if the replica can't be reached (or
+    is missing tables) it is skipped for REPLICA_RETRY_AFTER seconds and the handler is run
+    again on the next replica or the primary, so handlers and services let OperationalError
+    through instead of turning it into a response.  each replica gets one try per request, so
+    this ends on the primary even when REPLICA_RETRY_AFTER is 0"""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        g.read_only = True
+        g.replicas_failed = set()
+        while True:
+            try:
+                return view(*args, **kwargs)
+            except OperationalError as e:
+                replica = g.pop('replica', None)
+                current_app.extensions['sqlalchemy'].session.rollback()
+                if replica is None:
+                    logger.exception(f"ERROR: {e}")
+                    return jsonify({'error': 'Something went wrong reading from the database'}), 500
+                logger.error(f"replica read failed, trying again without it: {e}")
+                replica_router.mark_failed(replica)
+                g.replicas_failed.add(replica)
+    return wrapped
+
+
+class RoutingSession(Session):
+    """db.session, sends the selects of @read_only handlers to a replica.
+
+    the replica is picked on the request's first select and kept on g, so every statement of
+    the request reads the same snapshot.  writes, and reads made by a session that has changes
+    waiting to be flushed, always go to the primary"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and has_request_context() and g.get('read_only')
+                and (clause is None or isinstance(clause, Select))
+                and not self._flushing and not (self.new or self.dirty or self.deleted)):
+            if 'replica' not in g:
+                g.replica = replica_router.replica(skip=g.get('replicas_failed', ()))
+            if g.replica is not None:
+                return g.replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
@@ -1,3 +1,5 @@
+import logging
+
 from ..models import db, User
 from flask import Blueprint, request, jsonify
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -5,6 +7,7 @@ from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identi
 from sqlalchemy.exc import SQLAlchemyError
 
 auth_blueprint = Blueprint('auth', __name__)
+logger = logging.getLogger(__name__)
 
 
 @auth_blueprint.route('/register', methods=['POST'])
@@ -13,16 +16,16 @@ def register():
     hashed_password = generate_password_hash(data['password'], method='sha256')
     new_user = User(username=data['username'], password=hashed_password, email=data['email'], role='GUEST')
     try:
-        print("Saving New User")
+        logger.info("Saving New User")
         db.session.add(new_user)
         db.session.commit()
-        print("New user saved successfully")
+        logger.info("New user saved successfully")
         return jsonify({'message': 'User registered successfully!'})
     except SQLAlchemyError as sql_error:
-        print(f"Error saving to database {sql_error}")
+        logger.error(f"Error saving to database {sql_error}")
         return jsonify({'error': 'Error saving new user to db'})
     except Exception as e:
-        print(f"Something went wrong saving new user: {e}")
+        logger.exception(f"Something went wrong saving new user: {e}")
         return jsonify({'error': 'Error something went wrong saving new user to db'})
 
 
@@ -1,43 +1,90 @@
+import logging
+
 from flask import Blueprint, request, jsonify
 from flask_cors import cross_origin
-from ..models import db,  Booking
+from ..cache import availability_cache
+from ..exports import EXPORT_FORMATS, stream_export
+from ..imports import bulk_import, read_import_rows
+from ..models import db,  Booking, Customer, Room
+from ..pagination import PAGINATION_HEADERS, keyset_page, paginated_response, parse_page_args
+from ..replicas import read_only
+from ..serializers import BOOKING
+from ..services import claim_timeslot_service, is_timeslot_conflict, timeslot_is_held
+from collections import defaultdict
 from datetime import datetime
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
 # register the blueprints
 bookings_blueprint = Blueprint('bookings', __name__)
+logger = logging.getLogger(__name__)
 
 
 @bookings_blueprint.route('/api/bookings', methods=['GET'])
-@cross_origin()
+@cross_origin(expose_headers=PAGINATION_HEADERS)
+@read_only
 def get_all_bookings():
-    bookings = Booking.query.all()
-    return jsonify([{
-        'id': booking.id,
-        'room_id': booking.room_id,
-        'customer_id': booking.customer_id,
-        'guest_count': booking.guest_count,
-        'order_id': booking.order_id,
-        'booking_date': booking.booking_date.strftime('%Y-%m-%d'),
-        'show_date': booking.show_date.strftime('%Y-%m-%d'),
-        'show_timeslot': booking.show_timeslot
-    } for booking in bookings])
+    # paged with ?limit=&after=, filter with ?room_id=, ?customer_id=, ?start= and ?end= (show date)
+    try:
+        limit, after = parse_page_args(request.args)
+        statement = BOOKING.select()
+        if request.args.get('room_id'):
+            statement = statement.where(Booking.room_id == int(request.args['room_id']))
+        if request.args.get('customer_id'):
+            statement = statement.where(Booking.customer_id == int(request.args['customer_id']))
+        if request.args.get('start'):
+            statement = statement.where(Booking.show_date >= datetime.strptime(request.args['start'], '%Y-%m-%d').date())
+        if request.args.get('end'):
+            statement = statement.where(Booking.show_date <= datetime.strptime(request.args['end'], '%Y-%m-%d').date())
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query parameter: {e}'}), 400
+
+    bookings, next_cursor = keyset_page(statement, Booking.id, limit, after)
+    return paginated_response(BOOKING.serialize_all(bookings), next_cursor)
+
+
+@bookings_blueprint.route('/api/bookings/export', methods=['GET'])
+@cross_origin()
+@read_only
+def export_bookings():
+    # full booking history for the accountants, ?format=ndjson (default) or ?format=csv
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'format must be one of {", ".join(EXPORT_FORMATS)}'}), 400
+
+    return stream_export(select(*Booking.__table__.columns).order_by(Booking.id), export_format, 'bookings')
+
+
+@bookings_blueprint.route('/api/bookings/bulk', methods=['POST'])
+@cross_origin()
+def bulk_add_bookings():
+    # JSON array of bookings or an uploaded CSV, bad rows are reported back instead of failing the import
+    try:
+        rows = read_import_rows(request)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        report, inserted = bulk_import(db.session, Booking, rows)
+    except SQLAlchemyError as e:
+        logger.error(f"Error importing bookings: {e}")
+        db.session.rollback()
+        return jsonify({'error': 'Something went wrong importing bookings'}), 500
+
+    dates_by_room = defaultdict(set)
+    for values in inserted:
+        dates_by_room[values['room_id']].add(values['show_date'])
+    for room_id, dates in dates_by_room.items():
+        availability_cache.invalidate(room_id, dates)
+
+    return jsonify(report), 201 if report['inserted'] else 400
 
 
 @bookings_blueprint.route('/api/bookings/<int:booking_id>', methods=['GET'])
 @cross_origin()
+@read_only
 def get_booking(booking_id):
-    booking = Booking.query.get_or_404(booking_id)
-    return jsonify({
-        'id': booking.id,
-        'room_id': booking.room_id,
-        'customer_id': booking.customer_id,
-        'guest_count': booking.guest_count,
-        'order_id': booking.order_id,
-        'booking_date': booking.booking_date.strftime('%Y-%m-%d'),
-        'show_date': booking.show_date.strftime('%Y-%m-%d'),
-        'show_timeslot': booking.show_timeslot
-    })
+    return jsonify(BOOKING.fetch_one_or_404(booking_id))
 
 
 @bookings_blueprint.route('/api/bookings/<int:booking_id>', methods=['PUT'])
@@ -45,28 +92,50 @@ def get_booking(booking_id):
 def update_booking(booking_id):
     data = request.get_json()
     booking = Booking.query.get_or_404(booking_id)
+    # remember where the booking was so that slot shows up as free again
+    old_room_id, old_show_date, old_show_timeslot = booking.room_id, booking.show_date, booking.show_timeslot
     try:
-        booking.room_id = data['room_id'],
-        booking.customer_id = data['customer_id'],
-        booking.guest_count = data['guest_count'],
-        booking.order_id = data['order_id'],
-        booking.booking_date = datetime.strptime(data['booking_date'], '%Y-%m-%d').date(),
-        booking.show_date = datetime.strptime(data['show_date'], '%Y-%m-%d').date(),  # Use show
+        booking.room_id = data['room_id']
+        booking.customer_id = data['customer_id']
+        booking.guest_count = data['guest_count']
+        booking.order_id = data['order_id']
+        booking.booking_date = datetime.strptime(data['booking_date'], '%Y-%m-%d').date()
+        booking.show_date = datetime.strptime(data['show_date'], '%Y-%m-%d').date()  # Use show
         booking.show_timeslot = data['show_timeslot']
 
+        # sqlite doesn't enforce the foreign keys, so look them up rather than wait for the commit
+        room, customer = db.session.get(Room, booking.room_id), db.session.get(Customer, booking.customer_id)
+        if room is None or customer is None:
+            db.session.rollback()
+            return jsonify({'error': 'No such room or customer'}), 404
+
+        # a booking moved onto another slot can't take it from a customer holding it
+        new_slot = (int(booking.room_id), booking.show_date, int(booking.show_timeslot))
+        moved = new_slot != (old_room_id, old_show_date, old_show_timeslot)
+        if moved and timeslot_is_held(db.session, *new_slot):
+            db.session.rollback()
+            return jsonify({'error': 'This timeslot is being held for another customer'}), 409
+
         db.session.commit()
+        availability_cache.invalidate(old_room_id, [old_show_date])
+        availability_cache.invalidate(booking.room_id, [booking.show_date])
         return jsonify({'message': 'Booking updated successfully'}), 201
+    except IntegrityError as e:
+        db.session.rollback()
+        if is_timeslot_conflict(e):
+            return jsonify({'error': 'This timeslot has already been booked'}), 409
+        logger.error(f"Invalid booking update: {e}")
+        return jsonify({'error': 'Invalid booking data'}), 400
     except SQLAlchemyError as e:
-        print(f"Error adding booking to the database: {e}")
+        logger.error(f"Error adding booking to the database: {e}")
         db.session.rollback()
         return jsonify({'error': 'Something went wrong adding to the database'}), 500
     except KeyError as e:
-        print(f"Missing key in JSON data: {e}")
-        print(data)
+        logger.error(f"Missing key in JSON data: {e}, got {data}")
         db.session.rollback()
         return jsonify({'error': f'Missing key in JSON data: {e}'}), 400
     except Exception as e:
-        print(f"unknown error occured: {e}")
+        logger.exception(f"unknown error occured: {e}")
         db.session.rollback()
         return jsonify({'error': 'something really bad went wrong'}), 500
 
@@ -77,13 +146,15 @@ def delete_booking(booking_id):
     booking = Booking.query.get_or_404(booking_id)
     try:
         db.session.delete(booking)
+        db.session.commit()
+        availability_cache.invalidate(booking.room_id, [booking.show_date])
         return jsonify({'message': 'Booking deleted successfully'})
     except SQLAlchemyError as e:
-        print(f"Error deleting booking from database: {e}")
+        logger.error(f"Error deleting booking from database: {e}")
         db.session.rollback()
         return jsonify({'error': 'Something went wrong deleting booking from database'}), 500
     except Exception as e:
-        print(f"unknown error occured: {e}")
+        logger.exception(f"unknown error occured: {e}")
         db.session.rollback()
         return jsonify({'error': 'something really bad went wrong'}), 500
 
@@ -93,27 +164,33 @@ def delete_booking(booking_id):
 def add_booking():
     data = request.get_json()
     try:
-        new_booking = Booking(
-            room_id=data['room_id'],
-            customer_id=data['customer_id'],
-            guest_count=data['guest_count'],
-            order_id=data['order_id'],
-            booking_date=datetime.strptime(data['booking_date'], '%Y-%m-%d').date(),  # Use booking_date
-            show_date=datetime.strptime(data['show_date'], '%Y-%m-%d').date(),  # Use booking_date
-            show_timeslot=data['show_timeslot']
-        )
-
-        db.session.add(new_booking)
+        booking_values = {
+            'room_id': data['room_id'],
+            'customer_id': data['customer_id'],
+            'guest_count': data['guest_count'],
+            'order_id': data['order_id'],
+            'booking_date': datetime.strptime(data['booking_date'], '%Y-%m-%d').date(),  # Use booking_date
+            'show_date': datetime.strptime(data['show_date'], '%Y-%m-%d').date(),  # Use booking_date
+            'show_timeslot': data['show_timeslot']
+        }
+
+        # claim the slot and insert in one statement, the unique index decides who wins a race
+        booking_id = claim_timeslot_service(db.session, booking_values)
+        if booking_id is None:
+            db.session.rollback()
+            return jsonify({'error': 'This timeslot has already been booked'}), 409
+
         db.session.commit()
-        return jsonify({'message': 'Booking added successfully'}), 201
+        availability_cache.invalidate(booking_values['room_id'], [booking_values['show_date']])
+        return jsonify({'message': 'Booking added successfully', 'id': booking_id}), 201
     except SQLAlchemyError as e:
-        print(f"Error adding booking to the database: {e}")
+        logger.error(f"Error adding booking to the database: {e}")
+        db.session.rollback()
         return jsonify({'error': 'Something went wrong adding to the database'}), 500
     except KeyError as e:
-        print(f"Missing key in JSON data: {e}")
+        logger.error(f"Missing key in JSON data: {e}")
         return jsonify({'error': f'Missing key in JSON data: {e}'}), 400
     except Exception as e:
-        print(f"unknown error occured: {e}")
+        logger.exception(f"unknown error occured: {e}")
         db.session.rollback()
         return jsonify({'error': 'something really bad went wrong'}), 500
-
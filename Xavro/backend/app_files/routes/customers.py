@@ -1,61 +1,95 @@
+import logging
+
 from flask import Blueprint, request, jsonify
 from flask_cors import cross_origin
+from ..cache import customer_cache
+from ..exports import EXPORT_FORMATS, stream_export
+from ..imports import bulk_import, read_import_rows
 from ..models import db, Customer
+from ..pagination import PAGINATION_HEADERS, keyset_page, paginated_response, parse_page_args
+from ..replicas import read_only
+from ..serializers import CUSTOMER
+from ..utils import normalize_email
 
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
 # register the blueprints
 customers_blueprint = Blueprint('customers', __name__)
+logger = logging.getLogger(__name__)
 
 
 @customers_blueprint.route('/api/customers', methods=['GET'])
-@cross_origin()
+@cross_origin(expose_headers=PAGINATION_HEADERS)
+@read_only
 def get_customers():
     # this route is used by the modal as well as the customer list component
     # if the query parms include and email we can assume we're in the modal and should return only one record
     email = request.args.get('email')
 
     if email:
-        customer = Customer.query.filter_by(email=email).first()
+        # matched on the normalized address, the modal hits this on every (debounced) keystroke
+        # so answers, including "not found", are cached
+        email_key = normalize_email(email)
+        hit, customer = customer_cache.get(email_key)
+        if not hit:
+            generation = customer_cache.generation()
+            row = db.session.execute(CUSTOMER.select().where(Customer.email_key == email_key).limit(1)).first()
+            customer = CUSTOMER.serialize(row) if row else None
+            customer_cache.set(email_key, customer, generation)
+
         if customer:
-            return jsonify({
-                'id': customer.id,
-                'first_name': customer.first_name,
-                'last_name': customer.last_name,
-                'email': customer.email,
-                'is_minor': customer.is_minor,
-                'is_banned': customer.is_banned,
-                'customer_notes': customer.customer_notes
-            })
+            return jsonify(customer)
         else:
             return jsonify({'error': 'Customer not found'}), 404  # TODO: handle this 404
     else:
-        customers = Customer.query.all()
-        return jsonify([{
-            'id': customer.id,
-            'first_name': customer.first_name,
-            'last_name': customer.last_name,
-            'email': customer.email,
-            'is_minor': customer.is_minor,
-            'is_banned': customer.is_banned,
-            'customer_notes': customer.customer_notes
-        } for customer in customers])
+        try:
+            limit, after = parse_page_args(request.args)
+        except ValueError as e:
+            return jsonify({'error': f'Invalid query parameter: {e}'}), 400
+
+        customers, next_cursor = keyset_page(CUSTOMER.select(), Customer.id, limit, after)
+        return paginated_response(CUSTOMER.serialize_all(customers), next_cursor)
+
+
+@customers_blueprint.route('/api/customers/export', methods=['GET'])
+@cross_origin()
+@read_only
+def export_customers():
+    # full customer list for the accountants, ?format=ndjson (default) or ?format=csv
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'format must be one of {", ".join(EXPORT_FORMATS)}'}), 400
+
+    return stream_export(select(*Customer.__table__.columns).order_by(Customer.id), export_format, 'customers')
+
+
+@customers_blueprint.route('/api/customers/bulk', methods=['POST'])
+@cross_origin()
+def bulk_add_customers():
+    # JSON array of customers or an uploaded CSV, bad rows are reported back instead of failing the import
+    try:
+        rows = read_import_rows(request)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        report, inserted = bulk_import(db.session, Customer, rows)
+    except SQLAlchemyError as e:
+        logger.error(f"Error importing customers: {e}")
+        db.session.rollback()
+        return jsonify({'error': 'Something went wrong importing customers'}), 500
+
+    customer_cache.invalidate(*(values['email_key'] for values in inserted))
 
+    return jsonify(report), 201 if report['inserted'] else 400
 
 
 @customers_blueprint.route('/api/customers/<int:customer_id>', methods=['GET'])
 @cross_origin()
+@read_only
 def get_customer(customer_id):
-    customer = Customer.query.get_or_404(customer_id)
-    return jsonify({
-        'id': customer.id,
-        'first_name': customer.first_name,
-        'last_name': customer.last_name,
-        'email': customer.email,
-        'is_minor': customer.is_minor,
-        'is_banned': customer.is_banned,
-        'customer_notes': customer.customer_notes
-    })
+    return jsonify(CUSTOMER.fetch_one_or_404(customer_id))
 
 
 @customers_blueprint.route('/api/customers', methods=['POST'])
@@ -77,21 +111,17 @@ def add_customer():
     try:
         db.session.add(new_customer)
         db.session.commit()
-        return jsonify({
-            'id': new_customer.id,
-            'first_name': new_customer.first_name,
-            'last_name': new_customer.last_name,
-            'email': new_customer.email,
-            'is_minor': new_customer.is_minor,
-            'is_banned': new_customer.is_banned,
-            'customer_notes': new_customer.customer_notes
-        }), 201
+        customer_cache.invalidate(new_customer.email_key)
+        return jsonify(CUSTOMER.serialize(new_customer)), 201
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'A customer with this email already exists'}), 409
     except SQLAlchemyError as e:
-        print(f"error saving to database: {e}")
+        logger.error(f"error saving to database: {e}")
         db.session.rollback()
         return jsonify({'error': 'something went wrong saving to database'}), 500
     except Exception as e:
-        print(f"unknown error occured: {e}")
+        logger.exception(f"unknown error occured: {e}")
         db.session.rollback()
         return jsonify({'error': 'something really bad went wrong'}), 500
 
@@ -101,6 +131,7 @@ def add_customer():
 def update_customer(customer_id):
     data = request.get_json()
     customer = Customer.query.get_or_404(customer_id)
+    old_email_key = customer.email_key
     try:
         customer.first_name = data['first_name']
         customer.last_name = data['last_name']
@@ -110,13 +141,17 @@ def update_customer(customer_id):
         customer.customer_notes = data['customer_notes']
 
         db.session.commit()
+        customer_cache.invalidate(old_email_key, customer.email_key)
         return jsonify({'message': 'Customer updated successfully'}), 200
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'A customer with this email already exists'}), 409
     except SQLAlchemyError as e:
-        print(f"error saving to database: {e}")
+        logger.error(f"error saving to database: {e}")
         db.session.rollback()
         return jsonify({'error': 'something went wrong saving to database'}), 500
     except Exception as e:
-        print(f"unknown error occured: {e}")
+        logger.exception(f"unknown error occured: {e}")
         db.session.rollback()
         return jsonify({'error': 'something really bad went wrong'}), 500
 
@@ -128,10 +163,11 @@ def delete_customer(customer_id):
     try:
         db.session.delete(customer)
         db.session.commit()
+        customer_cache.invalidate(customer.email_key)
         return jsonify({'message': 'Customer deleted successfully'}), 200
     except SQLAlchemyError as e:
-        print(f"error deleting from database: {e}")
+        logger.error(f"error deleting from database: {e}")
         return jsonify({'error': 'something went wrong saving to database'}), 500
     except Exception as e:
-        print(f"unknown error occured: {e}")
+        logger.exception(f"unknown error occured: {e}")
         return jsonify({'error': 'something really bad went wrong'}), 500
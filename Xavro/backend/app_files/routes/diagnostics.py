@@ -0,0 +1,60 @@
+from flask import Blueprint, jsonify
+from flask_cors import cross_origin
+from ..cache import availability_cache, customer_cache
+from ..events import event_broker
+from ..holds import hold_expiry
+from ..logs import log_pipeline
+from ..pool import pool_stats
+from ..replicas import replica_router
+
+# register the blueprints
+diagnostics_blueprint = Blueprint('diagnostics', __name__)
+
+
+@diagnostics_blueprint.route('/api/diagnostics/cache', methods=['GET'])
+@cross_origin()
+def get_cache_stats():
+    # hit/miss counters for the availability cache so we can size it
+    return jsonify(availability_cache.stats())
+
+
+@diagnostics_blueprint.route('/api/diagnostics/cache/customers', methods=['GET'])
+@cross_origin()
+def get_customer_cache_stats():
+    # same for the customer by email cache behind the booking modal
+    return jsonify(customer_cache.stats())
+
+
+@diagnostics_blueprint.route('/api/diagnostics/pool', methods=['GET'])
+@cross_origin()
+def get_pool_stats():
+    # connection pool usage for this worker, for sizing the pool against max_connections
+    return jsonify(pool_stats.stats())
+
+
+@diagnostics_blueprint.route('/api/diagnostics/replicas', methods=['GET'])
+@cross_origin()
+def get_replica_stats():
+    # queries per engine and how often reads fell back to the primary
+    return jsonify(replica_router.stats())
+
+
+@diagnostics_blueprint.route('/api/diagnostics/logging', methods=['GET'])
+@cross_origin()
+def get_logging_stats():
+    # log records waiting on the writer thread and how many were dropped because the queue was full
+    return jsonify(log_pipeline.stats())
+
+
+@diagnostics_blueprint.route('/api/diagnostics/events', methods=['GET'])
+@cross_origin()
+def get_event_stats():
+    # events published to /api/events by this worker and how many are kept for resume
+    return jsonify(event_broker.stats())
+
+
+@diagnostics_blueprint.route('/api/diagnostics/holds', methods=['GET'])
+@cross_origin()
+def get_hold_stats():
+    # slot holds waiting on this worker's expiry thread and how many it has expired
+    return jsonify(hold_expiry.stats())
@@ -0,0 +1,38 @@
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from flask_cors import cross_origin
+from ..events import event_broker, event_filter, format_event
+
+# register the blueprints
+events_blueprint = Blueprint('events', __name__)
+
+# how long the browser waits before reconnecting a dropped stream (ms)
+SSE_RETRY_MS = 3000
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',  # nginx would otherwise hold the events back
+}
+
+
+@events_blueprint.route('/api/events', methods=['GET'])
+@cross_origin()
+def stream_events():
+    """slot-taken / slot-freed events as server-sent events, ?rooms=1,2 to only get some rooms.
+    a reconnecting EventSource sends Last-Event-ID and gets what it missed"""
+    try:
+        wanted = event_filter(request.args.get('rooms'))
+    except ValueError:
+        return jsonify({'error': 'rooms must be a comma separated list of room ids'}), 400
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    cursor, backlog = event_broker.subscribe(last_event_id)
+
+    def generate():
+        nonlocal cursor
+        yield f'retry: {SSE_RETRY_MS}\n\n'
+        events = backlog
+        while True:
+            chunk = ''.join(format_event(payload) for payload in events if wanted(payload))
+            # a comment line every keepalive so proxies don't close an idle stream
+            yield chunk or ': keepalive\n\n'
+            cursor, events = event_broker.wait(cursor, event_broker.keepalive)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=SSE_HEADERS)
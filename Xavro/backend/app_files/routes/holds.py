@@ -0,0 +1,146 @@
+import logging
+
+from flask import Blueprint, current_app, request, jsonify
+from flask_cors import cross_origin
+from ..cache import availability_cache
+from ..holds import hold_expiry
+from ..models import db, SlotHold
+from ..services import convert_hold_service, hold_timeslot_service, release_hold_service, timeslot_exists
+from ..utils import utc_now
+from datetime import date, datetime
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+# register the blueprints
+holds_blueprint = Blueprint('holds', __name__)
+logger = logging.getLogger(__name__)
+
+
+@holds_blueprint.before_request
+def start_hold_expiry():
+    # picks up holds left behind by a restart the first time this worker sees a hold request
+    hold_expiry.ensure_running(db.session)
+
+
+def hold_response(hold):
+    return {
+        'id': hold['id'],
+        'token': hold['token'],
+        'room_id': hold['room_id'],
+        'show_date': hold['show_date'].isoformat(),
+        'show_timeslot': hold['show_timeslot'],
+        'expires_at': hold['expires_at'].isoformat() + 'Z',
+    }
+
+
+@holds_blueprint.route('/api/holds', methods=['POST'])
+@cross_origin()
+def add_hold():
+    """hold a timeslot while the customer fills in the booking modal"""
+    data = request.get_json()
+    try:
+        room_id = int(data['room_id'])
+        show_date = datetime.strptime(data['show_date'], '%Y-%m-%d').date()
+        show_timeslot = int(data['show_timeslot'])
+        minutes = int(data.get('minutes', current_app.config['HOLD_MINUTES']))
+    except KeyError as e:
+        logger.error(f"Missing key in JSON data: {e}")
+        return jsonify({'error': f'Missing key in JSON data: {e}'}), 400
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Invalid hold: {e}'}), 400
+
+    if not 1 <= minutes <= current_app.config['HOLD_MAX_MINUTES']:
+        return jsonify({'error': f"minutes must be between 1 and {current_app.config['HOLD_MAX_MINUTES']}"}), 400
+    if show_date < date.today():
+        return jsonify({'error': 'Can not hold a timeslot in the past'}), 400
+
+    try:
+        if not timeslot_exists(db.session, room_id, show_date, show_timeslot):
+            return jsonify({'error': 'This room has no such timeslot on that day'}), 404
+
+        hold = hold_timeslot_service(db.session, room_id, show_date, show_timeslot, minutes)
+        if hold is None:
+            db.session.rollback()
+            return jsonify({'error': 'This timeslot has already been booked'}), 409
+
+        db.session.commit()
+        availability_cache.invalidate(room_id, [show_date])
+        return jsonify(hold_response(hold)), 201
+    except SQLAlchemyError as e:
+        logger.error(f"Error adding hold to the database: {e}")
+        db.session.rollback()
+        return jsonify({'error': 'Something went wrong adding to the database'}), 500
+    except Exception as e:
+        logger.exception(f"unknown error occured: {e}")
+        db.session.rollback()
+        return jsonify({'error': 'something really bad went wrong'}), 500
+
+
+@holds_blueprint.route('/api/holds/<token>', methods=['GET'])
+@cross_origin()
+def get_hold(token):
+    hold = db.session.execute(
+        select(SlotHold.id, SlotHold.token, SlotHold.room_id, SlotHold.show_date, SlotHold.show_timeslot,
+               SlotHold.expires_at).where(SlotHold.token == token, SlotHold.expires_at > utc_now())
+    ).first()
+    if hold is None:
+        return jsonify({'error': 'Hold not found or expired'}), 404
+    return jsonify(hold_response(hold._asdict()))
+
+
+@holds_blueprint.route('/api/holds/<token>', methods=['DELETE'])
+@cross_origin()
+def delete_hold(token):
+    """the customer closed the modal, give the timeslot back"""
+    try:
+        slot = release_hold_service(db.session, token)
+        if slot is None:
+            return jsonify({'error': 'Hold not found or expired'}), 404
+        db.session.commit()
+        availability_cache.invalidate(slot.room_id, [slot.show_date])
+        return jsonify({'message': 'Hold released successfully'})
+    except SQLAlchemyError as e:
+        logger.error(f"Error deleting hold from database: {e}")
+        db.session.rollback()
+        return jsonify({'error': 'Something went wrong deleting hold from database'}), 500
+    except Exception as e:
+        logger.exception(f"unknown error occured: {e}")
+        db.session.rollback()
+        return jsonify({'error': 'something really bad went wrong'}), 500
+
+
+@holds_blueprint.route('/api/holds/<token>/booking', methods=['POST'])
+@cross_origin()
+def convert_hold(token):
+    """book the held timeslot, takes the same body as POST /api/bookings without the slot"""
+    data = request.get_json()
+    try:
+        booking_values = {
+            'customer_id': data['customer_id'],
+            'guest_count': data['guest_count'],
+            'order_id': data['order_id'],
+            'booking_date': datetime.strptime(data['booking_date'], '%Y-%m-%d').date(),
+        }
+
+        slot, booking_id = convert_hold_service(db.session, token, booking_values)
+        if slot is None:
+            db.session.rollback()
+            return jsonify({'error': 'Hold not found or expired'}), 404
+        if booking_id is None:
+            db.session.rollback()
+            return jsonify({'error': 'This timeslot has already been booked'}), 409
+
+        db.session.commit()
+        availability_cache.invalidate(slot.room_id, [slot.show_date])
+        return jsonify({'message': 'Booking added successfully', 'id': booking_id}), 201
+    except SQLAlchemyError as e:
+        logger.error(f"Error adding booking to the database: {e}")
+        db.session.rollback()
+        return jsonify({'error': 'Something went wrong adding to the database'}), 500
+    except KeyError as e:
+        logger.error(f"Missing key in JSON data: {e}")
+        return jsonify({'error': f'Missing key in JSON data: {e}'}), 400
+    except Exception as e:
+        logger.exception(f"unknown error occured: {e}")
+        db.session.rollback()
+        return jsonify({'error': 'something really bad went wrong'}), 500
@@ -0,0 +1,34 @@
+import logging
+
+from flask import Blueprint, request, jsonify
+from flask_cors import cross_origin
+from sqlalchemy.exc import OperationalError
+from ..models import db
+from ..pricing import MAX_QUOTES_PER_REQUEST, quote_all
+from ..replicas import read_only
+
+# register the blueprints
+quotes_blueprint = Blueprint('quotes', __name__)
+logger = logging.getLogger(__name__)
+
+
+@quotes_blueprint.route('/api/quotes', methods=['POST'])
+@cross_origin()
+@read_only
+def get_quotes():
+    # price a batch of [{"room_id": 1, "date": "2024-07-01", "guests": 4}, ...] in one call,
+    # the answers come back in the same order
+    data = request.get_json(silent=True)
+    items = data.get('quotes') if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return jsonify({'error': 'send a JSON array of quotes (or {"quotes": [...]})'}), 400
+    if len(items) > MAX_QUOTES_PER_REQUEST:
+        return jsonify({'error': f'no more than {MAX_QUOTES_PER_REQUEST} quotes per request'}), 400
+
+    try:
+        return jsonify({'quotes': quote_all(db.session, items)})
+    except OperationalError:
+        raise  # @read_only retries it without the replica
+    except Exception as e:
+        logger.exception(f"ERROR: {e}")
+        return jsonify({'error': str(e)}), 500
@@ -1,13 +1,22 @@
+import logging
+
 from flask import Blueprint, request, jsonify
 from flask_cors import cross_origin
-from ..services import get_room_availability_service, save_room_data, get_room_timeslots_service
+from ..services import (get_room_availability_service, save_room_data, get_room_timeslots_service,
+                        get_room_timeslots_range_service, get_rooms_availability_service, parse_date_range,
+                        parse_room_ids, check_timeslot_args)
+from ..cache import availability_cache
 from ..models import Room, db, RoomCost, Showtime
+from ..pagination import PAGINATION_HEADERS, keyset_page, paginated_response, parse_page_args
+from ..replicas import read_only
+from ..serializers import ROOM, ROOM_COST, ROOM_LIST
+from ..versions import conditional_get
 
-from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
 
 # register blueprint
 rooms_blueprint = Blueprint('rooms', __name__)
+logger = logging.getLogger(__name__)
 
 
 @rooms_blueprint.route('/api/rooms', methods=['POST', 'OPTIONS'])
@@ -25,39 +34,67 @@ def add_room():
 
 @rooms_blueprint.route('/api/rooms/<int:room_id>/availability', methods=['GET'])
 @cross_origin()
+@read_only
+@conditional_get('showtime', 'booking', validate=[parse_date_range])
 def get_room_availability_route(room_id):
+    # the calendar can ask for ?month=YYYY-MM or an explicit ?start=...&end=... window
+    try:
+        start_date, end_date = parse_date_range(request.args)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid date range: {e}'}), 400
 
-    # create a new session (this took me forever to figure out)
-    Session = sessionmaker(bind=db.engine)
-    session = Session()
-
+    # db.session is scoped to the request and handed back to the pool when it ends
     try:
-        room_avail = get_room_availability_service(session, room_id)
+        room_avail = get_room_availability_service(db.session, room_id, start_date, end_date)
+    except OperationalError:
+        raise  # @read_only retries it without the replica
     except Exception as e:
-        print(f"ERROR: {e}")
-        return jsonify({'ERROR': str(e)}, 500)
-    finally:
-        session.close()
+        logger.exception(f"ERROR: {e}")
+        return jsonify({'ERROR': str(e)}), 500
     return jsonify(room_avail)
 
 
-@rooms_blueprint.route('/api/rooms/', methods=['GET'])
+@rooms_blueprint.route('/api/availability', methods=['GET'])
 @cross_origin()
+@read_only
+@conditional_get('showtime', 'booking', validate=[parse_room_ids, parse_date_range])
+def get_rooms_availability_route():
+    # availability for several rooms in one go, e.g. ?rooms=1,2,3&month=2024-07
+    try:
+        room_ids = parse_room_ids(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        start_date, end_date = parse_date_range(request.args)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid date range: {e}'}), 400
+
+    try:
+        rooms_avail = get_rooms_availability_service(db.session, room_ids, start_date, end_date)
+    except OperationalError:
+        raise  # @read_only retries it without the replica
+    except Exception as e:
+        logger.exception(f"ERROR: {e}")
+        return jsonify({'ERROR': str(e)}), 500
+    return jsonify(rooms_avail)
+
+
+@rooms_blueprint.route('/api/rooms/', methods=['GET'])
+@cross_origin(expose_headers=PAGINATION_HEADERS)
+@read_only
+@conditional_get('room', validate=[parse_page_args])
 def get_all_rooms():
     try:
-        rooms = Room.query.all()
-        rooms_list = [{
-            'id': room.id,
-            'title': room.title,
-            'max_capacity': room.max_capacity,
-            'min_capacity': room.min_capacity,
-            'duration': room.duration,
-            'reset_buffer': room.reset_buffer,
-            'launch_date': room.launch_date,
-            'sunset_date': room.sunset_date,
-            'description': room.description
-        } for room in rooms]
-        return jsonify(rooms_list)
+        limit, after = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': f'Invalid query parameter: {e}'}), 400
+
+    try:
+        rooms, next_cursor = keyset_page(ROOM_LIST.select(), Room.id, limit, after)
+        return paginated_response(ROOM_LIST.serialize_all(rooms), next_cursor)
+    except OperationalError:
+        raise  # @read_only retries it without the replica
     except SQLAlchemyError as sql_error:
         return jsonify({'error': str(sql_error)})
     except Exception as e:
@@ -67,19 +104,9 @@ def get_all_rooms():
 # Fetch details of a specific room
 @rooms_blueprint.route('/api/rooms/<int:room_id>', methods=['GET'])
 @cross_origin()
+@read_only
 def get_room(room_id):
-    room = Room.query.get_or_404(room_id)
-    return jsonify({
-        'id': room.id,
-        'title': room.title,
-        'max_capacity': room.max_capacity,
-        'min_capacity': room.min_capacity,
-        'duration': room.duration,
-        'reset_buffer': room.reset_buffer,
-        'launch_date': room.launch_date.isoformat() if room.launch_date else None,
-        'sunset_date': room.sunset_date.isoformat() if room.sunset_date else None,
-        'description': room.description
-    })
+    return jsonify(ROOM.fetch_one_or_404(room_id))
 
 
 @rooms_blueprint.route('/api/rooms/<int:room_id>', methods=['DELETE'])
@@ -90,13 +117,14 @@ def delete_room(room_id):
     try:
         db.session.delete(room)
         db.session.commit()
+        availability_cache.invalidate(room_id)
         return jsonify({'message': 'Room deleted successfully'}), 204
     except SQLAlchemyError as e:
-        print(f"error saving to database: {e}")
+        logger.error(f"error saving to database: {e}")
         db.session.rollback()
         return jsonify({'error': 'something went wrong saving to database'}), 500
     except Exception as e:
-        print(f"unknown error occured: {e}")
+        logger.exception(f"unknown error occured: {e}")
         db.session.rollback()
         return jsonify({'error': 'something really bad went wrong'}), 500
 
@@ -127,13 +155,15 @@ def update_room(room_id):
         room.description = data['description']
 
         db.session.commit()
+        # cached timeslots carry the room name
+        availability_cache.invalidate(room_id)
         return jsonify({'message': 'Room updated successfully'})
     except SQLAlchemyError as e:
-        print(f"error saving to database: {e}")
+        logger.error(f"error saving to database: {e}")
         db.session.rollback()
         return jsonify({'error': 'something went wrong saving to database'}), 500
     except Exception as e:
-        print(f"unknown error occured: {e}")
+        logger.exception(f"unknown error occured: {e}")
         db.session.rollback()
         return jsonify({'error': 'something really bad went wrong'}), 500
 
@@ -141,19 +171,10 @@ def update_room(room_id):
 # Fetch costs of a specific room
 @rooms_blueprint.route('/api/rooms/<int:room_id>/costs', methods=['GET'])
 @cross_origin()
+@read_only
+@conditional_get('room_cost')
 def get_all_room_costs(room_id):
-    costs = RoomCost.query.filter_by(room_id=room_id).all()
-    cost_list = [
-        {
-            'id': cost.id,
-            'room_id': cost.room_id,
-            'guests_count': cost.guests_count,
-            'total_cost': cost.total_cost,
-            'start_date': cost.start_date.isoformat() if cost.start_date else None,
-            'end_date': cost.end_date.isoformat() if cost.end_date else None,
-        } for cost in costs
-    ]
-    return jsonify(cost_list)
+    return jsonify(ROOM_COST.fetch_all(RoomCost.room_id == room_id))
 
 
 # Create a new room cost
@@ -173,11 +194,11 @@ def create_room_cost(room_id):
         db.session.commit()
         return jsonify({'message': 'Room cost added successfully'}), 201
     except SQLAlchemyError as e:
-        print(f"error saving to database: {e}")
+        logger.error(f"error saving to database: {e}")
         db.session.rollback()
         return jsonify({'error': 'something went wrong saving to database'}), 500
     except Exception as e:
-        print(f"unknown error occured: {e}")
+        logger.exception(f"unknown error occured: {e}")
         db.session.rollback()
         return jsonify({'error': 'something really bad went wrong'}), 500
 
@@ -196,11 +217,11 @@ def update_room_cost(cost_id):
         db.session.commit()
         return jsonify({'message': 'Room cost updated successfully'})
     except SQLAlchemyError as e:
-        print(f"error saving to database: {e}")
+        logger.error(f"error saving to database: {e}")
         db.session.rollback()
         return jsonify({'error': 'something went wrong saving to database'}), 500
     except Exception as e:
-        print(f"unknown error occured: {e}")
+        logger.exception(f"unknown error occured: {e}")
         db.session.rollback()
         return jsonify({'error': 'something really bad went wrong'}), 500
 
@@ -215,11 +236,11 @@ def delete_room_cost(cost_id):
         db.session.commit()
         return jsonify({'message': 'Room-cost deleted successfully'}), 204
     except SQLAlchemyError as e:
-        print(f"error saving to database: {e}")
+        logger.error(f"error saving to database: {e}")
         db.session.rollback()
         return jsonify({'error': 'something went wrong saving to database'}), 500
     except Exception as e:
-        print(f"unknown error occured: {e}")
+        logger.exception(f"unknown error occured: {e}")
         db.session.rollback()
         return jsonify({'error': 'something really bad went wrong'}), 500
 
@@ -227,33 +248,41 @@ def delete_room_cost(cost_id):
 # Fetch a single room cost
 @rooms_blueprint.route('/api/rooms/costs/<int:cost_id>', methods=['GET'])
 @cross_origin()
+@read_only
 def get_room_cost(cost_id):
-    cost = RoomCost.query.get_or_404(cost_id)
-    return jsonify({
-        'id': cost.id,
-        'room_id': cost.room_id,
-        'guests_count': cost.guests_count,
-        'total_cost': cost.total_cost,
-        'start_date': cost.start_date.isoformat() if cost.start_date else None,
-        'end_date': cost.end_date.isoformat() if cost.end_date else None,
-    })
+    return jsonify(ROOM_COST.fetch_one_or_404(cost_id))
 
 
 @rooms_blueprint.route('/api/rooms/<int:room_id>/timeslots', methods=['GET'])
 @cross_origin()
+@read_only
+@conditional_get('room', 'showtime', 'booking', validate=[check_timeslot_args])
 def get_available_timeslots(room_id):
+    # ?date=YYYY-MM-DD gives that day's slots, ?start=...&end=... (or ?month=YYYY-MM) gives
+    # {date: slots} for the whole range so the week view only needs one request
     date = request.args.get('date')
 
-    # create a new session
-    Session = sessionmaker(bind=db.engine)
-    session = Session()
-
     if not date:
-        return jsonify({'error': 'Date parameter is required'}), 400
+        if not any(request.args.get(param) for param in ('start', 'end', 'month')):
+            return jsonify({'error': 'Date parameter is required'}), 400
+        try:
+            start_date, end_date = parse_date_range(request.args)
+        except ValueError as e:
+            return jsonify({'error': f'Invalid date range: {e}'}), 400
+
+        try:
+            return jsonify(get_room_timeslots_range_service(db.session, room_id, start_date, end_date))
+        except OperationalError:
+            raise  # @read_only retries it without the replica
+        except Exception as e:
+            logger.exception(f"ERROR: {e}")
+            return jsonify({'error': str(e)}), 500
 
     try:
-        timeslots = get_room_timeslots_service(session, room_id, date)
+        timeslots = get_room_timeslots_service(db.session, room_id, date)
         return jsonify(timeslots)
+    except OperationalError:
+        raise
     except Exception as e:
-        print(f"ERROR: {e}")
+        logger.exception(f"ERROR: {e}")
         return jsonify({'error': str(e)}), 500
@@ -1,40 +1,35 @@
+import logging
+
 from flask import Blueprint, request, jsonify
 from flask_cors import cross_origin
-from ..models import db, Showtime
-from ..utils import time_to_string
+from ..cache import availability_cache
+from ..models import db, Room, Showtime
+from ..replicas import read_only
+from ..serializers import SHOWTIME
+from ..services import build_showtime_grid, replace_room_schedule_service
+from ..versions import conditional_get
+from datetime import datetime
 
 from sqlalchemy.exc import SQLAlchemyError
 
 # register the blueprints
 showtimes_blueprint = Blueprint('showtimes', __name__)
+logger = logging.getLogger(__name__)
 
 
 @showtimes_blueprint.route('/api/rooms/<int:room_id>/showtimes', methods=['GET'])
 @cross_origin()
+@read_only
+@conditional_get('showtime')
 def get_all_showtimes(room_id):
-    showtimes = Showtime.query.filter_by(room_id=room_id).all()
-    return jsonify([{
-        'id': showtime.id,
-        'room_id': showtime.room_id,
-        'start_time': time_to_string(showtime.start_time),
-        'end_time': time_to_string(showtime.end_time),
-        'day_of_week': showtime.day_of_week,
-        'timeslot': showtime.timeslot
-    } for showtime in showtimes])
+    return jsonify(SHOWTIME.fetch_all(Showtime.room_id == room_id))
 
 
 @showtimes_blueprint.route('/api/showtimes/<int:showtime_id>', methods=['GET'])
 @cross_origin()
+@read_only
 def get_showtime(showtime_id):
-    showtime = Showtime.query.get_or_404(showtime_id)
-    return jsonify({
-        'id': showtime.id,
-        'room_id': showtime.room_id,
-        'start_time': time_to_string(showtime.start_time),
-        'end_time': time_to_string(showtime.end_time),
-        'day_of_week': showtime.day_of_week,
-        'timeslot': showtime.timeslot
-    })
+    return jsonify(SHOWTIME.fetch_one_or_404(showtime_id))
 
 
 @showtimes_blueprint.route('/api/showtimes/<int:showtime_id>', methods=['DELETE'])
@@ -44,13 +39,14 @@ def delete_showtime(showtime_id):
     try:
         db.session.delete(showtime)
         db.session.commit()
+        availability_cache.invalidate(showtime.room_id)
         return jsonify({'message': 'Showtime deleted successfully'}), 204
     except SQLAlchemyError as e:
-        print(f"error saving to database: {e}")
+        logger.error(f"error saving to database: {e}")
         db.session.rollback()
         return jsonify({'error': 'something went wrong saving to database'}), 500
     except Exception as e:
-        print(f"unknown error occured: {e}")
+        logger.exception(f"unknown error occured: {e}")
         db.session.rollback()
         return jsonify({'error': 'something really bad went wrong'}), 500
 
@@ -60,6 +56,7 @@ def delete_showtime(showtime_id):
 def update_showtime(room_id, showtime_id):
     data = request.get_json()
     showtime = Showtime.query.get_or_404(showtime_id)
+    old_room_id = showtime.room_id
 
     try:
         showtime.room_id = room_id
@@ -69,13 +66,16 @@ def update_showtime(room_id, showtime_id):
         showtime.timeslot = data['timeslot']
 
         db.session.commit()
+        # the weekly template changed so every cached date for the room is suspect
+        availability_cache.invalidate(old_room_id)
+        availability_cache.invalidate(room_id)
         return jsonify({'message': 'Showtime updated successfully'}), 201
     except SQLAlchemyError as e:
-        print(f"error saving to database: {e}")
+        logger.error(f"error saving to database: {e}")
         db.session.rollback()
         return jsonify({'error': 'something went wrong saving to database'}), 500
     except Exception as e:
-        print(f"unknown error occured: {e}")
+        logger.exception(f"unknown error occured: {e}")
         db.session.rollback()
         return jsonify({'error': 'something really bad went wrong'}), 500
 
@@ -94,13 +94,55 @@ def add_showtime(room_id):
     try:
         db.session.add(new_showtime)
         db.session.commit()
+        availability_cache.invalidate(room_id)
         return jsonify({'message': 'Showtime added successfully'}), 201
     except SQLAlchemyError as e:
-        print(f"error saving to database: {e}")
+        logger.error(f"error saving to database: {e}")
         db.session.rollback()
         return jsonify({'error': 'something went wrong saving to database'}), 500
     except Exception as e:
-        print(f"unknown error occured: {e}")
+        logger.exception(f"unknown error occured: {e}")
         db.session.rollback()
         return jsonify({'error': 'something really bad went wrong'}), 500
 
+
+
+@showtimes_blueprint.route('/api/rooms/<int:room_id>/showtimes/generate', methods=['POST'])
+@cross_origin()
+def generate_showtimes(room_id):
+    # build the whole weekly schedule from opening hours and the room's duration/reset buffer,
+    # e.g. {"open_time": "10:00", "close_time": "22:00", "days_of_week": [0, 1, 2, 3, 4, 5, 6]}
+    data = request.get_json()
+    room = Room.query.get_or_404(room_id)
+    try:
+        open_time = datetime.strptime(data['open_time'], '%H:%M').time()
+        close_time = datetime.strptime(data['close_time'], '%H:%M').time()
+        days_of_week = [int(day) for day in data.get('days_of_week', range(7))]
+        if any(day < 0 or day > 6 for day in days_of_week):
+            raise ValueError("days_of_week must be between 0 (Monday) and 6 (Sunday)")
+        if not days_of_week:
+            raise ValueError("days_of_week can not be empty")
+
+        showtime_rows = build_showtime_grid(open_time, close_time, room.duration, room.reset_buffer, days_of_week)
+        # an empty grid would wipe the room's schedule
+        if not showtime_rows:
+            raise ValueError(f"a {room.duration} minute show doesn't fit between {data['open_time']} "
+                             f"and {data['close_time']}")
+    except KeyError as e:
+        return jsonify({'error': f'Missing key in JSON data: {e}'}), 400
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        replace_room_schedule_service(db.session, room_id, showtime_rows)
+        db.session.commit()
+        availability_cache.invalidate(room_id)
+        return jsonify({'message': 'Showtimes generated successfully', 'count': len(showtime_rows)}), 201
+    except SQLAlchemyError as e:
+        logger.error(f"error saving to database: {e}")
+        db.session.rollback()
+        return jsonify({'error': 'something went wrong saving to database'}), 500
+    except Exception as e:
+        logger.exception(f"unknown error occured: {e}")
+        db.session.rollback()
+        return jsonify({'error': 'something really bad went wrong'}), 500
@@ -0,0 +1,158 @@
+from flask import abort
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import Row, select
+
+from .models import db, Booking, Customer, Room, RoomCost, Showtime
+from .utils import time_to_string
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the stdlib encoder
+    orjson = None
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+class Projection:
+    """the columns a route sends back for a model and how each one is formatted.
+
+    select() only pulls those columns as plain rows, which skips building ORM objects and the
+    identity map for read-only lists.  serialize() works on those rows and on ORM instances
+    alike, so write routes that already have the object can use the same output"""
+
+    def __init__(self, model, **fields):
+        self.model = model
+        # name -> (column, formatter)
+        self.fields = {
+            name: field if isinstance(field, tuple) else (field, None)
+            for name, field in fields.items()
+        }
+        self._names = tuple(self.fields)
+        self._formatters = tuple((name, formatter) for name, (_, formatter) in self.fields.items() if formatter)
+
+    def select(self):
+        return select(*(column.label(name) for name, (column, _) in self.fields.items()))
+
+    def serialize(self, row):
+        values = row if isinstance(row, Row) else (getattr(row, name) for name in self._names)
+        item = dict(zip(self._names, values))
+        for name, formatter in self._formatters:
+            item[name] = formatter(item[name])
+        return item
+
+    def serialize_all(self, rows):
+        return [self.serialize(row) for row in rows]
+
+    def fetch_all(self, *criteria):
+        statement = self.select().where(*criteria).order_by(self.model.id)
+        return self.serialize_all(db.session.execute(statement))
+
+    def fetch_one_or_404(self, object_id):
+        row = db.session.execute(self.select().where(self.model.id == object_id)).first()
+        if row is None:
+            abort(404)
+        return self.serialize(row)
+
+
+BOOKING = Projection(
+    Booking,
+    id=Booking.id,
+    room_id=Booking.room_id,
+    customer_id=Booking.customer_id,
+    guest_count=Booking.guest_count,
+    order_id=Booking.order_id,
+    booking_date=(Booking.booking_date, _isoformat),
+    show_date=(Booking.show_date, _isoformat),
+    show_timeslot=Booking.show_timeslot
+)
+
+CUSTOMER = Projection(
+    Customer,
+    id=Customer.id,
+    first_name=Customer.first_name,
+    last_name=Customer.last_name,
+    email=Customer.email,
+    is_minor=Customer.is_minor,
+    is_banned=Customer.is_banned,
+    customer_notes=Customer.customer_notes
+)
+
+# the single room route has always sent iso dates, the list sends the raw datetimes
+ROOM_LIST = Projection(
+    Room,
+    id=Room.id,
+    title=Room.title,
+    max_capacity=Room.max_capacity,
+    min_capacity=Room.min_capacity,
+    duration=Room.duration,
+    reset_buffer=Room.reset_buffer,
+    launch_date=Room.launch_date,
+    sunset_date=Room.sunset_date,
+    description=Room.description
+)
+
+ROOM = Projection(
+    Room,
+    id=Room.id,
+    title=Room.title,
+    max_capacity=Room.max_capacity,
+    min_capacity=Room.min_capacity,
+    duration=Room.duration,
+    reset_buffer=Room.reset_buffer,
+    launch_date=(Room.launch_date, _isoformat),
+    sunset_date=(Room.sunset_date, _isoformat),
+    description=Room.description
+)
+
+ROOM_COST = Projection(
+    RoomCost,
+    id=RoomCost.id,
+    room_id=RoomCost.room_id,
+    guests_count=RoomCost.guests_count,
+    total_cost=RoomCost.total_cost,
+    start_date=(RoomCost.start_date, _isoformat),
+    end_date=(RoomCost.end_date, _isoformat)
+)
+
+SHOWTIME = Projection(
+    Showtime,
+    id=Showtime.id,
+    room_id=Showtime.room_id,
+    start_time=(Showtime.start_time, time_to_string),
+    end_time=(Showtime.end_time, time_to_string),
+    day_of_week=Showtime.day_of_week,
+    timeslot=Showtime.timeslot
+)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """jsonify() through orjson.  dates still go through flask's default handler so responses
+    look exactly the same as with the stdlib encoder, keys stay sorted like flask sorts them.
+
+    orjson can only sort string keys, so anything with other keys ({room_id: dates} from
+    /api/availability) goes through the stdlib, which sorts ints as numbers"""
+
+    option = 0 if orjson is None else orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps(self, obj, **kwargs):
+        # indent only gets asked for in debug mode, leave pretty printing to the stdlib
+        if kwargs.get('indent'):
+            return super().dumps(obj, **kwargs)
+        try:
+            return orjson.dumps(obj, default=self.default, option=self.option).decode()
+        except orjson.JSONEncodeError:
+            # non-string keys, or something neither knows how to encode and the stdlib raises.
+            # compact like orjson, the asgi app calls this without jsonify's separators
+            kwargs.setdefault('separators', (',', ':'))
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+def init_json(app):
+    """switch the app over to orjson when it's installed"""
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
@@ -1,13 +1,27 @@
+import calendar
 import logging
-import os
+import secrets
+from collections import defaultdict
 
 from flask import jsonify
-from .models import db, Room, Showtime, Booking
-from datetime import datetime, timedelta
-from dotenv import load_dotenv
+from sqlalchemy import delete, exists, insert, literal, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 
-load_dotenv()
-NUM_OF_DAYS_TO_CHECK = int(os.getenv('NUM_OF_DAYS_TO_CHECK_AVAILABILITY'))
+from ..config import NUM_OF_DAYS_TO_CHECK
+from .availability_table import mark_room_days
+from .events import SLOT_TAKEN, record_slot_event
+from .cache import availability_cache
+from .holds import free_held_slots, hold_expiry, live_holds_query, lock_slot, slot_is_held
+from .models import db, Room, RoomDayAvailability, Showtime, SlotHold, Booking, TIMESLOT_INDEX
+from .utils import utc_now
+from .versions import record_write
+from datetime import date, datetime, time, timedelta
+
+MAX_DAYS_IN_RANGE = 366  # keep a single availability request from asking for years at a time
+
+logger = logging.getLogger(__name__)
 
 
 def save_room_data(data):
@@ -29,24 +43,24 @@ def save_room_data(data):
         reset_buffer = int(reset_buffer)
 
     except ValueError as e:
-        logging.error(f"Error with datatypes not being integers: {e}")
+        logger.error(f"Error with datatypes not being integers: {e}")
         return jsonify({"error": "Invalid data type"}), 200
 
     # Do validation even though UI will also do this
     # make sure none of the required fields are empty
     if not all([title, max_capacity, min_capacity, duration, reset_buffer]):
-        logging.error("Error: missing required fields")
+        logger.error("Error: missing required fields")
         return jsonify({"Error": "Missing required fields"}), 200
 
     # make sure min and max capacity are positive integers and min is less than max
     if not isinstance(max_capacity, int) or max_capacity <= 0:
-        logging.error("Error: Max Capacity must be a positive integer")
+        logger.error("Error: Max Capacity must be a positive integer")
         return jsonify({"Error": "Max Capacity must be a positive integer"}), 200
     if not isinstance(min_capacity, int) or min_capacity <= 0:
-        logging.error("Error: Min Capacity must be a positive integer")
+        logger.error("Error: Min Capacity must be a positive integer")
         return jsonify({"error": "Min Capacity must be a positive integer"}), 200
     if min_capacity > max_capacity:
-        logging.error("Error: Min Capacity must be less than Max Capacity")
+        logger.error("Error: Min Capacity must be less than Max Capacity")
         return jsonify({"error": "Min Capacity must be less than Max Capacity"}), 400
 
     # save the room to the db
@@ -78,86 +92,505 @@ def add_room_service(title, max_capacity, min_capacity, duration, reset_buffer,
         db.session.commit()
         return jsonify({"message": "Room added successfully"}), 201
     except Exception as e:
-        logging.error(f"Error saving to database: {e}")
+        logger.error(f"Error saving to database: {e}")
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
 
-def get_room_availability_service(session, room_id):
-    """TODO: REWORK! we don't want to be arbitrarily looking ahead num of days
-    instead we should load the entire month and then when the date changes
-    to another month we load that month.  Arbitrary days is not going towork"""
+def parse_date_range(args):
+    """work out which window of dates the calendar is asking for.
 
-    start_date = datetime.today()
-    end_date = start_date + timedelta(days=NUM_OF_DAYS_TO_CHECK)  # check availability for next x number of days
+    accepts either ?month=YYYY-MM or ?start=YYYY-MM-DD&end=YYYY-MM-DD.  if neither is given
+    we fall back to today + NUM_OF_DAYS_TO_CHECK so older clients keep working.
+    raises ValueError if the params are malformed or the window is too big"""
+    month = args.get('month')
+    start = args.get('start')
+    end = args.get('end')
 
-    # Get all showtimes for the room
-    showtimes = session.query(Showtime).filter(Showtime.room_id == room_id).order_by(Showtime.day_of_week, Showtime.timeslot).all()
+    if month:
+        first_day = datetime.strptime(month, '%Y-%m').date()
+        last_day = first_day.replace(day=calendar.monthrange(first_day.year, first_day.month)[1])
+        return first_day, last_day
 
-    # Initialize a set to store available dates
-    available_dates = set()
+    start_date = datetime.strptime(start, '%Y-%m-%d').date() if start else date.today()
+    if end:
+        end_date = datetime.strptime(end, '%Y-%m-%d').date()
+    else:
+        end_date = start_date + timedelta(days=NUM_OF_DAYS_TO_CHECK)
 
-    # Iterate through the date range
-    for single_date in (start_date + timedelta(n) for n in range((end_date - start_date).days + 1)):
-        # Get the day of the week (0 = Monday, ..., 6 = Sunday)
-        day_of_week = single_date.weekday()
+    if end_date < start_date:
+        raise ValueError("end date must not be before start date")
+    if (end_date - start_date).days > MAX_DAYS_IN_RANGE:
+        raise ValueError(f"date range can not be longer than {MAX_DAYS_IN_RANGE} days")
+    return start_date, end_date
 
-        # Get the showtimes for the current day of the week
-        day_showtimes = [st for st in showtimes if st.day_of_week == day_of_week]
 
-        if not day_showtimes:
+def parse_room_ids(args):
+    """the rooms asked for with ?rooms=1,2,3, duplicates dropped.  raises ValueError"""
+    rooms = args.get('rooms')
+    if not rooms:
+        raise ValueError('rooms parameter is required')
+    try:
+        return list(dict.fromkeys(int(room_id) for room_id in rooms.split(',') if room_id.strip()))
+    except ValueError:
+        raise ValueError('rooms must be a comma separated list of room ids')
+
+
+def check_timeslot_args(args):
+    """the timeslots routes want ?date= or a window.  raises ValueError when there's neither or
+    the window is bad, a bad ?date= isn't an error (those get an empty list)"""
+    if args.get('date'):
+        return
+    if not any(args.get(param) for param in ('start', 'end', 'month')):
+        raise ValueError('Date parameter is required')
+    parse_date_range(args)
+
+
+def compute_free_timeslots(showtimes, bookings, start_date, end_date):
+    """work out the free timeslots for every day between start_date and end_date (inclusive)
+
+    showtimes is the weekly template as (day_of_week, timeslot) rows and bookings are
+    (show_date, show_timeslot) rows that have already been loaded for the whole range,
+    so this never touches the db.  days with nothing free are left out of the result"""
+
+    # weekly template, 0 = Monday ... 6 = Sunday
+    template = defaultdict(set)
+    for day_of_week, timeslot in showtimes:
+        template[day_of_week].add(timeslot)
+
+    booked = defaultdict(set)
+    for show_date, show_timeslot in bookings:
+        booked[show_date].add(show_timeslot)
+
+    free_timeslots = {}
+    for offset in range((end_date - start_date).days + 1):
+        single_date = start_date + timedelta(days=offset)
+        day_template = template.get(single_date.weekday())
+        if not day_template:
             continue
 
-        # Get all bookings for the room on the current date
-        bookings = session.query(Booking).filter(Booking.room_id == room_id, Booking.show_date == single_date.date()).all()
-
-        # Check if there is at least one showtime without a booking
-        booked_timeslots = {booking.show_timeslot for booking in bookings}
-        if any(showtime.timeslot not in booked_timeslots for showtime in day_showtimes):
-            available_dates.add(single_date.date())
-
-    # Convert dates to strings using my favorite thing, a list comprehension
-    available_dates = [date.strftime('%Y-%m-%d') for date in available_dates]
-
-    return available_dates
+        free = day_template - booked.get(single_date, set())
+        if free:
+            free_timeslots[single_date] = sorted(free)
+
+    return free_timeslots
+
+
+def get_room_availability_service(session, room_id, start_date=None, end_date=None):
+    """return the dates between start_date and end_date that have at least one open timeslot"""
+    return get_rooms_availability_service(session, [room_id], start_date, end_date)[room_id]
+
+
+def get_rooms_availability_service(session, room_ids, start_date=None, end_date=None):
+    """availability for several rooms at once, returned as {room_id: [available dates]}
+
+    rooms the room_day_availability table covers for the whole range are answered from it with
+    one range scan.  for the rest the weekly showtimes and the bookings in the range are loaded
+    with one query each and grouped in memory, so the number of queries doesn't grow with the rooms"""
+    start_date, end_date = default_date_range(start_date, end_date)
+    availability, generations = cached_availability(room_ids, start_date, end_date)
+
+    # everything came out of the cache
+    if not generations:
+        return availability
+
+    summary_rows = session.execute(summary_availability_query(generations, start_date, end_date)).all()
+    held_rows = session.execute(summary_holds_query(generations, start_date, end_date)).all() if summary_rows else []
+    generations = store_summary_availability(availability, generations, summary_rows, held_rows, start_date, end_date)
+    if not generations:
+        return {room_id: availability[room_id] for room_id in room_ids}
+
+    showtime_rows = session.execute(availability_showtimes_query(generations)).all()
+    # rooms without showtimes can never be available, no need to look at their bookings
+    showtime_room_ids = {room_id for room_id, _, _ in showtime_rows}
+    booking_rows = []
+    if showtime_room_ids:
+        booking_rows = session.execute(availability_bookings_query(showtime_room_ids, start_date, end_date)).all()
+
+    return store_availability(room_ids, availability, generations, showtime_rows, booking_rows, start_date, end_date)
+
+
+def default_date_range(start_date, end_date):
+    if start_date is None:
+        start_date = date.today()
+    if end_date is None:
+        end_date = start_date + timedelta(days=NUM_OF_DAYS_TO_CHECK)
+    return start_date, end_date
+
+
+# the availability pieces below are shared with the async services, only the queries differ
+def cached_availability(room_ids, start_date, end_date):
+    """(availability found in the cache, {room_id: cache generation} for the rooms that weren't)"""
+    availability = {}
+    generations = {}
+    for room_id in room_ids:
+        hit, available_dates = availability_cache.get(room_id, 'availability', start_date, end_date)
+        if hit:
+            availability[room_id] = available_dates
+        else:
+            generations[room_id] = availability_cache.generation(room_id)
+    return availability, generations
+
+
+def summary_availability_query(room_ids, start_date, end_date):
+    return select(RoomDayAvailability.room_id, RoomDayAvailability.show_date, RoomDayAvailability.total_slots,
+                  RoomDayAvailability.booked_slots).where(
+        RoomDayAvailability.room_id.in_(list(room_ids)),
+        RoomDayAvailability.show_date >= start_date,
+        RoomDayAvailability.show_date <= end_date
+    ).order_by(RoomDayAvailability.room_id, RoomDayAvailability.show_date)
+
+
+def summary_holds_query(room_ids, start_date, end_date):
+    """the live holds on slots that aren't booked.  the summary table only counts bookings, a
+    hold is added on top when it's read so it stops counting the moment it expires, whether or
+    not the expiry scheduler has deleted it yet"""
+    return live_holds_query(
+        (SlotHold.room_id, SlotHold.show_date, SlotHold.show_timeslot), room_ids, start_date, end_date
+    ).where(~exists().where(
+        Booking.room_id == SlotHold.room_id,
+        Booking.show_date == SlotHold.show_date,
+        Booking.show_timeslot == SlotHold.show_timeslot
+    ))
+
+
+def store_summary_availability(availability, generations, summary_rows, held_rows, start_date, end_date):
+    """answer (and cache) the rooms that have a summary row for every day of the range, with
+    the held timeslots of held_rows taken off.  returns the generations of the rooms that
+    don't, they need the live computation"""
+    day_count = (end_date - start_date).days + 1
+    rows_by_room = defaultdict(list)
+    for room_id, show_date, total_slots, booked_slots in summary_rows:
+        rows_by_room[room_id].append((show_date, total_slots, booked_slots))
+
+    held = defaultdict(set)
+    for room_id, show_date, show_timeslot in held_rows:
+        held[(room_id, show_date)].add(show_timeslot)
+
+    uncovered = {}
+    for room_id, generation in generations.items():
+        rows = rows_by_room.get(room_id, ())
+        if len(rows) != day_count:
+            uncovered[room_id] = generation
+            continue
+        available_dates = [show_date.strftime('%Y-%m-%d') for show_date, total_slots, booked_slots in rows
+                           if booked_slots + len(held.get((room_id, show_date), ())) < total_slots]
+        availability_cache.set(room_id, 'availability', start_date, end_date, available_dates, generation)
+        availability[room_id] = available_dates
+    return uncovered
+
+
+def availability_showtimes_query(room_ids):
+    return select(Showtime.room_id, Showtime.day_of_week, Showtime.timeslot).where(Showtime.room_id.in_(list(room_ids)))
+
+
+def availability_bookings_query(room_ids, start_date, end_date):
+    """the booked timeslots in the range, held ones count as booked"""
+    return select(Booking.room_id, Booking.show_date, Booking.show_timeslot).where(
+        Booking.room_id.in_(list(room_ids)),
+        Booking.show_date >= start_date,
+        Booking.show_date <= end_date
+    ).union_all(live_holds_query(
+        (SlotHold.room_id, SlotHold.show_date, SlotHold.show_timeslot), room_ids, start_date, end_date
+    ))
+
+
+def store_availability(room_ids, availability, generations, showtime_rows, booking_rows, start_date, end_date):
+    """work out the available dates of the rooms that missed the cache and cache them"""
+    showtimes_by_room = defaultdict(list)
+    for room_id, day_of_week, timeslot in showtime_rows:
+        showtimes_by_room[room_id].append((day_of_week, timeslot))
+
+    bookings_by_room = defaultdict(list)
+    for room_id, show_date, show_timeslot in booking_rows:
+        bookings_by_room[room_id].append((show_date, show_timeslot))
+
+    for room_id, generation in generations.items():
+        free_timeslots = compute_free_timeslots(showtimes_by_room[room_id], bookings_by_room[room_id],
+                                                start_date, end_date)
+        available_dates = [single_date.strftime('%Y-%m-%d') for single_date in free_timeslots]
+        availability_cache.set(room_id, 'availability', start_date, end_date, available_dates, generation)
+        availability[room_id] = available_dates
+
+    return {room_id: availability[room_id] for room_id in room_ids}
+
+
+def claim_timeslot_service(session, booking_values):
+    """insert a booking only if nobody has its (room, show_date, show_timeslot) yet and nobody
+    else holds it
+
+    the unique index on bookings is what serializes two customers going for the same slot, so
+    this is a single INSERT .. SELECT .. WHERE NOT EXISTS (hold) ON CONFLICT DO NOTHING RETURNING
+    id on postgres and sqlite.  holds live in another table the index can't see, the slot lock
+    taken first keeps one from being added between the check and the insert.  returns the new
+    booking id, or None if the slot was already taken.  the caller is responsible for committing"""
+    lock_slot(session, booking_values['room_id'], booking_values['show_date'], booking_values['show_timeslot'])
+    dialect = session.get_bind(mapper=Booking).dialect.name
+    dialect_insert = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}.get(dialect)
+    unheld = values_select(Booking, booking_values).where(~slot_is_held(
+        booking_values['room_id'], booking_values['show_date'], booking_values['show_timeslot'], utc_now()
+    ))
+
+    if dialect_insert is not None:
+        statement = dialect_insert(Booking).from_select(list(booking_values), unheld).on_conflict_do_nothing(
+            index_elements=[Booking.room_id, Booking.show_date, Booking.show_timeslot]
+        ).returning(Booking.id)
+        booking_id = session.execute(statement).scalar()
+    else:
+        # other databases don't have ON CONFLICT, let the unique index raise instead
+        try:
+            with session.begin_nested():
+                booking_id = session.execute(
+                    insert(Booking).from_select(list(booking_values), unheld).returning(Booking.id)
+                ).scalar()
+        except IntegrityError as e:
+            if not is_timeslot_conflict(e):
+                raise
+            return None
+
+    if booking_id is not None:
+        record_write(session, 'booking', booking_values['room_id'])
+        mark_room_days(session, booking_values['room_id'], [booking_values['show_date']])
+        record_slot_event(session, SLOT_TAKEN, booking_values['room_id'], booking_values['show_date'],
+                          booking_values['show_timeslot'])
+    return booking_id
+
+
+def values_select(model, values):
+    """SELECT :value, :value, ... typed like the model's columns, for INSERT .. SELECT"""
+    return select(*[literal(value, model.__table__.c[column].type) for column, value in values.items()])
+
+
+def is_timeslot_conflict(error):
+    """true when an IntegrityError came from the one-booking-per-timeslot index, not from a
+    foreign key or a NOT NULL.  postgres names the constraint, sqlite lists the index's columns"""
+    diag = getattr(error.orig, 'diag', None)
+    if diag is not None:
+        return diag.constraint_name == TIMESLOT_INDEX
+    return 'bookings.room_id, bookings.show_date, bookings.show_timeslot' in str(error.orig)
+
+
+def timeslot_is_held(session, room_id, show_date, show_timeslot):
+    """take the slot lock and say whether someone holds the slot, for the writes that can't put
+    the hold check into their insert the way claim_timeslot_service does (moving a booking)"""
+    lock_slot(session, room_id, show_date, show_timeslot)
+    return session.execute(select(slot_is_held(room_id, show_date, show_timeslot, utc_now()))).scalar()
+
+
+def timeslot_exists(session, room_id, show_date, show_timeslot):
+    return session.execute(select(Showtime.id).where(
+        Showtime.room_id == room_id,
+        Showtime.day_of_week == show_date.weekday(),
+        Showtime.timeslot == show_timeslot
+    ).limit(1)).first() is not None
+
+
+def hold_timeslot_service(session, room_id, show_date, show_timeslot, minutes):
+    """hold a timeslot for `minutes` if it isn't booked or held by someone else.  an expired
+    hold that hasn't been cleaned up yet is taken over.
+
+    one INSERT .. SELECT .. WHERE NOT EXISTS (booking) ON CONFLICT DO UPDATE .. WHERE expired on
+    postgres and sqlite, the unique index on slot_holds decides between two customers.  returns
+    the hold's values with its id and token, or None if the slot is taken.  the caller commits.
+    takes the slot lock first like claim_timeslot_service"""
+    lock_slot(session, room_id, show_date, show_timeslot)
+    now = utc_now()
+    hold_values = {
+        'room_id': room_id,
+        'show_date': show_date,
+        'show_timeslot': show_timeslot,
+        'token': secrets.token_urlsafe(24),
+        'expires_at': now + timedelta(minutes=minutes),
+    }
+    unbooked = values_select(SlotHold, hold_values).where(~exists().where(
+        Booking.room_id == room_id,
+        Booking.show_date == show_date,
+        Booking.show_timeslot == show_timeslot
+    ))
+    dialect = session.get_bind(mapper=SlotHold).dialect.name
+    dialect_insert = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}.get(dialect)
+
+    if dialect_insert is not None:
+        statement = dialect_insert(SlotHold).from_select(list(hold_values), unbooked)
+        statement = statement.on_conflict_do_update(
+            index_elements=[SlotHold.room_id, SlotHold.show_date, SlotHold.show_timeslot],
+            set_={'token': statement.excluded.token, 'expires_at': statement.excluded.expires_at},
+            where=SlotHold.expires_at <= now
+        ).returning(SlotHold.id)
+        hold_id = session.execute(statement).scalar()
+    else:
+        # no upsert, clear an expired hold out of the way first
+        session.execute(delete(SlotHold).where(
+            SlotHold.room_id == room_id,
+            SlotHold.show_date == show_date,
+            SlotHold.show_timeslot == show_timeslot,
+            SlotHold.expires_at <= now
+        ))
+        try:
+            with session.begin_nested():
+                hold_id = session.execute(
+                    insert(SlotHold).from_select(list(hold_values), unbooked).returning(SlotHold.id)
+                ).scalar()
+        except IntegrityError:
+            return None
+
+    if hold_id is None:
+        return None
+    record_write(session, 'booking', room_id)
+    record_slot_event(session, SLOT_TAKEN, room_id, show_date, show_timeslot)
+    hold_expiry.schedule(session, hold_id, hold_values['expires_at'])
+    return dict(hold_values, id=hold_id)
+
+
+def take_hold(session, token):
+    """delete a live hold, returns its (room_id, show_date, show_timeslot) or None if there is
+    no such hold or it has expired"""
+    return session.execute(
+        delete(SlotHold)
+        .where(SlotHold.token == token, SlotHold.expires_at > utc_now())
+        .returning(SlotHold.room_id, SlotHold.show_date, SlotHold.show_timeslot)
+    ).first()
+
+
+def release_hold_service(session, token):
+    """give a held timeslot back before it expires.  returns the slot or None, the caller commits"""
+    slot = take_hold(session, token)
+    if slot is not None:
+        free_held_slots(session, [slot])
+    return slot
+
+
+def convert_hold_service(session, token, booking_values):
+    """turn a hold into a booking of the same slot.  the hold is deleted and the booking
+    inserted in one transaction, so the slot is never free in between and a hold can only be
+    converted once.  booking_values are the booking's other columns.
+
+    returns (slot, booking id): slot is None when the hold is gone (expired, released or already
+    converted), the id is None if the slot got booked anyway.  the caller commits, or rolls back
+    when either is None"""
+    slot = take_hold(session, token)
+    if slot is None:
+        return None, None
+    room_id, show_date, show_timeslot = slot
+    booking_id = claim_timeslot_service(session, dict(
+        booking_values, room_id=room_id, show_date=show_date, show_timeslot=show_timeslot
+    ))
+    return slot, booking_id
+
+
+def build_showtime_grid(open_time, close_time, duration, reset_buffer, days_of_week):
+    """lay out a room's weekly timeslots.
+
+    shows start at open_time and each one is followed by the room's reset_buffer before the next
+    can start, the last show has to finish by close_time.  returns one dict per Showtime row"""
+    if duration <= 0:
+        raise ValueError("room duration must be a positive number of minutes")
+    if reset_buffer < 0:
+        raise ValueError("room reset buffer can not be negative")
+
+    opens_at = open_time.hour * 60 + open_time.minute
+    closes_at = close_time.hour * 60 + close_time.minute
+    if closes_at <= opens_at:
+        raise ValueError("close time must be after open time")
+
+    # the start/end minutes are the same every day, only work them out once
+    slots = []
+    start_minute = opens_at
+    while start_minute + duration <= closes_at:
+        end_minute = start_minute + duration
+        slots.append((time(start_minute // 60, start_minute % 60), time(end_minute // 60, end_minute % 60)))
+        start_minute = end_minute + reset_buffer
+
+    return [
+        {
+            'day_of_week': day_of_week,
+            'start_time': start_time,
+            'end_time': end_time,
+            'timeslot': timeslot
+        }
+        for day_of_week in sorted(set(days_of_week))
+        for timeslot, (start_time, end_time) in enumerate(slots, start=1)
+    ]
+
+
+def replace_room_schedule_service(session, room_id, showtime_rows):
+    """swap the room's whole weekly schedule for showtime_rows with one delete and one bulk
+    insert.  the caller commits so it all happens in a single transaction"""
+    session.execute(delete(Showtime).where(Showtime.room_id == room_id))
+    record_write(session, 'showtime', room_id)
+    mark_room_days(session, room_id)
+    if showtime_rows:
+        session.execute(insert(Showtime), [dict(row, room_id=room_id) for row in showtime_rows])
+
+
+def get_room_timeslots_range_service(session, room_id, start_date, end_date):
+    """every date from start_date to end_date (inclusive) mapped to that day's timeslots and
+    whether each one is booked, e.g. {'2024-07-01': [{...}, ...], ...}.
+
+    two queries whatever the range: the room's showtimes with the room joined in (for its
+    title) and the bookings in the range"""
+    hit, grid = availability_cache.get(room_id, 'timeslots', start_date, end_date)
+    if hit:
+        return grid
+    generation = availability_cache.generation(room_id)
+
+    showtimes_query, bookings_query = timeslot_queries(room_id, start_date, end_date)
+    showtimes = session.execute(showtimes_query).scalars().all()
+    booked = set(session.execute(bookings_query).all())
+
+    grid = build_timeslot_grid(showtimes, booked, start_date, end_date)
+    availability_cache.set(room_id, 'timeslots', start_date, end_date, grid, generation)
+    return grid
+
+
+def timeslot_queries(room_id, start_date, end_date):
+    """the showtimes (room eager loaded) and booked (show_date, show_timeslot) selects for a
+    room's timeslot grid, a held slot shows as booked"""
+    day_count = (end_date - start_date).days + 1
+    days_of_week = {(start_date + timedelta(days=offset)).weekday() for offset in range(min(day_count, 7))}
+
+    showtimes_query = (
+        select(Showtime)
+        .options(joinedload(Showtime.room))
+        .where(Showtime.room_id == room_id, Showtime.day_of_week.in_(days_of_week))
+        .order_by(Showtime.id)
+    )
+    bookings_query = select(Booking.show_date, Booking.show_timeslot).where(
+        Booking.room_id == room_id,
+        Booking.show_date >= start_date,
+        Booking.show_date <= end_date
+    ).union_all(live_holds_query((SlotHold.show_date, SlotHold.show_timeslot), [room_id], start_date, end_date))
+    return showtimes_query, bookings_query
+
+
+def build_timeslot_grid(showtimes, booked, start_date, end_date):
+    # the slot details only depend on the day of the week, build them once per weekday
+    showtimes_by_day = defaultdict(list)
+    for showtime in showtimes:
+        showtimes_by_day[showtime.day_of_week].append((showtime, {
+            'id': showtime.id,
+            'timeslot': showtime.timeslot,
+            'roomName': showtime.room.title,
+            'startTime': showtime.start_time.strftime('%H:%M'),
+            'endTime': showtime.end_time.strftime('%H:%M'),
+        }))
+
+    grid = {}
+    for offset in range((end_date - start_date).days + 1):
+        day = start_date + timedelta(days=offset)
+        grid[day.isoformat()] = [
+            dict(slot, isBooked=(day, showtime.timeslot) in booked)
+            for showtime, slot in showtimes_by_day[day.weekday()]
+        ]
+    return grid
 
 
 def get_room_timeslots_service(session, room_id, date_str):
     try:
         # Convert the date string to a datetime object
-        date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-
-        # Query the showtimes based on the room_id and day_of_week
-        timeslots = session.query(Showtime).filter(
-            Showtime.room_id == room_id,
-            Showtime.day_of_week == date_obj.weekday()
-        ).all()
-
-        # Get all bookings for the given room and date
-        bookings = session.query(Booking).filter(
-            Booking.room_id == room_id,
-            Booking.show_date == date_obj
-        ).all()
-
-        # Create a set of booked timeslots for quick lookup
-        booked_timeslots = {booking.show_timeslot for booking in bookings}
-
-        # Transform the timeslots into the format needed for the frontend
-        timeslot_list = [
-            {
-                'id': timeslot.id,
-                'timeslot': timeslot.timeslot,
-                'roomName': timeslot.room.title,
-                'startTime': timeslot.start_time.strftime('%H:%M'),
-                'endTime': timeslot.end_time.strftime('%H:%M'),
-                'isBooked': timeslot.timeslot in booked_timeslots
-            }
-
-            for timeslot in timeslots
-        ]
-
-        return timeslot_list
-    except Exception as e:
-        print(f"Error in get_room_timeslots_service: {e}")
+        date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError as e:
+        # a bad date has always been an empty list, database errors go to the caller
+        logger.error(f"Error in get_room_timeslots_service: {e}")
         return []
-
+    return get_room_timeslots_range_service(session, room_id, date_obj, date_obj)[date_obj.isoformat()]
@@ -0,0 +1,117 @@
+import json
+import logging
+import random
+import time
+from datetime import datetime, timezone
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+from .logs import log_pipeline
+from .models import db
+
+# prefix that gets a plan for a statement, per dialect.  ANALYZE runs the query for real so only
+# selects are ever explained
+EXPLAIN_PREFIXES = {
+    'postgresql': 'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ',
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+}
+
+
+class SlowQueryLog:
+    """writes statements slower than SLOW_QUERY_THRESHOLD_MS as JSON lines: the sql, its
+    parameters, the route that ran it and, for a sample of the selects, their plan.
+
+    the lines go through the log pipeline's queue and thread (logs.py) to SLOW_QUERY_LOG_FILE,
+    one file every worker appends to and logrotate rotates, like LOG_FILE"""
+
+    def __init__(self):
+        self._engines = set()
+        self.threshold = 0
+        self.explain_rate = 0
+        self._logger = logging.getLogger('xavro.slow_queries')
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+
+    def init_app(self, app):
+        self.threshold = app.config['SLOW_QUERY_THRESHOLD_MS'] / 1000
+        if self.threshold <= 0:
+            return
+        self.explain_rate = app.config['SLOW_QUERY_EXPLAIN_RATE']
+        log_pipeline.add_file(self._logger, app.config['SLOW_QUERY_LOG_FILE'])
+
+        with app.app_context():
+            for engine in db.engines.values():
+                self.track(engine)
+
+    def track(self, engine):
+        if engine in self._engines:
+            return
+        self._engines.add(engine)
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # on the execution context, a statement that raises never reaches _after_cursor_execute
+        if context is not None:
+            context._xavro_slow_query_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_xavro_slow_query_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        if elapsed < self.threshold:
+            return
+
+        entry = {
+            'time': datetime.now(timezone.utc).isoformat(),
+            'duration_ms': round(elapsed * 1000, 3),
+            'database': conn.engine.url.render_as_string(hide_password=True),
+            'statement': statement,
+            'parameters': parameters,
+            'executemany': executemany,
+            'route': None,
+        }
+        if has_request_context():
+            entry['route'] = request.url_rule.rule if request.url_rule is not None else request.path
+            entry['method'] = request.method
+        if not executemany and random.random() < self.explain_rate:
+            entry['plan'] = self.explain(conn, statement, parameters)
+        self.write(entry)
+
+    @staticmethod
+    def explain(conn, statement, parameters):
+        prefix = EXPLAIN_PREFIXES.get(conn.dialect.name, 'EXPLAIN ')
+        if not statement.lstrip().upper().startswith('SELECT'):
+            return None
+
+        # a raw cursor on the same connection so the plan sees the same transaction, and so
+        # neither these listeners nor the pending result of the original statement are touched
+        cursor = conn.connection.dbapi_connection.cursor()
+        savepoint = conn.dialect.name == 'postgresql'  # a failed EXPLAIN would abort the transaction
+        try:
+            if savepoint:
+                cursor.execute('SAVEPOINT slow_query_explain')
+            try:
+                cursor.execute(prefix + statement, parameters)
+                rows = [list(row) for row in cursor.fetchall()]
+            except Exception as e:
+                if savepoint:
+                    cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+                return {'error': str(e)}
+            if savepoint:
+                cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+        finally:
+            cursor.close()
+
+        if conn.dialect.name == 'postgresql':
+            return rows[0][0]  # FORMAT JSON is one row with the whole plan
+        return rows
+
+    def write(self, entry):
+        self._logger.info(json.dumps(entry, default=str))
+
+
+slow_query_log = SlowQueryLog()
@@ -1,3 +1,4 @@
+from datetime import datetime, timezone
 from enum import Enum
 
 
@@ -15,3 +16,13 @@ class Roles(Enum):
 
 def time_to_string(t):
     return t.strftime("%H:%M:%S") if t else None
+
+
+def normalize_email(email):
+    """the key customers are matched on, so " Bob@X.com" and "bob@x.com" are the same person"""
+    return email.strip().lower() if email else email
+
+
+def utc_now():
+    """naive UTC, what the DateTime columns like slot_holds.expires_at hold"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
@@ -0,0 +1,149 @@
+import hashlib
+import threading
+import time
+from collections import defaultdict
+from datetime import date
+from functools import wraps
+
+from flask import current_app, make_response, request
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from .models import Booking, Room, RoomCost, Showtime
+
+# the tables the reference-data endpoints are built from and the attribute holding their room
+TRACKED_MODELS = {
+    Room: ('room', 'id'),
+    Showtime: ('showtime', 'room_id'),
+    RoomCost: ('room_cost', 'room_id'),
+    Booking: ('booking', 'room_id'),
+}
+
+
+class VersionRegistry:
+    """write counters per (kind, room) that the ETags are built from.
+
+    a write with a room bumps that room's counter, a write without one (a bulk statement)
+    bumps the whole table so every room's ETag changes.  answering a revalidation only needs
+    these counters, never the database"""
+
+    def __init__(self):
+        self._rooms = defaultdict(int)  # (kind, room_id) -> version
+        self._tables = defaultdict(int)  # kind -> version, bumped by writes without a room
+        self._any = defaultdict(int)  # kind -> version, bumped by every write
+        self._lock = threading.Lock()
+
+    def bump(self, kind, room_id=None):
+        with self._lock:
+            if room_id is None:
+                self._tables[kind] += 1
+            else:
+                self._rooms[(kind, room_id)] += 1
+            self._any[kind] += 1
+
+    def token(self, kind, room_id=None):
+        with self._lock:
+            if room_id is None:
+                return f'{kind}:{self._any[kind]}'
+            return f'{kind}.{room_id}:{self._rooms[(kind, room_id)]}.{self._tables[kind]}'
+
+
+versions = VersionRegistry()
+
+
+def record_write(session, kind, room_id=None):
+    """note a write made with a core statement (the orm flush events can't see those).  the
+    version is only bumped once the session commits"""
+    session.info.setdefault('pending_versions', set()).add((kind, room_id))
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_orm_writes(session, flush_context):
+    pending = session.info.setdefault('pending_versions', set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        tracked = TRACKED_MODELS.get(type(obj))
+        if tracked is None:
+            continue
+        kind, room_attribute = tracked
+        pending.add((kind, getattr(obj, room_attribute)))
+
+        # a row moved to another room changes the old room as well
+        for old_room_id in inspect(obj).attrs[room_attribute].history.deleted or ():
+            pending.add((kind, old_room_id))
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_committed_writes(session):
+    for kind, room_id in session.info.pop('pending_versions', ()):
+        versions.bump(kind, room_id)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _drop_rolled_back_writes(session, previous_transaction):
+    # a savepoint rolling back leaves the rest of the transaction alive, bumping too often is
+    # harmless so only forget the writes when the whole transaction is gone
+    if not previous_transaction.nested:
+        session.info.pop('pending_versions', None)
+
+
+def room_ids_for(view_args, args):
+    """the rooms a request is about, from the url (/api/rooms/<room_id>/...) or ?rooms=1,2,3"""
+    if view_args and 'room_id' in view_args:
+        return [view_args['room_id']]
+    if args.get('rooms'):
+        try:
+            return sorted({int(room_id) for room_id in args['rooms'].split(',') if room_id.strip()})
+        except ValueError:
+            return None
+    return [None]
+
+
+def args_are_valid(validators, args):
+    """false when one of a route's argument parsers raises, the view answers those with a 400"""
+    try:
+        for validate in validators:
+            validate(args)
+    except ValueError:
+        return False
+    return True
+
+
+def etag_for(kinds, room_ids, max_age, query_string=b''):
+    tokens = [versions.token(kind, room_id) for kind in kinds for room_id in room_ids]
+    # ?month=, ?start= etc pick what the body holds, another window is another representation
+    tokens.append(query_string.decode('latin-1'))
+    tokens.append(date.today().isoformat())  # the default availability window moves daily
+    if max_age > 0:
+        tokens.append(str(int(time.time() // max_age)))
+    return hashlib.sha1('|'.join(tokens).encode()).hexdigest()[:20]
+
+
+def conditional_get(*kinds, validate=()):
+    """answer If-None-Match with a 304 when none of `kinds` has been written since the ETag
+    was handed out, before the view (and so the database and the serializer) runs.
+
+    `validate` are the parsers the view runs on request.args, a request one of them rejects
+    goes to the view for its 400 instead of getting a 304.  the counters live in each worker,
+    the ETag also changes every ETAG_MAX_AGE seconds so a worker that never saw another
+    worker's write can't keep answering 304 forever"""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            room_ids = room_ids_for(request.view_args, request.args)
+            if room_ids is None or not args_are_valid(validate, request.args):
+                return view(*args, **kwargs)
+
+            etag = etag_for(kinds, room_ids, current_app.config['ETAG_MAX_AGE'], request.query_string)
+
+            if request.if_none_match.contains(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'  # always revalidate
+            return response
+        return wrapped
+    return decorator
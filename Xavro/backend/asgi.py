@@ -0,0 +1,12 @@
+"""ASGI entry point.  the calendar reads (availability and timeslots) are served on asyncio by
+CalendarApp, every other route is the flask app run through asgiref's WSGI adapter:
+
+    uvicorn backend.asgi:app --workers 4
+
+gunicorn backend.app:app keeps working as before for a purely synchronous deployment"""
+from asgiref.wsgi import WsgiToAsgi
+
+from backend.app import app as flask_app
+from backend.app_files.async_app import CalendarApp
+
+app = CalendarApp(flask_app, WsgiToAsgi(flask_app))
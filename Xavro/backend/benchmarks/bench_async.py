@@ -0,0 +1,146 @@
+"""compare the sync flask calendar endpoints with the asyncio ones at high concurrency.
+
+the same seeded database is served twice, by one gunicorn gthread worker (backend.app) and by
+one uvicorn worker (backend.asgi), and both get the same stream of availability and timeslot
+requests with --concurrency of them in flight.  the availability cache is turned off so every
+request reaches the database.  run from the Xavro directory (needs gunicorn, uvicorn and httpx):
+
+    python -m backend.benchmarks.bench_async
+    python -m backend.benchmarks.bench_async --database-uri postgresql://localhost/xavro_bench
+
+the gap only really shows against postgres over a network, a local SQLite file answers too
+quickly for anything to wait on it.  the database is dropped and re-seeded, never point this
+at a real database"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+
+def server_env(database_uri):
+    env = dict(os.environ)
+    env.update({
+        'ENVIRONMENT': 'DEV',
+        'SQLALCHEMY_DEV_DATABASE_URI': database_uri,
+        'AVAILABILITY_CACHE_SIZE': '0',
+        'ALLOWED_ORIGINS': env.get('ALLOWED_ORIGINS', '*'),
+    })
+    env.setdefault('NUM_OF_DAYS_TO_CHECK_AVAILABILITY', '60')
+    return env
+
+
+def request_paths(num_rooms, count, seed=1):
+    rng = random.Random(seed)
+    today = date.today()
+    paths = []
+    for _ in range(count):
+        room_id = rng.randint(1, num_rooms)
+        day = today + timedelta(days=rng.randint(-180, 30))
+        if rng.random() < 0.5:
+            paths.append(f'/api/rooms/{room_id}/availability?month={day:%Y-%m}')
+        else:
+            paths.append(f'/api/rooms/{room_id}/timeslots?start={day}&end={day + timedelta(days=6)}')
+    return paths
+
+
+async def wait_until_up(client, url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            await client.get(url)
+            return
+        except Exception:
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f'{url} did not come up')
+
+
+async def load(base_url, paths, concurrency):
+    import httpx
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        await wait_until_up(client, '/api/rooms/1/availability')
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        errors = 0
+
+        async def one(path):
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(path)
+                latencies.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(path) for path in paths))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'rps': len(paths) / elapsed,
+        'p50': statistics.median(latencies),
+        'p95': latencies[int(len(latencies) * 0.95) - 1],
+        'p99': latencies[int(len(latencies) * 0.99) - 1],
+        'errors': errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-uri', help='defaults to a throwaway SQLite file')
+    parser.add_argument('--rooms', type=int, default=10)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=8, help='threads of the sync gunicorn worker')
+    parser.add_argument('--port', type=int, default=8701, help='the sync server, the async one gets port + 1')
+    args = parser.parse_args()
+
+    database_uri = args.database_uri
+    if not database_uri:
+        database_uri = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_async.db')
+    env = server_env(database_uri)
+    os.environ.update(env)
+
+    from ..app import app
+    from ..app_files.models import db
+    from .seed import seed_database
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed_database(db.session, num_rooms=args.rooms, num_customers=2000, days_of_history=180)
+
+    servers = {
+        'sync (gunicorn gthread)': [sys.executable, '-m', 'gunicorn', 'backend.app:app', '--workers', '1',
+                                    '--threads', str(args.threads), '--bind', f'127.0.0.1:{args.port}'],
+        'async (uvicorn)': [sys.executable, '-m', 'uvicorn', 'backend.asgi:app', '--workers', '1',
+                            '--port', str(args.port + 1), '--log-level', 'warning'],
+    }
+    paths = request_paths(args.rooms, args.requests)
+
+    print(f"{args.requests} requests, {args.concurrency} in flight\n")
+    print(f"{'server':<26}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for port_offset, (name, command) in enumerate(servers.items()):
+        server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            result = asyncio.run(load(f'http://127.0.0.1:{args.port + port_offset}', paths, args.concurrency))
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{name:<26}{result['rps']:>10.1f}{result['p50']:>10.1f}{result['p95']:>10.1f}"
+              f"{result['p99']:>10.1f}{result['errors']:>8}")
+
+    with app.app_context():
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
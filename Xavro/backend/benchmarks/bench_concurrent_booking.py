@@ -0,0 +1,86 @@
+"""load test for POST /api/bookings
+
+fires many concurrent requests at the same timeslot and checks exactly one of them wins while
+the rest get a 409, then measures throughput for concurrent bookings of different timeslots.
+
+run from the Xavro directory:
+
+    python -m backend.benchmarks.bench_concurrent_booking
+    python -m backend.benchmarks.bench_concurrent_booking --database-uri postgresql://localhost/xavro_bench
+
+the database is dropped and re-seeded, never point this at a real database"""
+import argparse
+import os
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+
+def post_booking(app, room_id, show_date, show_timeslot, order_id):
+    with app.test_client() as client:
+        response = client.post('/api/bookings', json={
+            'room_id': room_id,
+            'customer_id': 1,
+            'guest_count': 4,
+            'order_id': order_id,
+            'booking_date': date.today().strftime('%Y-%m-%d'),
+            'show_date': show_date.strftime('%Y-%m-%d'),
+            'show_timeslot': show_timeslot
+        })
+        return response.status_code
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-uri', help='defaults to a throwaway SQLite file')
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=2000, help='bookings for the throughput run')
+    args = parser.parse_args()
+
+    database_uri = args.database_uri
+    if not database_uri:
+        database_uri = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_booking.db')
+    os.environ['ENVIRONMENT'] = 'DEV'
+    os.environ['SQLALCHEMY_DEV_DATABASE_URI'] = database_uri
+    os.environ.setdefault('NUM_OF_DAYS_TO_CHECK_AVAILABILITY', '60')
+
+    from ..app import app
+    from ..app_files.models import db
+    from .seed import seed_database
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed_database(db.session, num_rooms=10, num_customers=100, days_of_history=0, occupancy=0)
+
+    show_date = date.today() + timedelta(days=400)  # well past anything the seed booked
+
+    # everybody goes for the same slot
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        statuses = Counter(pool.map(
+            lambda n: post_booking(app, 1, show_date, 1, f'RACE-{n}'), range(args.workers * 4)
+        ))
+    print(f'same timeslot, {args.workers * 4} requests: {dict(statuses)}')
+    if statuses[201] != 1 or statuses[201] + statuses[409] != sum(statuses.values()):
+        raise SystemExit('expected exactly one 201 and 409 for everything else')
+
+    # distinct slots, this is the throughput that matters at release time
+    slots = [(room_id, show_date + timedelta(days=day), timeslot)
+             for day in range(1, 1000) for room_id in range(1, 11) for timeslot in range(1, 9)][:args.requests]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        statuses = Counter(pool.map(
+            lambda slot: post_booking(app, slot[0], slot[1], slot[2], f'LOAD-{slot}'), slots
+        ))
+    elapsed = time.perf_counter() - started
+    print(f'distinct timeslots, {len(slots)} requests: {dict(statuses)} '
+          f'in {elapsed:.2f}s ({len(slots) / elapsed:.0f} bookings/s)')
+
+    with app.app_context():
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""time the booking hot path queries with and without the secondary indexes
+
+run from the Xavro directory:
+
+    python -m backend.benchmarks.bench_indexes
+    python -m backend.benchmarks.bench_indexes --database-uri postgresql://localhost/xavro_bench
+
+the database is dropped and re-seeded, never point this at a real database"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import Session
+
+from ..app_files.models import Booking, Customer, Showtime, db
+from .seed import seed_database
+
+HOT_PATH_INDEXES = {
+    'uq_bookings_room_id_show_date_show_timeslot',
+    'uq_customers_email_key',
+    'ix_showtimes_room_id_day_of_week',
+}
+
+
+def hot_path_queries(num_rooms, num_customers, rng):
+    """the lookups done by the availability, timeslot and booking modal code paths"""
+    today = date.today()
+
+    def availability_month():
+        start_date = today + timedelta(days=rng.randint(-300, 0))
+        return select(Booking.show_date, Booking.show_timeslot).where(
+            Booking.room_id == rng.randint(1, num_rooms),
+            Booking.show_date >= start_date,
+            Booking.show_date <= start_date + timedelta(days=31)
+        )
+
+    def timeslots_day():
+        return select(Booking.show_timeslot).where(
+            Booking.room_id == rng.randint(1, num_rooms),
+            Booking.show_date == today + timedelta(days=rng.randint(-300, 30))
+        )
+
+    def showtimes_day():
+        return select(Showtime).where(
+            Showtime.room_id == rng.randint(1, num_rooms),
+            Showtime.day_of_week == rng.randint(0, 6)
+        )
+
+    def customer_by_email():
+        return select(Customer).where(Customer.email_key == f'customer{rng.randint(1, num_customers)}@example.com')
+
+    return {
+        'availability (room, month of bookings)': availability_month,
+        'timeslots (room, single date)': timeslots_day,
+        'showtimes (room, day_of_week)': showtimes_day,
+        'customer by email': customer_by_email,
+    }
+
+
+def time_queries(engine, queries, iterations):
+    results = {}
+    with Session(engine) as session:
+        for name, build_query in queries.items():
+            timings = []
+            for _ in range(iterations):
+                query = build_query()
+                started = time.perf_counter()
+                session.execute(query).all()
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = statistics.median(timings)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-uri', help='defaults to a throwaway SQLite file')
+    parser.add_argument('--rooms', type=int, default=10)
+    parser.add_argument('--customers', type=int, default=20000)
+    parser.add_argument('--days', type=int, default=730, help='days of booking history')
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    database_uri = args.database_uri
+    if not database_uri:
+        database_uri = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_indexes.db')
+    engine = create_engine(database_uri)
+
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+    indexes = [index for table in db.metadata.sorted_tables for index in table.indexes
+               if index.name in HOT_PATH_INDEXES]
+    for index in indexes:
+        index.drop(engine)
+
+    with Session(engine) as session:
+        counts = seed_database(session, num_rooms=args.rooms, num_customers=args.customers,
+                               days_of_history=args.days)
+    print('seeded ' + ', '.join(f'{count} {table}' for table, count in counts.items()))
+
+    with engine.begin() as connection:
+        connection.execute(text('ANALYZE'))
+    before = time_queries(engine, hot_path_queries(args.rooms, args.customers, random.Random(1)), args.iterations)
+
+    for index in indexes:
+        index.create(engine)
+    with engine.begin() as connection:
+        connection.execute(text('ANALYZE'))
+    after = time_queries(engine, hot_path_queries(args.rooms, args.customers, random.Random(1)), args.iterations)
+
+    print(f"\n{'query':<42}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for name in before:
+        print(f"{name:<42}{before[name]:>12.3f}{after[name]:>12.3f}{before[name] / after[name]:>9.1f}x")
+
+    db.metadata.drop_all(engine)
+
+
+if __name__ == '__main__':
+    main()
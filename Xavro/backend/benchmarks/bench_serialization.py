@@ -0,0 +1,130 @@
+"""compare the old way the list routes built their responses (hydrate ORM objects, build dicts
+by hand, stdlib json) with the serializer projections (column rows, orjson).
+
+times are split into fetching the rows, turning them into dicts and encoding the JSON, and the
+whole endpoint is timed through the test client as well.  run from the Xavro directory:
+
+    python -m backend.benchmarks.bench_serialization
+
+the database is dropped and re-seeded, never point this at a real database"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+
+def timed(function, iterations):
+    timings = []
+    result = None
+    for _ in range(iterations):
+        started = time.perf_counter()
+        result = function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-uri', help='defaults to a throwaway SQLite file')
+    parser.add_argument('--limit', type=int, default=1000, help='rows per list page')
+    parser.add_argument('--iterations', type=int, default=30)
+    args = parser.parse_args()
+
+    database_uri = args.database_uri
+    if not database_uri:
+        database_uri = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_serialization.db')
+    os.environ['ENVIRONMENT'] = 'DEV'
+    os.environ['SQLALCHEMY_DEV_DATABASE_URI'] = database_uri
+    os.environ.setdefault('NUM_OF_DAYS_TO_CHECK_AVAILABILITY', '60')
+
+    from ..app import app
+    from ..app_files.models import db, Booking, Customer, Showtime
+    from ..app_files.serializers import BOOKING, CUSTOMER, SHOWTIME
+    from .seed import seed_database
+
+    app.config['PAGE_SIZE_MAX'] = max(app.config['PAGE_SIZE_MAX'], args.limit)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed_database(db.session, num_rooms=10, num_customers=5000, days_of_history=120, slots_per_day=12)
+
+    def legacy_booking(booking):
+        return {
+            'id': booking.id,
+            'room_id': booking.room_id,
+            'customer_id': booking.customer_id,
+            'guest_count': booking.guest_count,
+            'order_id': booking.order_id,
+            'booking_date': booking.booking_date.strftime('%Y-%m-%d'),
+            'show_date': booking.show_date.strftime('%Y-%m-%d'),
+            'show_timeslot': booking.show_timeslot
+        }
+
+    def legacy_customer(customer):
+        return {
+            'id': customer.id,
+            'first_name': customer.first_name,
+            'last_name': customer.last_name,
+            'email': customer.email,
+            'is_minor': customer.is_minor,
+            'is_banned': customer.is_banned,
+            'customer_notes': customer.customer_notes
+        }
+
+    def legacy_showtime(showtime):
+        return {
+            'id': showtime.id,
+            'room_id': showtime.room_id,
+            'start_time': showtime.start_time.strftime("%H:%M:%S"),
+            'end_time': showtime.end_time.strftime("%H:%M:%S"),
+            'day_of_week': showtime.day_of_week,
+            'timeslot': showtime.timeslot
+        }
+
+    cases = [
+        ('/api/bookings', Booking, BOOKING, legacy_booking, f'/api/bookings?limit={args.limit}'),
+        ('/api/customers', Customer, CUSTOMER, legacy_customer, f'/api/customers?limit={args.limit}'),
+        ('/api/rooms/<id>/showtimes', Showtime, SHOWTIME, legacy_showtime, '/api/rooms/1/showtimes'),
+    ]
+
+    print(f"{'endpoint':<28}{'path':<12}{'fetch ms':>10}{'dicts ms':>10}{'encode ms':>11}{'total ms':>10}")
+    with app.app_context():
+        for name, model, projection, legacy, url in cases:
+            criteria = [model.room_id == 1] if model is Showtime else []
+            limit = None if model is Showtime else args.limit
+
+            def fetch_orm():
+                db.session.expunge_all()
+                query = model.query.filter(*criteria).order_by(model.id)
+                return (query.limit(limit) if limit else query).all()
+
+            def fetch_rows():
+                statement = projection.select().where(*criteria).order_by(model.id)
+                return db.session.execute(statement.limit(limit) if limit else statement).all()
+
+            fetch_ms, objects = timed(fetch_orm, args.iterations)
+            dicts_ms, items = timed(lambda: [legacy(obj) for obj in objects], args.iterations)
+            encode_ms, _ = timed(lambda: json.dumps(items, sort_keys=True, separators=(',', ':')), args.iterations)
+            print(f"{name:<28}{'orm':<12}{fetch_ms:>10.2f}{dicts_ms:>10.2f}{encode_ms:>11.2f}"
+                  f"{fetch_ms + dicts_ms + encode_ms:>10.2f}")
+
+            fetch_ms, rows = timed(fetch_rows, args.iterations)
+            dicts_ms, items = timed(lambda: projection.serialize_all(rows), args.iterations)
+            encode_ms, _ = timed(lambda: app.json.dumps(items), args.iterations)
+            print(f"{'':<28}{'projection':<12}{fetch_ms:>10.2f}{dicts_ms:>10.2f}{encode_ms:>11.2f}"
+                  f"{fetch_ms + dicts_ms + encode_ms:>10.2f}")
+
+    print(f"\n{'endpoint (test client)':<40}{'ms/request':>12}")
+    client = app.test_client()
+    for name, _, _, _, url in cases:
+        request_ms, _ = timed(lambda: client.get(url), args.iterations)
+        print(f"{url:<40}{request_ms:>12.2f}")
+
+    with app.app_context():
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
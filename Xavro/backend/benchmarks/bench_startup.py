@@ -0,0 +1,85 @@
+"""how long a fresh worker takes to import backend.app and build the app, the part of a gunicorn
+restart or a Render cold start that is ours.
+
+every run is a new interpreter.  the import is timed --runs times, then one more run under
+python -X importtime shows which packages the time goes to.  run from the Xavro directory:
+
+    python -m backend.benchmarks.bench_startup
+    python -m backend.benchmarks.bench_startup --runs 20 --top 25
+
+nothing is written to the database, creating the app no longer touches it"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+TIMED_IMPORT = """
+import time
+started = time.perf_counter()
+import backend.app
+print(time.perf_counter() - started)
+"""
+
+
+def startup_env():
+    env = dict(os.environ)
+    env.update({
+        'ENVIRONMENT': 'DEV',
+        'SQLALCHEMY_DEV_DATABASE_URI': 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'bench_startup.db'),
+    })
+    env.setdefault('ALLOWED_ORIGINS', '*')
+    return env
+
+
+def time_startup(env):
+    result = subprocess.run([sys.executable, '-c', TIMED_IMPORT], env=env, capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def import_times(env):
+    """[(module, self microseconds, cumulative microseconds, depth)] from -X importtime"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import backend.app'], env=env,
+                            capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=15, help='how many packages to list')
+    args = parser.parse_args()
+
+    env = startup_env()
+    time_startup(env)  # the first run writes the .pyc files
+    timings = sorted(time_startup(env) * 1000 for _ in range(args.runs))
+    print(f"import backend.app + create_app over {args.runs} runs: "
+          f"min {timings[0]:.0f} ms, median {statistics.median(timings):.0f} ms, max {timings[-1]:.0f} ms\n")
+
+    modules = import_times(env)
+    by_package = defaultdict(int)
+    for name, self_us, _, _ in modules:
+        by_package[name.split('.')[0]] += self_us
+    total = sum(by_package.values())
+    print(f"{'package':<30}{'ms':>10}{'share':>8}")
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{package:<30}{self_us / 1000:>10.1f}{self_us / total:>8.0%}")
+
+    # our own modules with everything they pulled in
+    print(f"\n{'backend module (cumulative)':<50}{'ms':>10}")
+    for name, _, cumulative_us, _ in sorted(modules, key=lambda module: -module[2]):
+        if name.startswith('backend'):
+            print(f"{name:<50}{cumulative_us / 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""a repeatable fake data set for the benchmarks and the benchmark tests.
+
+the generate_* functions yield plain row dicts so any size can be inserted in batches without
+holding it all in memory.  can also be run on its own to fill a database, from the Xavro
+directory:
+
+    python -m backend.benchmarks.seed --database-uri sqlite:////tmp/xavro_seed.db --rooms 20 --years 3
+
+the tables are dropped and re-created first, never point this at a real database"""
+import argparse
+import random
+from datetime import date, time, timedelta
+from itertools import islice
+
+from sqlalchemy import insert
+
+from ..app_files.models import Booking, Customer, Room, Showtime
+
+INSERT_BATCH_SIZE = 10000
+FUTURE_DAYS = 60  # bookings are also made this far ahead of today
+
+
+def generate_rooms(num_rooms):
+    for room_id in range(1, num_rooms + 1):
+        yield {
+            'id': room_id,
+            'title': f'Room {room_id}',
+            'max_capacity': 8,
+            'min_capacity': 2,
+            'duration': 60,
+            'reset_buffer': 15,
+            'description': None
+        }
+
+
+def generate_showtimes(num_rooms, slots_per_day):
+    """a full weekly grid for every room, slot n starts at 9 + n o'clock"""
+    for room_id in range(1, num_rooms + 1):
+        for day_of_week in range(7):
+            for timeslot in range(1, slots_per_day + 1):
+                start_hour = 9 + timeslot
+                yield {
+                    'room_id': room_id,
+                    'day_of_week': day_of_week,
+                    'start_time': time(start_hour % 24, 0),
+                    'end_time': time((start_hour + 1) % 24, 0),
+                    'timeslot': timeslot
+                }
+
+
+def generate_customers(num_customers):
+    for customer_id in range(1, num_customers + 1):
+        yield {
+            'id': customer_id,
+            'first_name': f'First{customer_id}',
+            'last_name': f'Last{customer_id}',
+            'email': f'customer{customer_id}@example.com',
+            'email_key': f'customer{customer_id}@example.com',
+            'is_minor': False,
+            'is_banned': False,
+            'customer_notes': None
+        }
+
+
+def generate_bookings(rng, num_rooms, num_customers, days_of_history, slots_per_day, occupancy):
+    """roughly `occupancy` of every room's timeslots from `days_of_history` days ago to
+    FUTURE_DAYS from now, booked by random customers"""
+    first_day = date.today() - timedelta(days=days_of_history)
+    booking_number = 0
+    for offset in range(days_of_history + FUTURE_DAYS):
+        show_date = first_day + timedelta(days=offset)
+        for room_id in range(1, num_rooms + 1):
+            for timeslot in range(1, slots_per_day + 1):
+                if rng.random() >= occupancy:
+                    continue
+                booking_number += 1
+                yield {
+                    'room_id': room_id,
+                    'customer_id': rng.randint(1, num_customers),
+                    'guest_count': rng.randint(2, 8),
+                    'order_id': f'ORD-{booking_number:08d}',
+                    'booking_date': show_date - timedelta(days=rng.randint(0, 30)),
+                    'show_date': show_date,
+                    'show_timeslot': timeslot
+                }
+
+
+def _insert_all(session, model, rows):
+    inserted = 0
+    while True:
+        batch = list(islice(rows, INSERT_BATCH_SIZE))
+        if not batch:
+            return inserted
+        session.execute(insert(model), batch)
+        inserted += len(batch)
+
+
+def seed_database(session, num_rooms=10, num_customers=5000, days_of_history=365, slots_per_day=8,
+                  occupancy=0.6, seed=42):
+    """fill an empty database with the fake data set, the same `seed` always gives the same
+    rows.  returns the number of rows created per table"""
+    rng = random.Random(seed)
+    counts = {
+        'rooms': _insert_all(session, Room, generate_rooms(num_rooms)),
+        'showtimes': _insert_all(session, Showtime, generate_showtimes(num_rooms, slots_per_day)),
+        'customers': _insert_all(session, Customer, generate_customers(num_customers)),
+        'bookings': _insert_all(session, Booking, generate_bookings(rng, num_rooms, num_customers, days_of_history,
+                                                                    slots_per_day, occupancy)),
+    }
+    session.commit()
+    return counts
+
+
+def main():
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    from ..app_files.models import db
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-uri', required=True)
+    parser.add_argument('--rooms', type=int, default=10)
+    parser.add_argument('--customers', type=int, default=5000)
+    parser.add_argument('--years', type=float, default=1, help='years of booking history')
+    parser.add_argument('--slots-per-day', type=int, default=8)
+    parser.add_argument('--occupancy', type=float, default=0.6)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_uri)
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+    with Session(engine) as session:
+        counts = seed_database(session, num_rooms=args.rooms, num_customers=args.customers,
+                               days_of_history=int(args.years * 365), slots_per_day=args.slots_per_day,
+                               occupancy=args.occupancy, seed=args.seed)
+    print('seeded ' + ', '.join(f'{count} {table}' for table, count in counts.items()))
+
+
+if __name__ == '__main__':
+    main()
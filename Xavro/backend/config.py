@@ -1,9 +1,45 @@
 from dotenv import load_dotenv
+from sqlalchemy.engine import make_url
 import os
 
-# Load environment variables from .env file
+# Load environment variables from .env file, the only place it's read
 load_dotenv()
 
+# calendar requests without a date range get today + this many days
+NUM_OF_DAYS_TO_CHECK = int(os.environ.get('NUM_OF_DAYS_TO_CHECK_AVAILABILITY', 60))
+
+
+def _env_flag(name, default):
+    return os.environ.get(name, str(default)).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def engine_options(database_uri):
+    """SQLALCHEMY_ENGINE_OPTIONS for a database.
+
+    every gunicorn worker gets its own pool, so workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) has
+    to stay under postgres' max_connections.  in-memory sqlite runs on a single shared
+    connection (StaticPool) which doesn't take the queue pool sizes"""
+    options = {
+        'pool_pre_ping': _env_flag('DB_POOL_PRE_PING', True),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),  # seconds, -1 to never recycle
+    }
+    if database_uri:
+        url = make_url(database_uri)
+        if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+            return options
+    options.update({
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),  # seconds to wait for a connection
+    })
+    return options
+
+
+def replica_binds(replica_uris):
+    """SQLALCHEMY_BINDS for a comma separated list of read replica uris (replica_0, replica_1, ...)"""
+    uris = [uri.strip() for uri in (replica_uris or '').split(',') if uri.strip()]
+    return {f'replica_{number}': dict(engine_options(uri), url=uri) for number, uri in enumerate(uris)}
+
 
 class BaseConfig:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
@@ -11,17 +47,97 @@ class BaseConfig:
     SQLALCHEMY_ECHO = False
     DEBUG_TB_INTERCEPT_REDIRECTS = False
 
+    # availability / timeslot response cache, set the size to 0 to turn it off
+    AVAILABILITY_CACHE_SIZE = int(os.environ.get('AVAILABILITY_CACHE_SIZE', 1024))
+    AVAILABILITY_CACHE_TTL = int(os.environ.get('AVAILABILITY_CACHE_TTL', 60))  # seconds
+
+    # how far ahead `flask availability rebuild` fills the room_day_availability table (days)
+    AVAILABILITY_TABLE_DAYS = int(os.environ.get('AVAILABILITY_TABLE_DAYS', 365))
+
+    # customer by email lookups from the booking modal
+    CUSTOMER_CACHE_SIZE = int(os.environ.get('CUSTOMER_CACHE_SIZE', 4096))
+    CUSTOMER_CACHE_TTL = int(os.environ.get('CUSTOMER_CACHE_TTL', 30))  # seconds
+
+    # compiled room prices for /api/quotes are rebuilt after this long (seconds) even without a
+    # write, so cost changes made through another worker show up
+    PRICING_CACHE_TTL = int(os.environ.get('PRICING_CACHE_TTL', 60))
+
+    # ETags on the reference-data endpoints also roll over this often (seconds), which bounds how
+    # long a worker that didn't see another worker's write can keep answering 304
+    ETAG_MAX_AGE = int(os.environ.get('ETAG_MAX_AGE', 60))
+
+    # read replicas (SQLALCHEMY_*_REPLICA_URIS), @read_only handlers read from one unless the
+    # client committed a write in the last READ_AFTER_WRITE_WINDOW seconds, the replica failed
+    # in the last REPLICA_RETRY_AFTER seconds or (postgres) it is more than REPLICA_MAX_LAG behind
+    READ_AFTER_WRITE_WINDOW = float(os.environ.get('READ_AFTER_WRITE_WINDOW', 5))
+    REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', 5))
+    REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get('REPLICA_LAG_CHECK_INTERVAL', 5))
+    REPLICA_RETRY_AFTER = float(os.environ.get('REPLICA_RETRY_AFTER', 30))
+
+    # prometheus metrics on /metrics, a 404 unless METRICS_TOKEN is set.  the scraper sends it
+    # as Authorization: Bearer <token>
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # slow query log, off unless SLOW_QUERY_THRESHOLD_MS is set.  statements slower than that are
+    # written as JSON lines to SLOW_QUERY_LOG_FILE (one file for every worker, rotate it with
+    # logrotate like LOG_FILE) and SLOW_QUERY_EXPLAIN_RATE of the slow selects also get an
+    # EXPLAIN, which on postgres is ANALYZE and runs the query a second time
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 0))
+    SLOW_QUERY_EXPLAIN_RATE = float(os.environ.get('SLOW_QUERY_EXPLAIN_RATE', 0.1))
+    SLOW_QUERY_LOG_FILE = os.environ.get('SLOW_QUERY_LOG_FILE', 'slow_queries.log')
+
+    # JSON log lines go to stdout (and LOG_FILE if set) from a background thread, a request only
+    # puts them on a queue of LOG_QUEUE_SIZE records and they're dropped (and counted) when it's full
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    LOG_FILE = os.environ.get('LOG_FILE')
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+
+    # POST /api/holds keeps a timeslot for HOLD_MINUTES unless the request asks for another
+    # length, up to HOLD_MAX_MINUTES
+    HOLD_MINUTES = int(os.environ.get('HOLD_MINUTES', 10))
+    HOLD_MAX_MINUTES = int(os.environ.get('HOLD_MAX_MINUTES', 30))
+
+    # /api/events (server-sent slot-taken / slot-freed events).  the last EVENTS_HISTORY events are
+    # kept for Last-Event-ID resume and idle streams get a keepalive every EVENTS_KEEPALIVE
+    # seconds.  EVENTS_BACKEND=postgres sends them through LISTEN/NOTIFY on EVENTS_CHANNEL so
+    # every worker sees every booking, the default 'local' only reaches this worker's streams
+    EVENTS_BACKEND = os.environ.get('EVENTS_BACKEND', 'local')
+    EVENTS_CHANNEL = os.environ.get('EVENTS_CHANNEL', 'xavro_events')
+    EVENTS_HISTORY = int(os.environ.get('EVENTS_HISTORY', 1000))
+    EVENTS_KEEPALIVE = float(os.environ.get('EVENTS_KEEPALIVE', 15))
+
+    # keyset pagination for the list endpoints
+    PAGE_SIZE_DEFAULT = int(os.environ.get('PAGE_SIZE_DEFAULT', 100))
+    PAGE_SIZE_MAX = int(os.environ.get('PAGE_SIZE_MAX', 1000))
+
 
 class DevelopmentConfig(BaseConfig):
     SQLALCHEMY_DATABASE_URI = os.environ.get('SQLALCHEMY_DEV_DATABASE_URI')
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_BINDS = replica_binds(os.environ.get('SQLALCHEMY_DEV_REPLICA_URIS'))
     SECRET_KEY = os.environ.get('DEV_SECRET_KEY')
     REACT_SERVER_BASE_URL = os.environ.get('DEV_BASE_REACT_URL')
 
 
 class ProductionConfig(BaseConfig):
     SQLALCHEMY_DATABASE_URI = os.environ.get('SQLALCHEMY_PROD_DATABASE_URI')
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_BINDS = replica_binds(os.environ.get('SQLALCHEMY_PROD_REPLICA_URIS'))
     SECRET_KEY = os.environ.get('PROD_SECRET_KEY')
     REACT_SERVER_BASE_URL = os.environ.get('PROD_BASE_REACT_URL')
 
 
+class TestingConfig(BaseConfig):
+    """the benchmark tests, an in-memory SQLite database unless SQLALCHEMY_TEST_DATABASE_URI
+    points somewhere else (a local postgres to get numbers that mean something)"""
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = os.environ.get('SQLALCHEMY_TEST_DATABASE_URI', 'sqlite://')
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    SECRET_KEY = 'testing'
+
+    # measure the queries, not the caches in front of them
+    AVAILABILITY_CACHE_SIZE = 0
+    CUSTOMER_CACHE_SIZE = 0
+
+
 CURR_USER_KEY = "initialize_me"
@@ -0,0 +1,82 @@
+"""customers normalized email key
+
+Revision ID: c2df97ac2ce1
+Revises: 7f2a91c4d8e3
+Create Date: 2026-10-18 06:48:53.302373
+
+"""
+from collections import defaultdict
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2df97ac2ce1'
+down_revision = '7f2a91c4d8e3'
+branch_labels = None
+depends_on = None
+
+
+customers = sa.table(
+    'customers',
+    sa.column('id', sa.Integer),
+    sa.column('email', sa.String),
+    sa.column('email_key', sa.String)
+)
+bookings = sa.table(
+    'bookings',
+    sa.column('customer_id', sa.Integer)
+)
+customers_waivers = sa.table(
+    'customers_waivers',
+    sa.column('customer_id', sa.Integer)
+)
+
+
+def _normalize_email(email):
+    # same as app_files.utils.normalize_email, copied so this revision never changes under us
+    return email.strip().lower() if email else email
+
+
+def upgrade():
+    with op.batch_alter_table('customers', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('email_key', sa.String(length=256), nullable=True))
+
+    # backfill the key and merge customers that only differed by case or whitespace, the
+    # lowest id wins and gets the duplicates' bookings and signed waivers (both cascade on
+    # delete).  `flask customers dedupe` does the same thing on a live database
+    connection = op.get_bind()
+    customer_ids_by_key = defaultdict(list)
+    rows = connection.execute(sa.select(customers.c.id, customers.c.email).order_by(customers.c.id))
+    for customer_id, email in rows:
+        customer_ids_by_key[_normalize_email(email)].append(customer_id)
+
+    for key, customer_ids in customer_ids_by_key.items():
+        keep_id, duplicate_ids = customer_ids[0], customer_ids[1:]
+        if duplicate_ids:
+            connection.execute(
+                bookings.update().where(bookings.c.customer_id.in_(duplicate_ids)).values(customer_id=keep_id)
+            )
+            connection.execute(
+                customers_waivers.update().where(customers_waivers.c.customer_id.in_(duplicate_ids))
+                .values(customer_id=keep_id)
+            )
+            connection.execute(customers.delete().where(customers.c.id.in_(duplicate_ids)))
+        connection.execute(customers.update().where(customers.c.id == keep_id).values(email_key=key))
+
+    with op.batch_alter_table('customers', schema=None) as batch_op:
+        batch_op.alter_column('email_key', existing_type=sa.String(length=256), nullable=False)
+        batch_op.drop_index('ix_customers_email')
+        batch_op.create_index('uq_customers_email_key', ['email_key'], unique=True)
+
+
+def downgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('customers', schema=None) as batch_op:
+        batch_op.drop_index('uq_customers_email_key')
+        batch_op.create_index('ix_customers_email', ['email'], unique=False)
+        batch_op.drop_column('email_key')
+
+    # ### end Alembic commands ###
+    # merged customers stay merged
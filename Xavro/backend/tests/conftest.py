@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+# backend.app builds an app from the environment when it's imported, point it at the test
+# database before anything imports it
+os.environ.setdefault('ENVIRONMENT', 'DEV')
+os.environ.setdefault('SQLALCHEMY_DEV_DATABASE_URI', os.environ.get('SQLALCHEMY_TEST_DATABASE_URI', 'sqlite://'))
+os.environ.setdefault('NUM_OF_DAYS_TO_CHECK_AVAILABILITY', '60')
+
+from backend.app import create_app  # noqa: E402
+from backend.app_files.models import db  # noqa: E402
+from backend.benchmarks.seed import seed_database  # noqa: E402
+from backend.config import TestingConfig  # noqa: E402
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('xavro', 'size of the seeded benchmark data set')
+    group.addoption('--seed-rooms', type=int, default=10)
+    group.addoption('--seed-customers', type=int, default=5000)
+    group.addoption('--seed-days', type=int, default=365, help='days of booking history')
+    group.addoption('--seed-slots', type=int, default=8, help='timeslots per room per day')
+
+
+@pytest.fixture(scope='session')
+def seed_size(pytestconfig):
+    return {
+        'num_rooms': pytestconfig.getoption('--seed-rooms'),
+        'num_customers': pytestconfig.getoption('--seed-customers'),
+        'days_of_history': pytestconfig.getoption('--seed-days'),
+        'slots_per_day': pytestconfig.getoption('--seed-slots'),
+    }
+
+
+@pytest.fixture(scope='session')
+def app(seed_size):
+    """one app and one seeded database for the whole run"""
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed_database(db.session, **seed_size)
+        db.session.remove()
+
+    yield app
+
+    with app.app_context():
+        db.drop_all()
+
+
+@pytest.fixture
+def app_context(app):
+    with app.app_context():
+        yield
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,16 @@
+import pytest
+
+from backend.app_files.async_app import CalendarApp
+
+CORS_HEADERS = ('access-control-allow-origin', 'vary')
+
+
+@pytest.mark.parametrize('origin', [None, 'http://localhost:5173', 'https://somewhere.else'])
+def test_cors_headers_match_flask_cors(client, origin):
+    request_headers = {'origin': origin} if origin else {}
+    flask_headers = client.get('/api/rooms/1/availability', headers=request_headers).headers
+
+    asgi_headers = dict(CalendarApp.base_headers(request_headers, 'request-id'))
+    for name in CORS_HEADERS:
+        value = asgi_headers.get(name.encode())
+        assert (value.decode() if value else None) == flask_headers.get(name)
@@ -0,0 +1,22 @@
+import asyncio
+
+import pytest
+
+from backend.app_files.events import SLOT_TAKEN, event_broker
+
+
+@pytest.mark.parametrize('subscribers', [100, 1000])
+def test_publish_to_idle_subscribers(benchmark, subscribers):
+    # one booking event reaching every idle /api/events stream of an asyncio worker
+    payload = {'type': SLOT_TAKEN, 'room_id': 1, 'date': '2026-01-01', 'timeslot': 1}
+
+    async def fan_out():
+        cursor, _ = event_broker.subscribe()
+        waiting = [asyncio.ensure_future(event_broker.wait_async(cursor, 5)) for _ in range(subscribers)]
+        await asyncio.sleep(0)  # let every subscriber park on the loop's future
+        event_broker.publish(payload)
+        return await asyncio.gather(*waiting)
+
+    results = benchmark(lambda: asyncio.run(fan_out()))
+    assert len(results) == subscribers
+    assert all(events[-1]['type'] == SLOT_TAKEN for _, events in results)
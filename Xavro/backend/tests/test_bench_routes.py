@@ -0,0 +1,76 @@
+"""the list routes and add_booking end to end through the test client"""
+from datetime import date, timedelta
+from itertools import count
+
+import pytest
+
+from backend.benchmarks.seed import FUTURE_DAYS
+
+
+@pytest.mark.parametrize('url', [
+    '/api/bookings?limit=100',
+    '/api/bookings?limit=1000',
+    '/api/customers?limit=100',
+    '/api/customers?limit=1000',
+    '/api/rooms/',
+    '/api/rooms/1/showtimes',
+    '/api/rooms/1/costs',
+])
+def test_list_route(benchmark, client, url):
+    response = benchmark(client.get, url)
+    assert response.status_code == 200
+
+
+def test_customer_lookup_by_email(benchmark, client):
+    response = benchmark(client.get, '/api/customers?email=Customer42@Example.com')
+    assert response.status_code == 200
+
+
+def test_add_booking(benchmark, client, seed_size):
+    # every round books a timeslot nobody has, past the seeded bookings
+    first_free_day = date.today() + timedelta(days=FUTURE_DAYS + 1)
+    slots_per_day = seed_size['slots_per_day']
+    bookings = count()
+
+    def add_booking():
+        number = next(bookings)
+        show_date = first_free_day + timedelta(days=number // slots_per_day)
+        return client.post('/api/bookings', json={
+            'room_id': 1,
+            'customer_id': 1,
+            'guest_count': 4,
+            'order_id': f'BENCH-{number}',
+            'booking_date': date.today().isoformat(),
+            'show_date': show_date.isoformat(),
+            'show_timeslot': number % slots_per_day + 1
+        })
+
+    response = benchmark(add_booking)
+    assert response.status_code == 201
+
+
+def test_hold_and_convert(benchmark, client, seed_size):
+    # the booking modal's path: hold a free timeslot, then book it.  uses the days after the
+    # ones test_add_booking books
+    first_free_day = date.today() + timedelta(days=FUTURE_DAYS + 1000)
+    slots_per_day = seed_size['slots_per_day']
+    holds = count()
+
+    def hold_and_convert():
+        number = next(holds)
+        show_date = first_free_day + timedelta(days=number // slots_per_day)
+        hold = client.post('/api/holds', json={
+            'room_id': 2,
+            'show_date': show_date.isoformat(),
+            'show_timeslot': number % slots_per_day + 1
+        })
+        assert hold.status_code == 201
+        return client.post(f"/api/holds/{hold.json['token']}/booking", json={
+            'customer_id': 1,
+            'guest_count': 4,
+            'order_id': f'HOLD-{number}',
+            'booking_date': date.today().isoformat()
+        })
+
+    response = benchmark(hold_and_convert)
+    assert response.status_code == 201
@@ -0,0 +1,62 @@
+"""the availability and timeslot services straight against the seeded database"""
+from datetime import date, timedelta
+
+import pytest
+
+from backend.app_files.availability_table import rebuild_room_day_availability
+from backend.app_files.cache import availability_cache
+from backend.app_files.models import RoomDayAvailability, db
+from backend.app_files.services import (get_room_availability_service, get_room_timeslots_range_service,
+                                        get_room_timeslots_service, get_rooms_availability_service)
+
+
+@pytest.mark.parametrize('days', [31, 90])
+def test_room_availability(benchmark, app_context, days):
+    start_date = date.today() - timedelta(days=days)
+    available_dates = benchmark(get_room_availability_service, db.session, 1, start_date,
+                                start_date + timedelta(days=days))
+    assert isinstance(available_dates, list)
+
+
+def test_room_availability_cached(benchmark, app_context):
+    availability_cache.configure(1024, 60)
+    try:
+        available_dates = benchmark(get_room_availability_service, db.session, 1)
+    finally:
+        availability_cache.configure(0, 60)
+    assert isinstance(available_dates, list)
+
+
+def test_rooms_availability_month(benchmark, app_context, seed_size):
+    room_ids = list(range(1, seed_size['num_rooms'] + 1))
+    start_date = date.today().replace(day=1)
+    availability = benchmark(get_rooms_availability_service, db.session, room_ids, start_date,
+                             start_date + timedelta(days=30))
+    assert set(availability) == set(room_ids)
+
+
+def test_rooms_availability_month_summary_table(benchmark, app_context, seed_size):
+    # the same month answered from room_day_availability, it has to agree with the live computation
+    room_ids = list(range(1, seed_size['num_rooms'] + 1))
+    start_date = date.today().replace(day=1)
+    end_date = start_date + timedelta(days=30)
+    live = get_rooms_availability_service(db.session, room_ids, start_date, end_date)
+
+    rebuild_room_day_availability(db.session, start_date, end_date)
+    try:
+        availability = benchmark(get_rooms_availability_service, db.session, room_ids, start_date, end_date)
+    finally:
+        db.session.execute(RoomDayAvailability.__table__.delete())
+        db.session.commit()
+    assert availability == live
+
+
+def test_room_timeslots_single_date(benchmark, app_context, seed_size):
+    timeslots = benchmark(get_room_timeslots_service, db.session, 1, date.today().isoformat())
+    assert len(timeslots) == seed_size['slots_per_day']
+
+
+def test_room_timeslots_week(benchmark, app_context):
+    start_date = date.today()
+    grid = benchmark(get_room_timeslots_range_service, db.session, 1, start_date, start_date + timedelta(days=6))
+    assert len(grid) == 7
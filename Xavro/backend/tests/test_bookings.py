@@ -0,0 +1,30 @@
+from datetime import date, timedelta
+
+from sqlalchemy import delete
+
+from backend.app_files.models import Booking, db
+from backend.benchmarks.seed import FUTURE_DAYS
+
+ROOM_ID = 4
+SHOW_DATE = date.today() + timedelta(days=FUTURE_DAYS + 4000)  # past the seeded bookings
+
+
+def test_update_booking_only_answers_409_for_a_taken_timeslot(app_context, client):
+    booking = {'room_id': ROOM_ID, 'customer_id': 1, 'guest_count': 2, 'order_id': 'PUT-1',
+               'booking_date': date.today().isoformat(), 'show_date': SHOW_DATE.isoformat(),
+               'show_timeslot': 1}
+    try:
+        booking_id = client.post('/api/bookings', json=booking).json['id']
+        assert client.post('/api/bookings', json={**booking, 'show_timeslot': 2}).status_code == 201
+
+        response = client.put(f'/api/bookings/{booking_id}', json={**booking, 'show_timeslot': 2})
+        assert response.status_code == 409
+        # a NOT NULL column or a missing room isn't somebody else's booking
+        for changes, status in [({'guest_count': None}, 400), ({'room_id': 10 ** 6}, 404),
+                                ({'customer_id': 10 ** 6}, 404)]:
+            assert client.put(f'/api/bookings/{booking_id}', json={**booking, **changes}).status_code == status
+        assert db.session.get(Booking, booking_id).show_timeslot == 1
+    finally:
+        db.session.rollback()
+        db.session.execute(delete(Booking).where(Booking.room_id == ROOM_ID, Booking.show_date == SHOW_DATE))
+        db.session.commit()
@@ -0,0 +1,52 @@
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import delete, insert, select
+
+from backend.app_files.commands import merge_duplicate_customers
+from backend.app_files.models import Booking, Customer, CustomerWaiver, Waiver, db
+
+
+def test_merge_duplicate_customers_keeps_bookings_and_waivers(app_context):
+    # two customers whose emails only differ by case and whitespace, the second one written
+    # around the model with a stale key like an old import would
+    keep_id = db.session.execute(insert(Customer).values(
+        last_name='Merge', email='Merge.Me@Example.com', email_key='merge.me@example.com'
+    ).returning(Customer.id)).scalar()
+    duplicate_id = db.session.execute(insert(Customer).values(
+        last_name='Merge', email=' merge.me@example.COM', email_key='stale merge key'
+    ).returning(Customer.id)).scalar()
+    waiver_id = db.session.execute(insert(Waiver).values(start_date=datetime(2026, 1, 1)).returning(Waiver.id)).scalar()
+
+    show_date = date.today() + timedelta(days=5000)
+    booking_ids = []
+    waiver_ids = []
+    for timeslot, customer_id in enumerate((keep_id, duplicate_id, duplicate_id), start=1):
+        booking_ids.append(db.session.execute(insert(Booking).values(
+            room_id=1, customer_id=customer_id, guest_count=2, order_id=f'MERGE-{timeslot}',
+            booking_date=date.today(), show_date=show_date, show_timeslot=timeslot
+        ).returning(Booking.id)).scalar())
+        waiver_ids.append(db.session.execute(insert(CustomerWaiver).values(
+            customer_id=customer_id, waivers_id=waiver_id, sign_date=datetime(2026, 1, 1)
+        ).returning(CustomerWaiver.id)).scalar())
+    db.session.commit()
+
+    try:
+        report = merge_duplicate_customers(db.session)
+
+        assert report['customers_merged'] == 1
+        assert report['bookings_moved'] == 2
+        assert report['waivers_moved'] == 2
+        assert db.session.get(Customer, duplicate_id) is None
+        assert db.session.execute(
+            select(Booking.customer_id).where(Booking.id.in_(booking_ids))
+        ).scalars().all() == [keep_id] * 3
+        assert db.session.execute(
+            select(CustomerWaiver.customer_id).where(CustomerWaiver.id.in_(waiver_ids))
+        ).scalars().all() == [keep_id] * 3
+    finally:
+        db.session.rollback()
+        db.session.execute(delete(CustomerWaiver).where(CustomerWaiver.id.in_(waiver_ids)))
+        db.session.execute(delete(Booking).where(Booking.id.in_(booking_ids)))
+        db.session.execute(delete(Waiver).where(Waiver.id == waiver_id))
+        db.session.execute(delete(Customer).where(Customer.id.in_([keep_id, duplicate_id])))
+        db.session.commit()
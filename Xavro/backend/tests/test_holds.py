@@ -0,0 +1,178 @@
+import threading
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import create_engine, delete, select, update
+from sqlalchemy.orm import Session
+
+from backend.app_files.availability_table import rebuild_room_day_availability
+from backend.app_files.holds import HoldExpiryScheduler, expire_holds, hold_expiry
+from backend.app_files.models import Booking, RoomDayAvailability, Showtime, SlotHold, db
+from backend.app_files.services import (claim_timeslot_service, get_room_availability_service,
+                                        hold_timeslot_service)
+from backend.app_files.utils import utc_now
+from backend.benchmarks.seed import FUTURE_DAYS
+
+ROOM_ID = 3
+
+
+def hold_whole_day(show_date):
+    """hold every timeslot room 3 has on show_date, returns the hold ids"""
+    timeslots = db.session.execute(select(Showtime.timeslot).where(
+        Showtime.room_id == ROOM_ID, Showtime.day_of_week == show_date.weekday()
+    )).scalars().all()
+    assert timeslots
+    hold_ids = [hold_timeslot_service(db.session, ROOM_ID, show_date, timeslot, 10)['id'] for timeslot in timeslots]
+    db.session.commit()
+    return hold_ids
+
+
+def availability(show_date, summary):
+    """the day's availability from the summary table, or worked out live without it"""
+    db.session.execute(delete(RoomDayAvailability).where(RoomDayAvailability.room_id == ROOM_ID))
+    if summary:
+        rebuild_room_day_availability(db.session, show_date, show_date, [ROOM_ID])
+    db.session.commit()
+    return get_room_availability_service(db.session, ROOM_ID, show_date, show_date)
+
+
+def test_expired_hold_frees_the_day_without_the_scheduler(app_context):
+    # far past anything the other tests book
+    show_date = date.today() + timedelta(days=FUTURE_DAYS + 3000)
+    hold_ids = hold_whole_day(show_date)
+    try:
+        assert availability(show_date, summary=True) == []
+        assert availability(show_date, summary=False) == []
+
+        # run out without the scheduler getting to them
+        db.session.execute(update(SlotHold).where(SlotHold.id.in_(hold_ids))
+                           .values(expires_at=utc_now() - timedelta(minutes=1)))
+        db.session.commit()
+        assert availability(show_date, summary=True) == [show_date.strftime('%Y-%m-%d')]
+        assert availability(show_date, summary=False) == [show_date.strftime('%Y-%m-%d')]
+
+        # rebuilding while the holds are live still counts bookings only
+        db.session.execute(update(SlotHold).where(SlotHold.id.in_(hold_ids))
+                           .values(expires_at=utc_now() + timedelta(minutes=10)))
+        db.session.commit()
+        availability(show_date, summary=True)
+        assert db.session.execute(select(RoomDayAvailability.booked_slots).where(
+            RoomDayAvailability.room_id == ROOM_ID, RoomDayAvailability.show_date == show_date
+        )).scalar() == 0
+    finally:
+        db.session.rollback()
+        db.session.execute(delete(SlotHold).where(SlotHold.id.in_(hold_ids)))
+        db.session.execute(delete(RoomDayAvailability).where(RoomDayAvailability.room_id == ROOM_ID))
+        db.session.commit()
+
+
+def test_expire_holds_deletes_only_expired_holds(app_context):
+    show_date = date.today() + timedelta(days=FUTURE_DAYS + 3001)
+    hold_ids = hold_whole_day(show_date)
+    try:
+        expired_id, live_ids = hold_ids[0], hold_ids[1:]
+        db.session.execute(update(SlotHold).where(SlotHold.id == expired_id)
+                           .values(expires_at=utc_now() - timedelta(minutes=1)))
+        db.session.commit()
+
+        assert expire_holds(db.session, hold_ids) == 1
+        assert db.session.execute(
+            select(SlotHold.id).where(SlotHold.id.in_(hold_ids)).order_by(SlotHold.id)
+        ).scalars().all() == sorted(live_ids)
+    finally:
+        db.session.rollback()
+        db.session.execute(delete(SlotHold).where(SlotHold.id.in_(hold_ids)))
+        db.session.commit()
+
+
+def test_scheduler_pops_only_due_holds():
+    scheduler = HoldExpiryScheduler()
+    now = utc_now()
+    scheduler._heap = [(now - timedelta(seconds=2), 1), (now - timedelta(seconds=1), 2),
+                       (now + timedelta(minutes=5), 3)]
+
+    assert scheduler._due() == [1, 2]
+    assert [hold_id for _, hold_id in scheduler._heap] == [3]
+
+
+@pytest.fixture
+def slot_engine(app, tmp_path):
+    """an engine two sessions can interleave on.  the in-memory test database is one shared
+    connection, a sqlite file stands in for it"""
+    with app.app_context():
+        engine = db.engine
+        if engine.url.drivername.startswith('sqlite'):
+            engine = create_engine(f"sqlite:///{tmp_path / 'slots.db'}")
+            db.metadata.create_all(engine)
+    yield engine
+    if engine.url.drivername.startswith('sqlite'):
+        engine.dispose()
+
+
+@pytest.mark.parametrize('first', ['booking', 'hold'])
+def test_booking_and_hold_on_one_slot_never_both_win(slot_engine, monkeypatch, first):
+    monkeypatch.setattr(hold_expiry, 'schedule', lambda *args: None)
+    show_date = date.today() + timedelta(days=FUTURE_DAYS + 3002)
+
+    def book(session):
+        return claim_timeslot_service(session, {
+            'room_id': ROOM_ID, 'customer_id': 1, 'guest_count': 2, 'order_id': 'RACE-1',
+            'booking_date': date.today(), 'show_date': show_date, 'show_timeslot': 1
+        })
+
+    def hold(session):
+        return hold_timeslot_service(session, ROOM_ID, show_date, 1, 10)
+
+    take_first, take_second = (book, hold) if first == 'booking' else (hold, book)
+    second_result = []
+
+    def second():
+        with Session(slot_engine) as session:
+            second_result.append(take_second(session))
+            session.commit()
+
+    try:
+        with Session(slot_engine) as session:
+            assert take_first(session) is not None
+            # the second one starts while the first hasn't committed and has to wait for it
+            thread = threading.Thread(target=second)
+            thread.start()
+            thread.join(0.3)
+            session.commit()
+        thread.join()
+        assert second_result == [None]
+    finally:
+        with Session(slot_engine) as session:
+            session.execute(delete(Booking).where(Booking.room_id == ROOM_ID, Booking.show_date == show_date))
+            session.execute(delete(SlotHold).where(SlotHold.room_id == ROOM_ID, SlotHold.show_date == show_date))
+            session.commit()
+
+
+def test_moves_and_imports_dont_take_a_held_slot(app_context, client, monkeypatch):
+    monkeypatch.setattr(hold_expiry, 'schedule', lambda *args: None)
+    show_date = date.today() + timedelta(days=FUTURE_DAYS + 3003)
+    booking = {'room_id': ROOM_ID, 'customer_id': 1, 'guest_count': 2, 'order_id': 'HELD-1',
+               'booking_date': date.today().isoformat(), 'show_date': show_date.isoformat(),
+               'show_timeslot': 1}
+    try:
+        hold_timeslot_service(db.session, ROOM_ID, show_date, 2, 10)
+        db.session.commit()
+        booking_id = client.post('/api/bookings', json=booking).json['id']
+
+        response = client.put(f'/api/bookings/{booking_id}', json={**booking, 'show_timeslot': 2})
+        assert response.status_code == 409
+        assert db.session.get(Booking, booking_id).show_timeslot == 1
+        # staying on its own slot is still fine
+        assert client.put(f'/api/bookings/{booking_id}', json={**booking, 'guest_count': 3}).status_code == 201
+
+        held_row = {**booking, 'order_id': 'HELD-2', 'show_timeslot': 2}
+        response = client.post('/api/bookings/bulk', json=[held_row])
+        assert response.status_code == 400
+        assert response.json['errors'] == [
+            {'row': 1, 'error': 'this timeslot is being held for another customer'}
+        ]
+    finally:
+        db.session.rollback()
+        db.session.execute(delete(Booking).where(Booking.room_id == ROOM_ID, Booking.show_date == show_date))
+        db.session.execute(delete(SlotHold).where(SlotHold.room_id == ROOM_ID, SlotHold.show_date == show_date))
+        db.session.commit()
@@ -0,0 +1,44 @@
+import io
+
+from sqlalchemy import delete
+
+from backend.app_files.models import Customer, db
+
+
+def upload(client, content):
+    return client.post('/api/customers/bulk', data={'file': (io.BytesIO(content), 'customers.csv')},
+                       content_type='multipart/form-data')
+
+
+def test_customer_import_reports_bad_rows(app_context, client):
+    response = client.post('/api/customers/bulk', json=[
+        {'first_name': 'Numeric', 'last_name': 'Email', 'email': 5},
+        {'first_name': 'Listed', 'last_name': ['Name'], 'email': 'listed.name@example.com'},
+    ])
+    assert response.status_code == 400
+    assert response.json['errors'] == [
+        {'row': 1, 'error': "'email' must be a string"},
+        {'row': 2, 'error': "'last_name' must be a string"},
+    ]
+
+
+def test_customer_import_stops_at_an_unreadable_csv(app_context, client):
+    header = b'first_name,last_name,email,customer_notes\n'
+    try:
+        # a field over the csv module's size limit, the row before it still goes in
+        response = upload(client, header + b'Good,Row,good.row@example.com,\n'
+                                   b'Huge,Row,huge.row@example.com,' + b'x' * 200000 + b'\n')
+        assert response.status_code == 201
+        assert response.json['inserted'] == 1
+        assert [error['row'] for error in response.json['errors']] == [2]
+        assert 'could not read the rest of the file' in response.json['errors'][0]['error']
+
+        # not utf-8 at all
+        response = upload(client, header + 'Café,Latin1,latin1@example.com,\n'.encode('latin-1'))
+        assert response.status_code == 400
+        assert [error['row'] for error in response.json['errors']] == [1]
+    finally:
+        db.session.execute(delete(Customer).where(Customer.email_key.in_(
+            ['good.row@example.com', 'huge.row@example.com', 'latin1@example.com']
+        )))
+        db.session.commit()
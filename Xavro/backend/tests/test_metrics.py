@@ -0,0 +1,41 @@
+import asyncio
+
+import httpx
+from asgiref.wsgi import WsgiToAsgi
+
+from backend.app_files.async_app import CalendarApp
+from backend.app_files.metrics import request_metrics
+
+ROUTE = '/api/availability'
+
+
+def responses(status):
+    return request_metrics.responses[('GET', ROUTE, status)]
+
+
+def test_asgi_routes_are_recorded_like_the_flask_ones(app, client):
+    calendar_app = CalendarApp(app, WsgiToAsgi(app))
+
+    async def get(url):
+        transport = httpx.ASGITransport(app=calendar_app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as asgi_client:
+            return await asgi_client.get(url)
+
+    before = responses(400)
+    assert client.get(ROUTE).status_code == 400  # no ?rooms=
+    assert asyncio.run(get(ROUTE)).status_code == 400
+    assert responses(400) == before + 2
+    assert request_metrics.request_latency[('GET', ROUTE)].count >= 2
+
+
+def test_metrics_needs_the_token(client, monkeypatch):
+    client.get(ROUTE)
+    monkeypatch.setattr(request_metrics, 'token', None)
+    assert client.get('/metrics').status_code == 404
+
+    monkeypatch.setattr(request_metrics, 'token', 'scrape-me')
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer scrape-me'})
+    assert response.status_code == 200
+    assert f'route="{ROUTE}"' in response.text
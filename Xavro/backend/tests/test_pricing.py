@@ -0,0 +1,110 @@
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import delete, update
+
+from backend.app_files import pricing
+from backend.app_files.models import RoomCost, db
+from backend.app_files.pricing import PriceSchedule, PricingIndex
+from backend.app_files.versions import record_write
+
+ROOM_ID = 5
+GUESTS = 99  # more than the seed prices, so these rows are the only ones for it
+
+# (id, total_cost, start_date, end_date), end dates are inclusive
+BASE = (1, 100.0, None, None)
+SUMMER = (2, 150.0, date(2026, 6, 1), date(2026, 8, 31))
+HOLIDAY = (3, 200.0, date(2026, 8, 15), date(2026, 8, 20))  # inside summer, started later
+SEPTEMBER = (4, 120.0, date(2026, 9, 1), date(2026, 9, 30))  # starts the day after summer ends
+
+
+@pytest.mark.parametrize('day, price', [
+    (date(2026, 5, 31), (100.0, 1)),  # the day before a window opens is the base price
+    (date(2026, 6, 1), (150.0, 2)),  # its first day
+    (date(2026, 8, 14), (150.0, 2)),
+    (date(2026, 8, 15), (200.0, 3)),  # the later start wins the overlap
+    (date(2026, 8, 20), (200.0, 3)),  # the inner window's last day
+    (date(2026, 8, 21), (150.0, 2)),  # and back to the outer one after it
+    (date(2026, 8, 31), (150.0, 2)),  # end dates are inclusive
+    (date(2026, 9, 1), (120.0, 4)),  # an adjacent window takes over the next day
+    (date(2026, 9, 30), (120.0, 4)),  # the last interval's end
+    (date(2026, 10, 1), (100.0, 1)),  # nothing dated applies, the base price
+    (date.min, (100.0, 1)),
+    (date.max, (100.0, 1)),
+])
+def test_price_schedule(day, price):
+    schedule = PriceSchedule([BASE, SUMMER, HOLIDAY, SEPTEMBER])
+    assert schedule.price_on(day) == price
+
+
+def test_price_schedule_without_a_base_price():
+    schedule = PriceSchedule([SUMMER, SEPTEMBER])
+    assert schedule.price_on(date(2026, 5, 31)) is None
+    assert schedule.price_on(date(2026, 8, 31)) == (150.0, 2)
+    assert schedule.price_on(date(2026, 9, 30)) == (120.0, 4)
+    assert schedule.price_on(date(2026, 10, 1)) is None
+    # the two windows touch, summer's last day and september's first don't merge into one interval
+    assert schedule.starts == [date.min, date(2026, 6, 1), date(2026, 9, 1), date(2026, 10, 1)]
+
+
+def test_same_start_goes_to_the_newest_row():
+    newer = (5, 175.0, SUMMER[2], SUMMER[3])
+    assert PriceSchedule([SUMMER, newer]).price_on(date(2026, 7, 1)) == (175.0, 5)
+
+
+@pytest.fixture
+def room_cost(app_context):
+    cost = RoomCost(room_id=ROOM_ID, guests_count=GUESTS, total_cost=100.0)
+    db.session.add(cost)
+    db.session.commit()
+    yield cost
+    db.session.rollback()
+    db.session.execute(delete(RoomCost).where(RoomCost.room_id == ROOM_ID, RoomCost.guests_count == GUESTS))
+    db.session.commit()
+
+
+def price(index, day=date(2026, 7, 1)):
+    return index.schedules(db.session, [ROOM_ID])[ROOM_ID][GUESTS].price_on(day)[0]
+
+
+def test_pricing_index_sees_committed_price_changes(room_cost):
+    index = PricingIndex(ttl=3600)
+    assert price(index) == 100.0
+
+    # an orm write bumps the room's version when it commits
+    room_cost.total_cost = 110.0
+    db.session.flush()
+    assert price(index) == 100.0  # not committed yet
+    db.session.commit()
+    assert price(index) == 110.0
+
+    # a core statement only shows up through record_write
+    db.session.execute(update(RoomCost).where(RoomCost.id == room_cost.id).values(total_cost=120.0))
+    db.session.commit()
+    assert price(index) == 110.0
+    db.session.execute(update(RoomCost).where(RoomCost.id == room_cost.id).values(total_cost=130.0))
+    record_write(db.session, 'room_cost', ROOM_ID)
+    db.session.commit()
+    assert price(index) == 130.0
+
+    # a dated row added later wins its window
+    db.session.add(RoomCost(room_id=ROOM_ID, guests_count=GUESTS, total_cost=300.0,
+                            start_date=datetime(2026, 7, 1), end_date=datetime(2026, 7, 1)))
+    db.session.commit()
+    assert price(index) == 300.0
+    assert price(index, date(2026, 7, 2)) == 130.0
+
+
+def test_pricing_index_reloads_after_the_ttl(room_cost, monkeypatch):
+    index = PricingIndex(ttl=60)
+    now = 1000.0
+    monkeypatch.setattr(pricing.time, 'monotonic', lambda: now)
+    assert price(index) == 100.0
+
+    # another worker's write, this one never hears about it
+    db.session.execute(update(RoomCost).where(RoomCost.id == room_cost.id).values(total_cost=140.0))
+    db.session.commit()
+    now += 59
+    assert price(index) == 100.0
+    now += 2
+    assert price(index) == 140.0
@@ -0,0 +1,119 @@
+"""read replica routing against two SQLite files, a primary and a copy of it as the replica"""
+import os
+import shutil
+from datetime import date, timedelta
+
+import pytest
+from flask import Flask
+
+from backend.app_files.models import connect_db, db
+from backend.app_files.replicas import LAST_WRITE_HEADER, replica_router
+from backend.app_files.routes.bookings import bookings_blueprint
+from backend.app_files.routes.rooms import rooms_blueprint
+from backend.benchmarks.seed import FUTURE_DAYS, seed_database
+from backend.config import TestingConfig
+
+SHOW_DATE = date.today() + timedelta(days=FUTURE_DAYS + 10)  # past the seeded bookings
+
+
+@pytest.fixture
+def replica_app(app, tmp_path):
+    primary = tmp_path / 'primary.db'
+    replica = tmp_path / 'replica.db'
+
+    class ReplicaConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{primary}'
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+        SQLALCHEMY_BINDS = {'replica_0': f'sqlite:///{replica}'}
+
+    replica_app = Flask(__name__)
+    replica_app.config.from_object(ReplicaConfig)
+    connect_db(replica_app)
+    replica_app.register_blueprint(rooms_blueprint)
+    replica_app.register_blueprint(bookings_blueprint)
+    with replica_app.app_context():
+        db.create_all(bind_key=None)
+        seed_database(db.session, num_rooms=1, num_customers=5, days_of_history=1, slots_per_day=2)
+        db.session.remove()
+    shutil.copyfile(primary, replica)
+    replica_router.init_app(replica_app, db)
+
+    yield replica_app, replica
+
+    with replica_app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+    db.metadatas.pop('replica_0')  # init_app made one for the bind, the other apps don't have it
+    replica_router.init_app(app, db)
+
+
+def timeslots(client, **headers):
+    response = client.get(f'/api/rooms/1/timeslots?date={SHOW_DATE.isoformat()}', headers=headers)
+    assert response.status_code == 200
+    return [slot['isBooked'] for slot in response.json]
+
+
+def test_missing_replica_falls_back_to_the_primary(replica_app):
+    replica_app, replica = replica_app
+    os.remove(replica)  # connecting creates an empty file, every select fails with no such table
+    client = replica_app.test_client()
+
+    response = client.get(f'/api/rooms/1/availability?start={SHOW_DATE}&end={SHOW_DATE}')
+    assert response.status_code == 200
+    assert response.json == [SHOW_DATE.strftime('%Y-%m-%d')]
+    assert timeslots(client) == [False, False]
+
+    stats = replica_router.stats()
+    assert stats['engines']['replica_0']['errors'] == 1
+    assert not stats['engines']['replica_0']['healthy']
+
+
+def test_read_after_write_follows_the_client(replica_app):
+    replica_app, _ = replica_app
+    client = replica_app.test_client()
+
+    response = client.post('/api/bookings', json={
+        'room_id': 1, 'customer_id': 1, 'guest_count': 2, 'order_id': 'REPLICA-1',
+        'booking_date': date.today().isoformat(), 'show_date': SHOW_DATE.isoformat(), 'show_timeslot': 1
+    })
+    assert response.status_code == 201
+    last_write = response.headers[LAST_WRITE_HEADER]
+
+    # the cookie came back with the booking, this client reads its own write from the primary
+    assert timeslots(client) == [True, False]
+    # so does one that only sends the header
+    other_client = replica_app.test_client()
+    assert timeslots(other_client, **{LAST_WRITE_HEADER: last_write}) == [True, False]
+    # a client that didn't write reads the replica, which never got the booking
+    assert timeslots(other_client) == [False, False]
+    assert replica_router.stats()['engines']['replica_0']['errors'] == 0
+
+
+def test_failing_replica_gets_one_try_per_request(replica_app, monkeypatch):
+    replica_app, replica = replica_app
+    os.remove(replica)
+    monkeypatch.setattr(replica_router, 'retry_after', 0)  # never skipped for being unhealthy
+    client = replica_app.test_client()
+
+    assert timeslots(client) == [False, False]
+    assert timeslots(client) == [False, False]
+    assert replica_router.stats()['engines']['replica_0']['errors'] == 2
+
+
+def test_one_replica_per_request(replica_app, monkeypatch):
+    replica_app, _ = replica_app
+    picked = []
+    pick = replica_router.replica
+
+    def counted_pick(**kwargs):
+        picked.append(pick(**kwargs))
+        return picked[-1]
+
+    monkeypatch.setattr(replica_router, 'replica', counted_pick)
+    client = replica_app.test_client()
+
+    queries = replica_router.queries['replica_0']
+    response = client.get(f'/api/rooms/1/timeslots?start={SHOW_DATE}&end={SHOW_DATE + timedelta(days=7)}')
+    assert response.status_code == 200
+    assert len(picked) == 1 and picked[0] is not None
+    assert replica_router.queries['replica_0'] - queries > 1
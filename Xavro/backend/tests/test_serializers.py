@@ -0,0 +1,23 @@
+from datetime import date, datetime
+
+import pytest
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from backend.app_files.serializers import OrjsonProvider, orjson
+
+
+@pytest.mark.skipif(orjson is None, reason='orjson is optional')
+@pytest.mark.parametrize('obj', [
+    {2: ['2024-07-01'], 10: [], 1: ['2024-07-02']},  # /api/availability, ints sort as numbers
+    {'b': [{'z': date(2024, 7, 1), 'y': datetime(2024, 7, 1, 18, 30)}], 'a': None},
+    [1.5, True, 'text'],
+])
+def test_orjson_matches_the_stdlib(obj):
+    app = Flask(__name__)
+    with app.app_context():
+        app.json = DefaultJSONProvider(app)
+        expected = app.json.response(obj).data
+        app.json = OrjsonProvider(app)
+        assert app.json.response(obj).data == expected
+        assert app.json.dumps(obj) + '\n' == expected.decode()
@@ -0,0 +1,18 @@
+from sqlalchemy import func, select
+
+from backend.app_files.models import Showtime, db
+
+
+def test_generate_refuses_an_empty_grid(app_context, client):
+    def schedule():
+        return db.session.execute(select(func.count()).where(Showtime.room_id == 4)).scalar()
+
+    before = schedule()
+    assert before
+
+    # no days, and a window shorter than the room's 60 minute show
+    for body in ({'open_time': '10:00', 'close_time': '22:00', 'days_of_week': []},
+                 {'open_time': '10:00', 'close_time': '10:30'}):
+        response = client.post('/api/rooms/4/showtimes/generate', json=body)
+        assert response.status_code == 400
+        assert schedule() == before
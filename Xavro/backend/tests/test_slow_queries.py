@@ -0,0 +1,29 @@
+import json
+
+from sqlalchemy import create_engine, text
+
+from backend.app_files.logs import LogPipeline
+from backend.app_files.slow_queries import SlowQueryLog
+
+
+def test_slow_queries_go_to_one_file_through_the_log_pipeline(tmp_path):
+    path = tmp_path / 'slow_queries.log'
+    pipeline = LogPipeline()
+    slow_query_log = SlowQueryLog()
+    slow_query_log.threshold = 1e-9  # everything is slow
+    pipeline.add_file(slow_query_log._logger, path)
+    engine = create_engine('sqlite://')
+    slow_query_log.track(engine)
+    try:
+        with engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+        pipeline.stop()  # flushes the queue
+
+        entries = [json.loads(line) for line in path.read_text().splitlines()]
+        assert [entry['statement'] for entry in entries] == ['SELECT 1']
+        # no per-process files next to it
+        assert [file.name for file in tmp_path.iterdir()] == ['slow_queries.log']
+    finally:
+        engine.dispose()
+        for handler in list(slow_query_log._logger.handlers):
+            slow_query_log._logger.removeHandler(handler)
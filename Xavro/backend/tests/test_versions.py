@@ -0,0 +1,23 @@
+import pytest
+
+
+def test_etag_depends_on_the_query_string(client):
+    url = '/api/rooms/1/availability?month=2026-07'
+    july = client.get(url).headers['ETag']
+    august = client.get('/api/rooms/1/availability?month=2026-08').headers['ETag']
+    assert july != august
+
+    # august's ETag doesn't revalidate july
+    assert client.get(url, headers={'If-None-Match': august}).status_code == 200
+    assert client.get(url, headers={'If-None-Match': july}).status_code == 304
+
+
+@pytest.mark.parametrize('url', [
+    '/api/availability',  # no ?rooms=
+    '/api/availability?rooms=1&month=bad',
+    '/api/rooms/1/availability?start=2026-07-10&end=2026-07-01',
+    '/api/rooms/1/timeslots',
+    '/api/rooms/?limit=0',
+])
+def test_bad_arguments_get_a_400_not_a_304(client, url):
+    assert client.get(url, headers={'If-None-Match': '*'}).status_code == 400
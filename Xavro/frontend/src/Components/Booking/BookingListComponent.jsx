@@ -4,21 +4,31 @@ import BookingItemComponent from "./BookingItemComponent.jsx";
 import 'bootstrap/dist/css/bootstrap.min.css';
 import './BookingListComponent.css'
 
+// the api sends a page of bookings at a time (PAGE_SIZE_DEFAULT), X-Next-Cursor says where the
+// next one starts and is missing on the last page
+const fetchBookingsPage = async (after) => {
+    const query = after ? `?after=${after}` : '';
+    const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}api/bookings${query}`);
+    if (!response.ok) {
+        throw new Error('Network response was not ok');
+    }
+    return { data: await response.json(), nextCursor: response.headers.get('X-Next-Cursor') };
+};
+
 const BookingListComponent = () => {
     const [bookings, setBookings] = useState([]);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState(null);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
     const navigate = useNavigate();
 
     useEffect(() => {
         const fetchBookings = async () => {
             try {
-                const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}api/bookings`);
-                if (!response.ok) {
-                    throw new Error('Network response was not ok');
-                }
-                const data = await response.json();
-                setBookings(data);
+                const page = await fetchBookingsPage();
+                setBookings(page.data);
+                setNextCursor(page.nextCursor);
                 setLoading(false);
             } catch (error) {
                 setError(error);
@@ -29,6 +39,18 @@ const BookingListComponent = () => {
         fetchBookings();
     }, []);
 
+    const handleLoadMore = async () => {
+        setLoadingMore(true);
+        try {
+            const page = await fetchBookingsPage(nextCursor);
+            setBookings(bookings => [...bookings, ...page.data]);
+            setNextCursor(page.nextCursor);
+        } catch (error) {
+            setError(error);
+        }
+        setLoadingMore(false);
+    };
+
     const handleDelete = async (bookingId) => {
         try {
             const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}api/bookings/${bookingId}`, {
@@ -102,6 +124,13 @@ const BookingListComponent = () => {
                     </table>
                 </div>
             )}
+            {nextCursor && (
+                <div className="d-flex justify-content-center mb-3">
+                    <button onClick={handleLoadMore} className="btn btn-outline-primary" disabled={loadingMore}>
+                        {loadingMore ? 'Loading...' : 'Load more'}
+                    </button>
+                </div>
+            )}
         </div>
     );
 };
@@ -4,21 +4,31 @@ import 'bootstrap/dist/css/bootstrap.min.css';
 import '@fortawesome/fontawesome-free/css/all.min.css';
 import './CustomerListComponent.css';
 
+// the api sends a page of customers at a time (PAGE_SIZE_DEFAULT), X-Next-Cursor says where the
+// next one starts and is missing on the last page
+const fetchCustomersPage = async (after) => {
+    const query = after ? `?after=${after}` : '';
+    const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}api/customers${query}`);
+    if (!response.ok) {
+        throw new Error('Network response was not ok');
+    }
+    return { data: await response.json(), nextCursor: response.headers.get('X-Next-Cursor') };
+};
+
 const CustomerListComponent = () => {
     const navigate = useNavigate();
     const [customers, setCustomers] = useState([]);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState(null);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
 
     useEffect(() => {
         const fetchCustomers = async () => {
             try {
-                const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}api/customers`);
-                if (!response.ok) {
-                    throw new Error('Network response was not ok');
-                }
-                const data = await response.json();
-                setCustomers(data);
+                const page = await fetchCustomersPage();
+                setCustomers(page.data);
+                setNextCursor(page.nextCursor);
                 setLoading(false);
             } catch (error) {
                 setError(error);
@@ -29,6 +39,18 @@ const CustomerListComponent = () => {
         fetchCustomers();
     }, []);
 
+    const handleLoadMore = async () => {
+        setLoadingMore(true);
+        try {
+            const page = await fetchCustomersPage(nextCursor);
+            setCustomers(customers => [...customers, ...page.data]);
+            setNextCursor(page.nextCursor);
+        } catch (error) {
+            setError(error);
+        }
+        setLoadingMore(false);
+    };
+
     const handleDelete = async (customerId) => {
         try {
             const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}api/customers/${customerId}`, {
@@ -101,6 +123,13 @@ const CustomerListComponent = () => {
                     </table>
                 </div>
             )}
+            {nextCursor && (
+                <div className="d-flex justify-content-center mb-3">
+                    <button onClick={handleLoadMore} className="btn btn-outline-primary" disabled={loadingMore}>
+                        {loadingMore ? 'Loading...' : 'Load more'}
+                    </button>
+                </div>
+            )}
         </div>
     );
 };